@@ -0,0 +1,115 @@
+"""
+Benchmark for connection liveness tracking in the Connection Manager
+Sends heartbeats for many connections, as the heartbeat endpoint does, against a baseline that
+restarts a threading.Timer per connection on every heartbeat, and reports:
+    - how many heartbeats per second each can record
+    - how many threads each keeps alive
+
+To run, from the src directory:
+python3 -m benchmarks.connection_liveness
+"""
+
+from argparse import ArgumentParser
+from threading import Timer, active_count
+from time import perf_counter
+from typing import Dict
+
+import master.connection_manager
+import master.lease_manager
+import master.status_manager
+import master.task_manager
+from common.logging import LogLevel
+from master.connection_manager import ConnectionManager
+from master.status_manager import StatusManager
+from master.task_manager import TaskManager
+
+
+class TimerConnections:
+    """
+    Restarts a Timer thread per connection on every heartbeat, how connections used to be tracked
+    Has the same interface as ConnectionManager
+    """
+
+    def __init__(self):
+        self.timers: Dict[str, Timer] = {}
+
+    def add_connection(self, connection_id: str, timeout_secs: float = 7.5):
+        """
+        Starts the timer of a connection
+
+        :param connection_id:
+        :param timeout_secs:
+        :return:
+        """
+        timer = Timer(timeout_secs, lambda: None)
+        timer.daemon = True
+        timer.start()
+        self.timers[connection_id] = timer
+
+    def reset_connection_timer(self, connection_id: str):
+        """
+        Cancels the timer of a connection and starts a new one
+
+        :param connection_id:
+        :return:
+        """
+        timer = self.timers[connection_id]
+        timer.cancel()
+        self.add_connection(connection_id, timer.interval)
+
+    def stop(self):
+        """
+        Cancels every timer and waits for the timer threads to exit
+
+        :return:
+        """
+        for timer in self.timers.values():
+            timer.cancel()
+        for timer in self.timers.values():
+            timer.join()
+
+
+def heartbeats(tracker, num_connections: int, num_beats: int):
+    """
+    Prints the heartbeats per second recorded by tracker and the threads it keeps alive
+
+    :param tracker: ConnectionManager or TimerConnections
+    :param num_connections:
+    :param num_beats: heartbeats per connection
+    :return:
+    """
+    threads = active_count()
+    for i in range(num_connections):
+        tracker.add_connection(f'slave_{i}')
+    start = perf_counter()
+    for _ in range(num_beats):
+        for i in range(num_connections):
+            tracker.reset_connection_timer(f'slave_{i}')
+    rate = num_connections * num_beats / (perf_counter() - start)
+    extra_threads = active_count() - threads
+    tracker.stop()
+    print(f'{type(tracker).__name__:>20}: {rate:>12,.0f} heartbeats/s, {extra_threads:>6} threads')
+
+
+def main():
+    """
+    Prints the results for each number of connections
+
+    :return:
+    """
+    parser = ArgumentParser(description='Connection liveness benchmark')
+    parser.add_argument('--connections', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--beats', type=int, default=20, help='heartbeats per connection')
+    args = parser.parse_args()
+    for module in (master.connection_manager, master.status_manager, master.task_manager, master.lease_manager):
+        module.logger.log_level = LogLevel.ERROR.value
+
+    for num_connections in args.connections:
+        print(f'{num_connections} connections, {args.beats} heartbeats each')
+        status_manager = StatusManager()
+        heartbeats(TimerConnections(), num_connections, args.beats)
+        heartbeats(ConnectionManager(TaskManager(status_manager), status_manager), num_connections, args.beats)
+
+
+if __name__ == '__main__':
+    main()
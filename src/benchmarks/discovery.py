@@ -0,0 +1,107 @@
+"""
+Benchmark of master discovery
+Reports how long a slave takes to find a master through the discovery beacon, and how long
+scanning networks for a master that is not there takes, sequentially as slaves used to
+and with the concurrent scanner the fallback uses, for each number of scan workers
+
+To run, from the src directory:
+python3 -m benchmarks.discovery
+"""
+
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+from typing import List, Sequence
+
+import master.beacon
+import slave.discovery
+import slave.slave
+from common.logging import LogLevel
+from common.networking import get_ip_addr
+from master.beacon import DiscoveryBeacon
+from slave.discovery import discover_master
+from slave.scanner import network_hosts
+from slave.slave import HyperSlave
+
+
+def beacon_discovery(num_trials: int) -> List[float]:
+    """
+    Returns the seconds each of num_trials discoveries of a local master takes
+
+    :param num_trials:
+    :return List[float]:
+    """
+    beacon = DiscoveryBeacon(5678)
+    beacon.start()
+    times = []
+    try:
+        for _ in range(num_trials):
+            start = perf_counter()
+            assert discover_master() is not None
+            times.append(perf_counter() - start)
+    finally:
+        beacon.stop()
+    return times
+
+
+def sequential_scan(hyper_slave: HyperSlave, hosts: Sequence[str], port: int) -> float:
+    """
+    Returns the seconds a scan of hosts, one after another over HTTP, takes
+
+    :param hyper_slave:
+    :param hosts:
+    :param port:
+    :return Float:
+    """
+    start = perf_counter()
+    for host in hosts:
+        hyper_slave.connect(host, port)
+    return perf_counter() - start
+
+
+def concurrent_scan(hyper_slave: HyperSlave, num_workers: int, port: int) -> float:
+    """
+    Returns the seconds the fallback scan of the slave takes with num_workers scan workers
+
+    :param hyper_slave:
+    :param num_workers:
+    :param port:
+    :return Float:
+    """
+    hyper_slave.scan_workers = num_workers
+    start = perf_counter()
+    hyper_slave.scan_for_master(port)
+    return perf_counter() - start
+
+
+def main():
+    """
+    Prints discovery and scan times
+
+    :return:
+    """
+    parser = ArgumentParser(description='Master discovery benchmark')
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--port', type=int, default=5677, help='port no master listens on')
+    parser.add_argument('--networks', nargs='+', help='networks to scan, the /24 network of this host by default')
+    parser.add_argument('--workers', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--sequential', action='store_true', help='also scan one host at a time, as slaves used to')
+    args = parser.parse_args()
+    for module in (master.beacon, slave.discovery, slave.slave):
+        module.logger.log_level = LogLevel.ERROR.value
+
+    times = beacon_discovery(args.trials)
+    print(f'{"beacon":>12}: median {median(times) * 1000:>10.2f} ms, max {max(times) * 1000:>10.2f} ms')
+    networks = args.networks or [f'{get_ip_addr()}/24']
+    hyper_slave = HyperSlave(scan_networks=networks)
+    hyper_slave.ip_addr = get_ip_addr()
+    hosts = network_hosts(networks)
+    print(f'Scanning {len(hosts)} hosts of {", ".join(networks)} without a master')
+    for num_workers in args.workers:
+        print(f'{num_workers:>4} workers: {concurrent_scan(hyper_slave, num_workers, args.port) * 1000:>10.0f} ms')
+    if args.sequential:
+        print(f'{"sequential":>12}: {sequential_scan(hyper_slave, hosts, args.port) * 1000:>10.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
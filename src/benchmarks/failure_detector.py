@@ -0,0 +1,124 @@
+"""
+Benchmark for the phi accrual Failure Detector used by the Connection Manager
+Replays simulated heartbeat traces of slaves beating every 2 seconds, against the fixed
+7.5 second timeout connections used to have, and reports for each network:
+    - how many healthy slaves are wrongly dropped per 1000 slave-hours
+    - how long a crashed slave's tasks stay blocked before they are handed to other slaves
+
+To run, from the src directory:
+python3 -m benchmarks.failure_detector
+"""
+
+from argparse import ArgumentParser
+from random import Random
+from statistics import mean
+from typing import Callable, List
+
+from master.failure_detector import FailureDetector
+
+HEARTBEAT_INTERVAL_SECS = 2.0
+FIXED_TIMEOUT_SECS = 7.5
+
+
+def heartbeat_intervals(rng: Random, num_beats: int, jitter_secs: float, stall_probability: float,
+                        stall_secs: float) -> List[float]:
+    """
+    Returns the intervals between the heartbeats a slave's master receives
+    Each heartbeat is delayed by up to jitter_secs, and occasionally by a stall of up to stall_secs,
+    as when the network is congested or the slave is busy
+
+    :param rng:
+    :param num_beats:
+    :param jitter_secs:
+    :param stall_probability:
+    :param stall_secs:
+    :return List[float]:
+    """
+    intervals = []
+    for _ in range(num_beats):
+        delay = rng.uniform(0, jitter_secs)
+        if rng.random() < stall_probability:
+            delay += rng.uniform(0, stall_secs)
+        intervals.append(HEARTBEAT_INTERVAL_SECS + delay)
+    return intervals
+
+
+def fixed_timeout() -> Callable[[float], float]:
+    """
+    Returns the timeout after a heartbeat with a fixed timeout
+
+    :return Callable[[float], float]:
+    """
+    def timeout(_: float) -> float:
+        return FIXED_TIMEOUT_SECS
+    return timeout
+
+
+def phi_timeout(threshold: float) -> Callable[[float], float]:
+    """
+    Returns the timeout after a heartbeat, as learned by a failure detector
+
+    :param threshold:
+    :return Callable[[float], float]:
+    """
+    detector = FailureDetector(threshold)
+    detector.last_heartbeat = 0.0
+    now = [0.0]
+
+    def timeout(interval: float) -> float:
+        now[0] += interval
+        detector.heartbeat(now[0])
+        return detector.deadline() - now[0]
+    return timeout
+
+
+def replay(new_timeout: Callable[[], Callable[[float], float]], traces: List[List[float]]):
+    """
+    Returns the number of false drops per 1000 slave-hours and the mean time a crashed slave is detected after
+    A slave crashes after its last heartbeat, so it is detected after the timeout that follows it
+
+    :param new_timeout: returns the timeout function of a new connection
+    :param traces: heartbeat intervals of each slave
+    :return Tuple[float, float]:
+    """
+    false_drops = 0
+    detection_secs = []
+    for intervals in traces:
+        timeout = new_timeout()
+        current_timeout = timeout(HEARTBEAT_INTERVAL_SECS)
+        for interval in intervals:
+            if interval > current_timeout:
+                false_drops += 1
+            current_timeout = timeout(interval)
+        detection_secs.append(current_timeout)
+    slave_hours = sum(sum(intervals) for intervals in traces) / 3600
+    return false_drops / slave_hours * 1000, mean(detection_secs)
+
+
+def main():
+    """
+    Prints the results of each simulated network
+
+    :return:
+    """
+    parser = ArgumentParser(description='Failure detector benchmark')
+    parser.add_argument('--slaves', type=int, default=200)
+    parser.add_argument('--beats', type=int, default=2000, help='heartbeats per slave')
+    parser.add_argument('--threshold', type=float, default=8.0)
+    args = parser.parse_args()
+
+    networks = (('quiet LAN', 0.05, 0.0, 0.0), ('busy LAN', 0.5, 0.01, 4.0), ('congested LAN', 1.5, 0.05, 6.0))
+    for name, jitter_secs, stall_probability, stall_secs in networks:
+        rng = Random(0)
+        traces = [heartbeat_intervals(rng, args.beats, jitter_secs, stall_probability, stall_secs)
+                  for _ in range(args.slaves)]
+        print(name)
+        for detector_name, new_timeout in ((f'fixed {FIXED_TIMEOUT_SECS}s', fixed_timeout),
+                                           (f'phi {args.threshold}', lambda: phi_timeout(args.threshold))):
+            false_drops, detection_secs = replay(new_timeout, traces)
+            print(f'{detector_name:>12}: {false_drops:>8.1f} false drops per 1000 slave-hours, '
+                  f'crash detected after {detection_secs:>5.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Benchmark for the FairShare policy used by the Job Scheduler
+Replays synthetic job mixes one dispatched task at a time, against a FIFO policy that
+serves jobs in the order they were submitted, and reports:
+    - the turnaround of small jobs submitted behind a huge job
+    - the slave time share of backlogged jobs against their weights
+    - how long an interactive job waits behind a batch backlog
+    - how many scheduling decisions per second the policy makes
+
+To run, from the src directory:
+python3 -m benchmarks.fair_share
+"""
+
+from argparse import ArgumentParser
+from collections import Counter
+from statistics import mean
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from master.fair_share import FairShare
+
+
+class Fifo:
+    """
+    Serves the first submitted job that has a task, the behaviour of a single queue shared by all jobs
+    Has the same interface as FairShare
+    """
+
+    def __init__(self):
+        self.job_ids: List[int] = []
+
+    def add_job(self, job_id: int, weight: float = 1.0, interactive: bool = False):
+        """
+        Adds a job behind the jobs already added
+
+        :param job_id:
+        :param weight: ignored
+        :param interactive: ignored
+        :return:
+        """
+        self.job_ids.append(job_id)
+
+    def select(self, ready: Callable[[int], bool]) -> Optional[int]:
+        """
+        Returns the first added job that is ready
+
+        :param ready:
+        :return Integer or None:
+        """
+        return next((job_id for job_id in self.job_ids if ready(job_id)), None)
+
+    def charge(self, job_id: int, cost: float = 1.0):
+        """
+        FIFO does not account for cost
+
+        :param job_id:
+        :param cost:
+        :return:
+        """
+
+
+# job id, number of tasks, step at which the job is submitted, weight, interactive
+JobSpec = Tuple[int, int, int, float, bool]
+
+
+def replay(policy, jobs: List[JobSpec], num_steps: int) -> Tuple[Dict[int, int], Dict[int, int], Counter]:
+    """
+    Dispatches one task per step from the job picked by the policy
+    Returns the step of the first and last dispatched task of each job and the tasks dispatched per job
+
+    :param policy: FairShare or Fifo
+    :param jobs:
+    :param num_steps:
+    :return Tuple[Dict[int, int], Dict[int, int], Counter]:
+    """
+    remaining: Dict[int, int] = {}
+    first: Dict[int, int] = {}
+    last: Dict[int, int] = {}
+    dispatched: Counter = Counter()
+    arrivals = sorted(jobs, key=lambda job: job[2])
+    for step in range(num_steps):
+        while arrivals and arrivals[0][2] <= step:
+            job_id, num_tasks, _, weight, interactive = arrivals.pop(0)
+            remaining[job_id] = num_tasks
+            policy.add_job(job_id, weight, interactive)
+        job_id = policy.select(lambda ready_job_id: remaining[ready_job_id] > 0)
+        if job_id is None:
+            continue
+        remaining[job_id] -= 1
+        policy.charge(job_id, 1.0)
+        dispatched[job_id] += 1
+        first.setdefault(job_id, step)
+        last[job_id] = step
+    return first, last, dispatched
+
+
+def small_jobs_behind_huge_job(num_small_jobs: int, small_job_tasks: int, huge_job_tasks: int):
+    """
+    Prints the mean turnaround of small jobs submitted just after a huge job
+
+    :param num_small_jobs:
+    :param small_job_tasks:
+    :param huge_job_tasks:
+    :return:
+    """
+    jobs: List[JobSpec] = [(0, huge_job_tasks, 0, 1.0, False)]
+    jobs += [(i, small_job_tasks, i, 1.0, False) for i in range(1, num_small_jobs + 1)]
+    num_steps = huge_job_tasks + num_small_jobs * small_job_tasks
+    print(f'{num_small_jobs} jobs of {small_job_tasks} tasks behind a job of {huge_job_tasks} tasks')
+    for name, policy in (('fifo', Fifo()), ('fair share', FairShare())):
+        _, last, _ = replay(policy, jobs, num_steps)
+        turnaround = mean(last[job_id] - submitted for job_id, _, submitted, _, _ in jobs[1:])
+        print(f'{name:>12}: small job turnaround {turnaround:>10.1f} tasks, '
+              f'huge job done after {last[0] + 1} tasks')
+
+
+def weighted_shares(weights: List[float], num_steps: int):
+    """
+    Prints the share of slave time of backlogged jobs against their weights
+
+    :param weights:
+    :param num_steps:
+    :return:
+    """
+    jobs: List[JobSpec] = [(i, num_steps, 0, weight, False) for i, weight in enumerate(weights)]
+    print(f'Backlogged jobs with weights {weights} over {num_steps} tasks')
+    for name, policy in (('fifo', Fifo()), ('fair share', FairShare())):
+        _, _, dispatched = replay(policy, jobs, num_steps)
+        shares = ', '.join(f'{dispatched[job_id] / num_steps:.3f}' for job_id in range(len(weights)))
+        print(f'{name:>12}: shares {shares}')
+    expected = ', '.join(f'{weight / sum(weights):.3f}' for weight in weights)
+    print(f'{"expected":>12}: shares {expected}')
+
+
+def interactive_wait(batch_tasks: int, interactive_tasks: int, submitted: int):
+    """
+    Prints how long an interactive job submitted during a batch backlog waits for its first
+    task and for its last task
+
+    :param batch_tasks:
+    :param interactive_tasks:
+    :param submitted: step at which the interactive job is submitted
+    :return:
+    """
+    jobs: List[JobSpec] = [(0, batch_tasks, 0, 4.0, False), (1, batch_tasks, 0, 1.0, False),
+                           (2, interactive_tasks, submitted, 1.0, True)]
+    print(f'Interactive job of {interactive_tasks} tasks submitted behind {2 * batch_tasks} batch tasks')
+    for name, policy in (('fifo', Fifo()), ('fair share', FairShare())):
+        first, last, _ = replay(policy, jobs, 2 * batch_tasks + interactive_tasks)
+        print(f'{name:>12}: first task after {first[2] - submitted:>7} tasks, '
+              f'done after {last[2] - submitted + 1:>7} tasks')
+
+
+def decision_rate(num_jobs: int, num_decisions: int) -> float:
+    """
+    Returns the number of select and charge calls per second with num_jobs backlogged jobs,
+    a tenth of which have no task to dispatch
+
+    :param num_jobs:
+    :param num_decisions:
+    :return Float:
+    """
+    fair_share = FairShare()
+    for job_id in range(num_jobs):
+        fair_share.add_job(job_id, 1.0 + job_id % 4)
+
+    def ready(job_id: int) -> bool:
+        return job_id % 10 != 0
+
+    start = perf_counter()
+    for _ in range(num_decisions):
+        fair_share.charge(fair_share.select(ready), 1.0)
+    return num_decisions / (perf_counter() - start)
+
+
+def main():
+    """
+    Prints the results of each synthetic job mix
+
+    :return:
+    """
+    parser = ArgumentParser(description='FairShare policy benchmark')
+    parser.add_argument('--tasks', type=int, default=100000, help='tasks of the huge and batch jobs')
+    args = parser.parse_args()
+
+    small_jobs_behind_huge_job(20, 50, args.tasks)
+    print()
+    weighted_shares([1.0, 2.0, 4.0], args.tasks)
+    print()
+    interactive_wait(args.tasks // 2, 100, args.tasks // 10)
+    print()
+    print('Scheduling decisions per second')
+    for num_jobs in (2, 10, 100, 1000):
+        print(f'{num_jobs:>12} jobs: {decision_rate(num_jobs, 100000):>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
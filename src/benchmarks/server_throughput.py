@@ -0,0 +1,199 @@
+"""
+Benchmark of the production server against the Flask development server
+Serves a master in a child process, in each mode, and reports the requests/sec that
+concurrent slave processes get from the heartbeat and tasks endpoints.
+The tasks endpoint is fed by an endless lazy task source, so it never runs dry.
+
+To run, from the src directory:
+python3 -m benchmarks.server_throughput
+"""
+
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from itertools import count
+from json import loads as json_loads
+from logging import ERROR, getLogger
+from multiprocessing import Event, Pool, Process
+from os import devnull
+from socket import socket
+from time import perf_counter, sleep
+from typing import Dict, Iterator, Tuple
+import sys
+
+import common.api.endpoints as endpoints
+import master.connection_manager
+import master.job_scheduler
+import master.lease_manager
+import master.master
+import master.status_manager
+import master.task_manager
+from common.logging import LogLevel
+from common.task import Task
+from common.wire import MIME_TYPE as TASKS_MIME_TYPE
+from master.master import HyperMaster, JobInfo, ServerConfig, create_app
+
+
+def quiet_loggers():
+    """
+    Silences logging from the master modules and the servers so it does not dominate the timings
+
+    :return:
+    """
+    for module in (master.master, master.task_manager, master.status_manager, master.connection_manager,
+                   master.job_scheduler, master.lease_manager):
+        module.logger.log_level = LogLevel.ERROR.value
+    for name in ('werkzeug', 'waitress', 'waitress.queue'):
+        getLogger(name).setLevel(ERROR)
+    sys.stdout = open(devnull, 'w')  # pylint: disable=R1732
+
+
+def endless_tasks() -> Iterator[Task]:
+    """
+    Yields tasks forever
+
+    :return Iterator[Task]:
+    """
+    for i in count():
+        yield Task(i, 'python3', ['main.py'], b'payload', f'result_{i}.txt', f'payload_{i}.txt')
+
+
+def serve(port: int, debug: bool, threads: int, ready):
+    """
+    Serves a master with a job of endless tasks, until the process is terminated
+
+    :param port:
+    :param debug:
+    :param threads:
+    :param ready: set once the job is loaded
+    :return:
+    """
+    quiet_loggers()
+    hyper_master = HyperMaster(host='127.0.0.1', port=port, server_config=ServerConfig(threads=threads))
+    job = JobInfo()
+    job.job_path = '.'
+    job.file_names = []
+    hyper_master.init_job(job)
+    hyper_master.load_tasks(endless_tasks(), window=10000)
+    app = create_app(hyper_master)
+    ready.set()
+    if debug:
+        app.run(host='127.0.0.1', port=port, debug=True, use_reloader=False)
+    else:
+        hyper_master.create_server(app).run()
+
+
+def free_port() -> int:
+    """
+    Returns a port free on localhost
+
+    :return Integer:
+    """
+    with socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def new_connection(port: int, slave_id: int) -> Tuple[HTTPConnection, Dict[str, str]]:
+    """
+    Returns a connection and the headers of a slave session that has requested the job, as a slave does
+
+    :param port:
+    :param slave_id:
+    :return Tuple[HTTPConnection, Dict[str, str]]:
+    """
+    connection = HTTPConnection('127.0.0.1', port, timeout=10)
+    headers = {'Cookie': f'id=bench-{slave_id}', 'Accept': TASKS_MIME_TYPE}
+    for _ in range(100):
+        try:
+            connection.request('GET', f'/{endpoints.JOB}', headers=headers)
+            connection.getresponse().read()
+            return connection, headers
+        except ConnectionError:
+            connection.close()
+            sleep(0.1)
+    raise RuntimeError('Master did not start')
+
+
+def slave(port: int, path: str, slave_id: int, start: float, duration_secs: float) -> Tuple[int, int]:
+    """
+    Requests path from start until start + duration_secs, on a connection kept alive if the server allows it
+    Returns the number of successful and failed requests
+
+    :param port:
+    :param path:
+    :param slave_id:
+    :param start: perf_counter time to start at
+    :param duration_secs:
+    :return Tuple[int, int]:
+    """
+    connection, headers = new_connection(port, slave_id)
+    successes, failures = 0, 0
+    while perf_counter() < start:
+        sleep(0.001)
+    while perf_counter() < start + duration_secs:
+        connection.request('GET', path, headers=headers)
+        resp = connection.getresponse()
+        resp.read()
+        if resp.status == 200:
+            successes += 1
+        else:
+            failures += 1
+    connection.close()
+    return successes, failures
+
+
+def measure(port: int, path: str, num_slaves: int, duration_secs: float) -> float:
+    """
+    Returns the requests/sec of num_slaves slave processes requesting path for duration_secs
+
+    :param port:
+    :param path:
+    :param num_slaves:
+    :param duration_secs:
+    :return Float:
+    """
+    start = perf_counter() + 1.0
+    with Pool(num_slaves) as pool:
+        results = pool.starmap(slave, [(port, path, i, start, duration_secs) for i in range(num_slaves)])
+    failures = sum(result[1] for result in results)
+    if failures:
+        print(f'    {failures} failed requests')
+    return sum(result[0] for result in results) / duration_secs
+
+
+def main():
+    """
+    Prints a requests/sec table for each mode, endpoint and number of concurrent slaves
+
+    :return:
+    """
+    parser = ArgumentParser(description='Master server throughput benchmark')
+    parser.add_argument('--slaves', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per measurement')
+    parser.add_argument('--threads', type=int, default=32, help='production server threads')
+    args = parser.parse_args()
+
+    print(f'{"mode":>12} {"endpoint":>10} ' + ''.join(f'{n:>10} sl.' for n in args.slaves))
+    for mode, debug in (('debug', True), ('production', False)):
+        port = free_port()
+        ready = Event()
+        server = Process(target=serve, args=(port, debug, args.threads, ready), daemon=True)
+        server.start()
+        ready.wait()
+        try:
+            # the job id is random, so ask the master for it as a slave does
+            connection, headers = new_connection(port, -1)
+            connection.request('GET', f'/{endpoints.JOB}', headers=headers)
+            job_json = json_loads(json_loads(connection.getresponse().read()))
+            connection.close()
+            for name, path in (('heartbeat', f'/{endpoints.HEARTBEAT}'),
+                               ('tasks', f'/{endpoints.GET_TASKS}/{job_json["job_id"]}/1')):
+                rates = [measure(port, path, n, args.duration) for n in args.slaves]
+                print(f'{mode:>12} {name:>10} ' + ''.join(f'{rate:>14,.0f}' for rate in rates))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Stress benchmark for the TaskManager
+Simulates slave request threads that repeatedly connect a batch of tasks and
+return it as processed, and reports task throughput against thread count.
+
+To run, from the src directory:
+python3 -m benchmarks.task_manager_stress
+"""
+
+from argparse import ArgumentParser
+from threading import Barrier, Thread
+from time import perf_counter
+from typing import List
+
+import master.lease_manager
+import master.status_manager
+import master.task_manager
+from common.logging import LogLevel
+from common.task import Task, TaskMessageType
+from master.status_manager import StatusManager
+from master.task_manager import TaskManager, NoMoreTasks
+
+
+def quiet_loggers():
+    """
+    Silences trace logging from the master modules so it does not dominate the timings
+
+    :return:
+    """
+    for module in (master.task_manager, master.status_manager, master.lease_manager):
+        module.logger.log_level = LogLevel.ERROR.value
+
+
+def run(num_threads: int, num_tasks: int, batch_size: int, shard_count: int) -> float:
+    """
+    Runs one benchmark round and returns the task throughput in tasks/sec
+
+    :param num_threads:
+    :param num_tasks:
+    :param batch_size:
+    :param shard_count:
+    :return Float:
+    """
+    task_manager = TaskManager(StatusManager(), speculative_execution=False, shard_count=shard_count)
+    task_manager.add_new_available_tasks(
+        [Task(i, "", [], None, "", "") for i in range(num_tasks)], 1)
+    barrier = Barrier(num_threads + 1)
+
+    def slave(connection_id: str):
+        barrier.wait()
+        while True:
+            try:
+                tasks: List[Task] = task_manager.connect_available_tasks(batch_size, connection_id)
+            except NoMoreTasks:
+                return
+            for task in tasks:
+                task.set_message_type(TaskMessageType.TASK_PROCESSED)
+            task_manager.tasks_finished(tasks, connection_id)
+
+    threads = [Thread(target=slave, args=(f'slave_{i}',)) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    task_manager.lease_manager.stop()
+
+    assert task_manager.status_manager.is_job_done()
+    assert len(task_manager.flush_finished_tasks()) == num_tasks
+    return num_tasks / elapsed
+
+
+def main():
+    """
+    Prints a throughput table for each thread count and shard count
+
+    :return:
+    """
+    parser = ArgumentParser(description='TaskManager stress benchmark')
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 16])
+    args = parser.parse_args()
+    quiet_loggers()
+
+    print(f'{args.tasks} tasks, batches of {args.batch}')
+    print('threads | ' + ' | '.join(f'{shards:>3} shard(s) tasks/s' for shards in args.shards))
+    for num_threads in args.threads:
+        results = [run(num_threads, args.tasks, args.batch, shards) for shards in args.shards]
+        print(f'{num_threads:>7} | ' + ' | '.join(f'{result:>20,.0f}' for result in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Memory benchmark of the per-task overhead of queued Tasks
+Compares Task and AvailableTaskQueue against a dict-backed task held in a heap entry per task,
+which is how tasks were stored before, both when tasks share their hints and when each task has
+its own estimated cost. Filenames and payloads are created before measuring,
+so only the memory spent on representing and queueing the tasks is counted.
+
+To run, from the src directory:
+python3 -m benchmarks.task_memory
+"""
+
+from argparse import ArgumentParser
+from heapq import heappush
+from itertools import count
+from tracemalloc import get_traced_memory, start, stop
+from typing import List, Tuple
+
+from common.task import Task
+from master.task_queue import AvailableTaskQueue
+
+
+class DictTask:
+    """
+    A task with a per-instance dict and its own arg_file_names list, as Task was before
+    """
+    def __init__(self, task_id: int, program: str, arg_file_names: List[str],
+                 payload, result_filename: str, payload_filename: str,
+                 priority: int = 0, estimated_cost: float = None):
+        self.task_id = task_id
+        self.program = program
+        self.arg_file_names = arg_file_names
+        self.payload = payload
+        self.result_filename = result_filename
+        self.payload_filename = payload_filename
+        self.priority = priority
+        self.estimated_cost = estimated_cost
+        self.job_id = 1
+        self.message_type = 0
+
+
+def make_fields(num_tasks: int) -> List[Tuple[str, str, bytes]]:
+    """
+    Creates the per-task filenames and payloads shared by both representations
+
+    :param num_tasks:
+    :return List[Tuple[str, str, bytes]]:
+    """
+    return [(f'output_{i}.txt', f'payload_{i}.txt', b'word') for i in range(num_tasks)]
+
+
+def dict_tasks(fields: List[Tuple[str, str, bytes]], distinct_costs: bool) -> int:
+    """
+    Queues dict-backed tasks in a heap of (priority, cost, sequence, task) entries
+    Returns the bytes allocated
+
+    :param fields:
+    :param distinct_costs: give each task its own estimated cost
+    :return Integer:
+    """
+    start()
+    heap = []
+    sequence = count()
+    for i, (result_filename, payload_filename, payload) in enumerate(fields):
+        task = DictTask(i, './slave_app_ex.sh', ['main.py', 'data.txt'], payload,
+                        result_filename, payload_filename, estimated_cost=float(i) if distinct_costs else None)
+        heappush(heap, (-task.priority, -(task.estimated_cost or 0.0), next(sequence), task))
+    allocated = get_traced_memory()[0]
+    stop()
+    return allocated
+
+
+def slotted_tasks(fields: List[Tuple[str, str, bytes]], distinct_costs: bool) -> int:
+    """
+    Queues Tasks in an AvailableTaskQueue
+    Returns the bytes allocated
+
+    :param fields:
+    :param distinct_costs: give each task its own estimated cost
+    :return Integer:
+    """
+    start()
+    queue = AvailableTaskQueue()
+    for i, (result_filename, payload_filename, payload) in enumerate(fields):
+        task = Task(i, './slave_app_ex.sh', ['main.py', 'data.txt'], payload,
+                    result_filename, payload_filename, estimated_cost=float(i) if distinct_costs else None)
+        task.set_job(1)
+        queue.put(task)
+    allocated = get_traced_memory()[0]
+    stop()
+    return allocated
+
+
+def main():
+    """
+    Prints the bytes per queued task of each representation
+
+    :return:
+    """
+    parser = ArgumentParser(description='Task memory benchmark')
+    parser.add_argument('--tasks', type=int, default=1000000)
+    args = parser.parse_args()
+
+    fields = make_fields(args.tasks)
+    print(f'{args.tasks:,} queued tasks, bytes per task excluding filenames and payloads')
+    for name, distinct_costs in (('shared hints', False), ('distinct costs', True)):
+        before = dict_tasks(fields, distinct_costs) / args.tasks
+        after = slotted_tasks(fields, distinct_costs) / args.tasks
+        print(name)
+        print(f'    dict task in heap entry: {before:>7.1f}')
+        print(f'    slotted task in queue:   {after:>7.1f}')
+        print(f'    reduction:               {before / after:>7.1f}x')
+
+
+if __name__ == "__main__":
+    main()
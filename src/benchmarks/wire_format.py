@@ -0,0 +1,93 @@
+"""
+Benchmark of the binary task batch wire format against compressed pickled tasks
+Reports the encoded size and the encode and decode time of task batches of different sizes.
+
+To run, from the src directory:
+python3 -m benchmarks.wire_format
+"""
+
+from argparse import ArgumentParser
+from os import urandom
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from time import perf_counter
+from typing import Callable, List, Tuple
+from zlib import compress, decompress
+
+from common.task import Task
+from common.wire import decode_tasks, encode_tasks
+
+
+def make_tasks(num_tasks: int, payload_size: int) -> List[Task]:
+    """
+    Creates a batch of tasks sharing a program and arguments, as a job does
+    Payloads are random so they do not flatter compression
+
+    :param num_tasks:
+    :param payload_size:
+    :return List[Task]:
+    """
+    tasks: List[Task] = []
+    for i in range(num_tasks):
+        task = Task(i, 'python3', ['main.py', f'payload_{i}.txt'], urandom(payload_size),
+                    f'result_{i}.txt', f'payload_{i}.txt')
+        task.set_job(1)
+        tasks.append(task)
+    return tasks
+
+
+def time_per_call(func: Callable, repeat: int) -> float:
+    """
+    Returns the mean time of a call in seconds
+
+    :param func:
+    :param repeat:
+    :return Float:
+    """
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat
+
+
+def measure(tasks: List[Task], encode: Callable, decode: Callable, repeat: int) -> Tuple[int, float, float]:
+    """
+    Returns the encoded size in bytes and the encode and decode times in seconds
+
+    :param tasks:
+    :param encode:
+    :param decode:
+    :param repeat:
+    :return Tuple[int, float, float]:
+    """
+    data = encode(tasks)
+    assert decode(data) == tasks
+    return len(data), time_per_call(lambda: encode(tasks), repeat), time_per_call(lambda: decode(data), repeat)
+
+
+def main():
+    """
+    Prints a size and timing table for each batch size and format
+
+    :return:
+    """
+    parser = ArgumentParser(description='Task batch wire format benchmark')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--payload', type=int, default=64, help='payload size in bytes')
+    args = parser.parse_args()
+
+    formats = [
+        ('pickle+zlib', lambda tasks: compress(pickle_dumps(tasks)), lambda data: pickle_loads(decompress(data))),
+        ('binary', encode_tasks, decode_tasks),
+        ('binary zero-copy', encode_tasks, lambda data: decode_tasks(data, zero_copy=True)),
+    ]
+    print(f'{"tasks":>6} | {"format":<16} | {"bytes":>10} | {"encode ms":>10} | {"decode ms":>10}')
+    for num_tasks in args.batches:
+        tasks = make_tasks(num_tasks, args.payload)
+        repeat = max(3, 10000 // num_tasks)
+        for name, encode, decode in formats:
+            size, encode_secs, decode_secs = measure(tasks, encode, decode, repeat)
+            print(f'{num_tasks:>6} | {name:<16} | {size:>10,} | {encode_secs * 1000:>10.3f} | {decode_secs * 1000:>10.3f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ JOB = 'job'
 FILE = 'file'
 GET_TASKS = 'tasks'
 TASKS_DONE = 'tasks_done'
+TASKS_EXCHANGE = 'tasks_exchange'
+RENEW_LEASES = 'renew_leases'
 HEARTBEAT = 'heartbeat'
+LEAVE = 'leave'
 DISCOVERY = 'discovery'
 STATUS = 'status'
@@ -0,0 +1,38 @@
+"""
+Master discovery protocol
+The master listens on the UDP discovery port. It answers probes broadcast by slaves
+and periodically broadcasts the same announcement, so slaves find it without scanning the network.
+An announcement carries the port of the master's HTTP server, the master's address is the sender's
+"""
+
+from typing import Optional
+
+DISCOVERY_PORT = 5679
+PROBE = b'HYPERCUBE PROBE'
+ANNOUNCEMENT_PREFIX = b'HYPERCUBE MASTER '
+BROADCAST_ADDRESS = '<broadcast>'
+
+
+def encode_announcement(port: int) -> bytes:
+    """
+    Returns the announcement of a master serving on port
+
+    :param port:
+    :return Bytes:
+    """
+    return ANNOUNCEMENT_PREFIX + str(port).encode()
+
+
+def decode_announcement(data: bytes) -> Optional[int]:
+    """
+    Returns the port of the master that sent an announcement, or None if data is not an announcement
+
+    :param data:
+    :return Integer or None:
+    """
+    if not data.startswith(ANNOUNCEMENT_PREFIX):
+        return None
+    try:
+        return int(data[len(ANNOUNCEMENT_PREFIX):])
+    except ValueError:
+        return None
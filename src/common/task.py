@@ -3,7 +3,12 @@ The Task Object is passed between the master and slave.
 """
 
 from enum import Enum
-from typing import List
+from sys import intern
+from typing import Dict, Optional, Sequence, Tuple
+
+# identical arg_file_names are shared between tasks, up to this many distinct values
+SHARED_ARGS_LIMIT = 4096
+shared_args: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
 
 
 class TaskMessageType(Enum):
@@ -16,28 +21,57 @@ class TaskMessageType(Enum):
     TASK_FAILED = 3
 
 
+def share_args(arg_file_names: Sequence[str]) -> Tuple[str, ...]:
+    """
+    Returns arg_file_names as a tuple, shared with other tasks that have the same arguments
+
+    :param arg_file_names:
+    :return Tuple[str, ...]:
+    """
+    args = tuple(arg_file_names)
+    shared = shared_args.get(args)
+    if shared is not None:
+        return shared
+    if len(shared_args) < SHARED_ARGS_LIMIT:
+        shared_args[args] = args
+    return args
+
+
 class Task:
     """
     A object that contains the expected parameters for a task used by the master and slave
     The cmd and the payload are passed to the slave application
+    Optional priority and estimated_cost hints decide the order in which the master dispatches tasks.
+    Higher priority tasks go first, then the most expensive tasks within a priority
+
+    Jobs can hold millions of tasks, so Task uses slots instead of a per-instance dict and
+    shares the program and arg_file_names values that tasks have in common
     """
+    __slots__ = ('task_id', 'job_id', 'message_type', 'program', 'arg_file_names', 'payload',
+                 'result_filename', 'payload_filename', 'priority', 'estimated_cost')
+
     task_id: int
     job_id: int
     message_type: TaskMessageType
     program: str
-    arg_file_names: List[str]
+    arg_file_names: Tuple[str, ...]
     payload: bytes
     result_filename: str
     payload_filename: str
+    priority: int
+    estimated_cost: Optional[float]
 
-    def __init__(self, task_id: int, program: str, arg_file_names: List[str],
-                 payload, result_filename: str, payload_filename: str):
+    def __init__(self, task_id: int, program: str, arg_file_names: Sequence[str],
+                 payload, result_filename: str, payload_filename: str,
+                 priority: int = 0, estimated_cost: Optional[float] = None):
         self.task_id = task_id
-        self.program = program
-        self.arg_file_names = arg_file_names
+        self.program = intern(program)
+        self.arg_file_names = share_args(arg_file_names)
         self.payload = payload
         self.result_filename = result_filename
         self.payload_filename = payload_filename
+        self.priority = priority
+        self.estimated_cost = estimated_cost
         self.message_type = TaskMessageType.TASK_RAW
 
     def __eq__(self, other):
@@ -0,0 +1,197 @@
+"""
+Compact, versioned binary wire format for batches of Tasks passed between the master and slave
+
+Layout (all integers little endian):
+    header:       magic 'HCTB' | version u8 | reserved u8 | shared entry count u32 | task count u32
+    shared table: per entry: program (u32 length + utf-8) | arg count u32 | args (u32 length + utf-8 each)
+    task records: per task: fixed record (see TASK_RECORD) followed by
+                  result_filename | payload_filename | payload (raw bytes)
+
+The program and arg_file_names of a task are stored once per batch in the shared table and
+each task refers to its entry by index. Payloads are raw byte regions, so a decoder can hand
+them out as memoryview slices of the received buffer without copying.
+"""
+
+from struct import Struct, error as StructError
+from typing import Dict, List, Optional, Tuple, Union
+
+from common.task import Task, TaskMessageType
+
+MAGIC = b'HCTB'
+VERSION = 1
+MIME_TYPE = 'application/x-hypercube-tasks'
+
+HEADER = Struct('<4sBBII')
+LENGTH = Struct('<I')
+# task_id, job_id, message_type, flags, priority, estimated_cost, shared entry index,
+# result_filename length, payload_filename length, payload length
+TASK_RECORD = Struct('<qqBBidIIII')
+
+FLAG_HAS_JOB_ID = 1
+FLAG_HAS_COST = 2
+FLAG_NO_PAYLOAD = 4
+FLAG_STR_PAYLOAD = 8
+
+MESSAGE_TYPES = {message_type.value: message_type for message_type in TaskMessageType}
+
+
+class WireFormatError(ValueError):
+    """
+    Exception raised when a task batch cannot be encoded or decoded
+    """
+
+
+def is_task_batch(data: Union[bytes, bytearray, memoryview]) -> bool:
+    """
+    Returns True if the data starts with the task batch magic bytes
+
+    :param data:
+    :return Boolean:
+    """
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_string(value: str) -> List[bytes]:
+    """
+    Returns the length prefixed utf-8 encoding of a string
+
+    :param value:
+    :return List[bytes]:
+    """
+    encoded = value.encode()
+    return [LENGTH.pack(len(encoded)), encoded]
+
+
+def encode_tasks(tasks: List[Task]) -> bytes:
+    """
+    Encodes a batch of tasks
+
+    :param tasks:
+    :return bytes:
+    """
+    shared_index: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+    shared_parts: List[bytes] = []
+    task_parts: List[bytes] = []
+    try:
+        for task in tasks:
+            shared_key = (task.program, tuple(task.arg_file_names))
+            index = shared_index.get(shared_key)
+            if index is None:
+                index = shared_index[shared_key] = len(shared_index)
+                shared_parts.extend(encode_string(task.program))
+                shared_parts.append(LENGTH.pack(len(task.arg_file_names)))
+                for arg_file_name in task.arg_file_names:
+                    shared_parts.extend(encode_string(arg_file_name))
+
+            flags = 0
+            job_id = getattr(task, 'job_id', None)
+            if job_id is not None:
+                flags |= FLAG_HAS_JOB_ID
+            estimated_cost = getattr(task, 'estimated_cost', None)
+            if estimated_cost is not None:
+                flags |= FLAG_HAS_COST
+            payload = task.payload
+            if payload is None:
+                flags |= FLAG_NO_PAYLOAD
+                payload = b''
+            elif isinstance(payload, str):
+                flags |= FLAG_STR_PAYLOAD
+                payload = payload.encode()
+            elif not isinstance(payload, (bytes, bytearray, memoryview)):
+                raise WireFormatError(f'Unsupported payload type {type(payload)} for task {task.task_id}')
+            result_filename = task.result_filename.encode()
+            payload_filename = task.payload_filename.encode()
+
+            task_parts.append(TASK_RECORD.pack(
+                task.task_id, job_id or 0, task.message_type.value, flags,
+                getattr(task, 'priority', 0) or 0, estimated_cost or 0.0, index,
+                len(result_filename), len(payload_filename), len(payload)))
+            task_parts.extend((result_filename, payload_filename, payload))
+    except (StructError, AttributeError, TypeError) as error:
+        raise WireFormatError(f'Unable to encode tasks\n{error}') from error
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(shared_index), len(tasks))
+    return b''.join([header, *shared_parts, *task_parts])
+
+
+def decode_string(view: memoryview, offset: int) -> Tuple[str, int]:
+    """
+    Decodes a length prefixed utf-8 string
+    Returns the string and the offset following it
+
+    :param view:
+    :param offset:
+    :return Tuple[str, int]:
+    """
+    (length,) = LENGTH.unpack_from(view, offset)
+    offset += LENGTH.size
+    end = offset + length
+    if end > len(view):
+        raise WireFormatError('Truncated task batch')
+    return str(view[offset:end], 'utf-8'), end
+
+
+def decode_tasks(data: Union[bytes, bytearray, memoryview], zero_copy: bool = False) -> List[Task]:
+    """
+    Decodes a batch of tasks
+    With zero_copy, payloads are memoryview slices of data instead of bytes copies
+
+    :param data:
+    :param zero_copy:
+    :return List[Task]:
+    """
+    view = memoryview(data)
+    try:
+        magic, version, _, shared_count, task_count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise WireFormatError('Data is not a task batch')
+        if version != VERSION:
+            raise WireFormatError(f'Unsupported task batch version {version}')
+        offset = HEADER.size
+
+        shared: List[Tuple[str, List[str]]] = []
+        for _ in range(shared_count):
+            program, offset = decode_string(view, offset)
+            (arg_count,) = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            arg_file_names: List[str] = []
+            for _ in range(arg_count):
+                arg_file_name, offset = decode_string(view, offset)
+                arg_file_names.append(arg_file_name)
+            shared.append((program, arg_file_names))
+
+        tasks: List[Task] = []
+        unpack_record = TASK_RECORD.unpack_from
+        for _ in range(task_count):
+            (task_id, job_id, message_type, flags, priority, estimated_cost, index,
+             result_filename_length, payload_filename_length, payload_length) = \
+                unpack_record(view, offset)
+            offset += TASK_RECORD.size
+            result_filename = str(view[offset:offset + result_filename_length], 'utf-8')
+            offset += result_filename_length
+            payload_filename = str(view[offset:offset + payload_filename_length], 'utf-8')
+            offset += payload_filename_length
+            end = offset + payload_length
+            if end > len(view):
+                raise WireFormatError('Truncated task batch')
+            payload: Optional[Union[bytes, memoryview, str]] = view[offset:end]
+            offset = end
+            if flags & FLAG_NO_PAYLOAD:
+                payload = None
+            elif flags & FLAG_STR_PAYLOAD:
+                payload = str(payload, 'utf-8')
+            elif not zero_copy:
+                payload = bytes(payload)
+
+            program, arg_file_names = shared[index]
+            task = Task(task_id, program, arg_file_names, payload, result_filename, payload_filename,
+                        priority, estimated_cost if flags & FLAG_HAS_COST else None)
+            if flags & FLAG_HAS_JOB_ID:
+                task.job_id = job_id
+            task.message_type = MESSAGE_TYPES[message_type]
+            tasks.append(task)
+        return tasks
+    except (StructError, IndexError, KeyError, UnicodeDecodeError, ValueError) as error:
+        if isinstance(error, WireFormatError):
+            raise
+        raise WireFormatError(f'Unable to decode tasks\n{error}') from error
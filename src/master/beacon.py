@@ -0,0 +1,115 @@
+"""
+Discovery beacon of the master, see common.discovery
+"""
+
+# External imports
+from select import select
+from socket import AF_INET, SO_BROADCAST, SO_REUSEADDR, SOCK_DGRAM, SOL_SOCKET, socket, socketpair
+from threading import Thread
+from time import monotonic
+from typing import Optional
+
+# Internal imports
+from common.discovery import BROADCAST_ADDRESS, DISCOVERY_PORT, PROBE, encode_announcement
+from common.logging import Logger
+
+logger = Logger()
+
+
+class DiscoveryBeacon:
+    """
+    DiscoveryBeacon object
+    Answers slave probes on the discovery port straight away and broadcasts an announcement
+    every interval_secs, on its own thread
+    """
+    log_prefix = "[DiscoveryBeacon]\n"
+
+    def __init__(self, http_port: int, discovery_port: int = DISCOVERY_PORT, interval_secs: float = 1.0):
+        self.discovery_port = discovery_port
+        self.interval_secs = interval_secs
+        self.announcement: bytes = encode_announcement(http_port)
+        self.sock: Optional[socket] = None
+        # written to by stop, to wake the beacon thread
+        self.wake_reader: Optional[socket] = None
+        self.wake_writer: Optional[socket] = None
+        self.thread: Optional[Thread] = None
+        self.running = False
+
+    def start(self):
+        """
+        Binds the discovery port and starts answering probes and broadcasting
+
+        :return:
+        """
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        # slaves on the same machine listen for announcements on the same port
+        self.sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.sock.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+        self.sock.bind(('', self.discovery_port))
+        self.wake_reader, self.wake_writer = socketpair()
+        self.running = True
+        self.thread = Thread(name='discovery_beacon_thread', target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        logger.log_info(f'{self.log_prefix}Announcing master on UDP port {self.discovery_port}')
+
+    def run(self):
+        """
+        Beacon loop
+
+        :return:
+        """
+        next_broadcast = monotonic()
+        while self.running:
+            try:
+                if monotonic() >= next_broadcast:
+                    self.broadcast()
+                    next_broadcast = monotonic() + self.interval_secs
+                readable, _, _ = select([self.sock, self.wake_reader], [], [], max(next_broadcast - monotonic(), 0.0))
+                if self.sock in readable:
+                    data, address = self.sock.recvfrom(1024)
+                    if data == PROBE:
+                        self.answer(address)
+            except OSError as error:
+                logger.log_error(f'{self.log_prefix}{error}')
+                return
+
+    def answer(self, address):
+        """
+        Sends an announcement to the slave that sent a probe
+
+        :param address:
+        :return:
+        """
+        try:
+            self.sock.sendto(self.announcement, address)
+            logger.log_trace(f'{self.log_prefix}Answered probe from {address[0]}')
+        except OSError as error:
+            logger.log_warn(f'{self.log_prefix}Unable to answer probe from {address[0]}\n{error}')
+
+    def broadcast(self):
+        """
+        Broadcasts an announcement. Networks without a broadcast route only get answers to probes
+
+        :return:
+        """
+        try:
+            self.sock.sendto(self.announcement, (BROADCAST_ADDRESS, self.discovery_port))
+        except OSError as error:
+            logger.log_trace(f'{self.log_prefix}Broadcast failed\n{error}')
+
+    def stop(self):
+        """
+        Stops the beacon and closes its socket
+
+        :return:
+        """
+        self.running = False
+        if self.thread is not None:
+            self.wake_writer.send(b'\0')
+            self.thread.join()
+            self.thread = None
+        for sock in (self.sock, self.wake_reader, self.wake_writer):
+            if sock is not None:
+                sock.close()
+        self.sock, self.wake_reader, self.wake_writer = None, None, None
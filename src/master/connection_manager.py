@@ -3,10 +3,16 @@ Contains implemented functionality for handling connections between the master a
 """
 
 # External imports
-from threading import Timer, Event
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition, Thread
+from time import monotonic
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 # Internal imports
 from common.logging import Logger
+from master.failure_detector import FailureDetector
+from master.job_scheduler import JobScheduler
 from master.status_manager import StatusManager
 from master.task_manager import TaskManager
 
@@ -22,16 +28,20 @@ class ConnectionDead(Exception):
 class Connection:
     """
     Connection object
+    Tracks the heartbeats of the slave with a phi accrual Failure Detector.
+    Once the detector suspects the slave has failed, the connection is suspended for grace_secs,
+    during which the slave can resume it. It times out after that
     """
     log_prefix = "[Connection]\n"
 
-    def __init__(self, connection_id: str, timeout_secs: float = 5.0):
+    def __init__(self, connection_id: str, detector: FailureDetector = None, grace_secs: float = 0.0):
         self.connection_id: str = connection_id
-        self.timeout_secs: float = timeout_secs
-        self.dead: Event = Event()
-        self.timer: Timer = Timer(timeout_secs, self.timeout)
-        self.timer.daemon = True
-        self.timer.start()
+        self.detector: FailureDetector = detector or FailureDetector()
+        self.grace_secs: float = grace_secs
+        # deadline of the connection in the Connection Manager's heap
+        self.scheduled: Optional[float] = None
+        self.suspended_at: Optional[float] = None
+        self.dead: bool = False
 
     def __hash__(self):
         """
@@ -52,116 +62,329 @@ class Connection:
             raise ValueError(f"Object is of type {type(other)}. Expected type {type(self)}")
         return self.connection_id == other.connection_id
 
+    def deadline(self) -> float:
+        """
+        Returns the monotonic time at which the connection is suspended, or times out if it is suspended,
+        unless the slave is seen again
+
+        :return Float:
+        """
+        if self.suspended_at is not None:
+            return self.suspended_at + self.grace_secs
+        return self.detector.deadline()
+
+    def suspicion(self) -> float:
+        """
+        Returns the suspicion level, phi, that the slave has failed
+
+        :return Float:
+        """
+        return self.detector.phi()
+
     def reset_timer(self):
         """
-        Resets the timer for the connection
+        Records a heartbeat of the slave, which pushes back the timeout of the connection
+
+        :return:
+        """
+        if not self.is_alive():
+            raise ConnectionDead
+        self.detector.heartbeat()
+
+    def suspend(self):
+        """
+        Called when the failure detector suspects the slave has failed.
+        The slave can resume the connection within grace_secs
+
+        :return:
+        """
+        logger.log_warn(f'{self.log_prefix}Connection [{self.connection_id}]: suspended, phi {self.suspicion():.1f}')
+        self.suspended_at = monotonic()
+
+    def resume(self):
+        """
+        Called when a suspended slave is seen again
 
         :return:
         """
-        if self.is_alive():
-            self.timer.cancel()
-            self.timer = Timer(self.timeout_secs, self.timeout)
-            self.timer.daemon = True
-            self.timer.start()
-        else:
+        if self.dead:
             raise ConnectionDead
+        self.suspended_at = None
+        self.detector.restart()
 
     def timeout(self):
         """
-        Called when the set amount of timeout seconds has been reached
-        without a reset. This sets the dead flag of the connection
+        Called when the failure detector suspects the slave has failed and it has not resumed in time.
+        This sets the dead flag of the connection
 
         :return:
         """
-        logger.log_warn(f'{self.log_prefix}Connection [{self.connection_id}]: timed out')
-        self.dead.set()
+        logger.log_warn(f'{self.log_prefix}Connection [{self.connection_id}]: timed out, phi {self.suspicion():.1f}')
+        self.dead = True
 
     def is_alive(self):
         """
-        Returns True if the connection is alive, False if dead
+        Returns True if the connection is alive, False if suspended or dead
+
+        :return Boolean:
+        """
+        return not self.dead and self.suspended_at is None
+
+    def is_suspended(self):
+        """
+        Returns True if the connection is suspended and can still be resumed
 
         :return Boolean:
         """
-        return not self.dead.is_set()
+        return not self.dead and self.suspended_at is not None
 
 
 class ConnectionManager:
     """
     ConnectionManager object
     Manages active connections
+    A single reaper thread keeps a min-heap of connection deadlines and sleeps until the earliest one.
+    A heartbeat only updates the failure detector of its connection, and only pushes a new deadline
+    if the heartbeat brought it forward. When a deadline is reached, the reaper either pushes the
+    connection's current deadline back onto the heap, suspends the connection, or removes the
+    timed out connection, so each connection costs about one heap operation per timeout period
+
+    A suspended connection's tasks are copied back to the available tasks, but stay connected to it
+    for grace_secs, so a slave that comes back after a network blip resumes the tasks nobody else took
+    and its late results are accepted
     """
     log_prefix = "[ConnectionManager]\n"
 
-    def __init__(self, task_manager: TaskManager,
-                 status_manager: StatusManager, cleanup_timeout_secs=3.0):
+    def __init__(self, task_manager: Union[TaskManager, JobScheduler], status_manager: StatusManager,
+                 phi_threshold: float = 8.0, heartbeat_interval_secs: float = 2.0, acceptable_pause_secs: float = 3.0,
+                 grace_secs: float = 60.0):
         self.task_manager = task_manager
         self.status_manager = status_manager
+        # settings of the failure detector of each connection, see FailureDetector
+        self.phi_threshold = phi_threshold
+        self.heartbeat_interval_secs = heartbeat_interval_secs
+        self.acceptable_pause_secs = acceptable_pause_secs
+        # how long a suspended connection can be resumed for
+        self.grace_secs = grace_secs
         self.running = True
-        self.connections = {}
-        self.connections_cleanup_timeout = cleanup_timeout_secs
-        self.connections_cleanup_timer = Timer(
-            self.connections_cleanup_timeout, self.cleanup_connections)
-        self.connections_cleanup_timer.setDaemon(True)
-        self.connections_cleanup_timer.start()
+        self.connections: Dict[str, Connection] = {}
+        # deadline, insertion order to break ties, connection
+        self.deadlines: List[Tuple[float, int, Connection]] = []
+        self.sequence = count()
+        self.condition: Condition = Condition()
+        self.reaper: Optional[Thread] = None
         logger.log_trace(f'{self.log_prefix}Connection Manager Initialized')
 
-    def cleanup_connections(self):
+    def schedule(self, connection: Connection):
         """
-        Called when the connections_cleanup_timer times out.
-        Removes dead connections from the connections dict
-        and resets the connections_cleanup_timer
+        Pushes the deadline of a connection onto the heap
+        Starts the reaper thread on first use. Must be called while holding the condition
 
+        :param connection:
         :return:
         """
-        active_connections = {}
-        for connection_id, connection in self.connections.items():
-            if connection.is_alive():
-                active_connections[connection_id] = connection
-            else:
-                self.task_manager.connection_dropped(connection_id)
-                self.status_manager.slave_disconnected()
-                logger.log_trace(f'{self.log_prefix}Connection [{connection_id}]: removed')
-        self.connections = active_connections
+        connection.scheduled = connection.deadline()
+        heappush(self.deadlines, (connection.scheduled, next(self.sequence), connection))
+        if self.reaper is None and self.running:
+            self.reaper = Thread(name='connection_reaper_thread', target=self.run)
+            self.reaper.daemon = True
+            self.reaper.start()
+        # wake the reaper if this deadline is now the earliest
+        if self.deadlines[0][2] is connection:
+            self.condition.notify()
 
-        if self.running:
-            # Reset timer
-            self.connections_cleanup_timer.cancel()
-            self.connections_cleanup_timer = Timer(
-                self.connections_cleanup_timeout, self.cleanup_connections)
-            self.connections_cleanup_timer.setDaemon(True)
-            self.connections_cleanup_timer.start()
+    def run(self):
+        """
+        Reaper loop. Suspends or removes connections whose deadline has passed
 
-    def add_connection(self, connection_id: str, timeout_secs: float = 7.5):
+        :return:
         """
-        Adds a new connection to the connections dict
-        Will replace existing connection if one exists with the same connection id
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if not self.deadlines:
+                    self.condition.wait()
+                    continue
+                delay = self.deadlines[0][0] - monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                deadline, _, connection = heappop(self.deadlines)
+                if self.connections.get(connection.connection_id) is not connection or deadline != connection.scheduled:
+                    # removed or replaced since its deadline was scheduled, or rescheduled to an earlier deadline
+                    continue
+                if not connection.dead and connection.deadline() > monotonic():
+                    # seen since its deadline was scheduled, and not suspected
+                    self.schedule(connection)
+                    continue
+                suspended = self.expire(connection)
+            self.connection_expired(connection, suspended)
+
+    def expire(self, connection: Connection) -> bool:
+        """
+        Suspends a connection whose deadline has passed, if it was alive and suspension is enabled,
+        otherwise removes it. Returns True if the connection was suspended
+        Must be called while holding the condition, followed by connection_expired once released
+
+        :param connection:
+        :return Boolean:
+        """
+        if connection.is_alive() and connection.grace_secs > 0:
+            connection.suspend()
+            self.schedule(connection)
+            return True
+        del self.connections[connection.connection_id]
+        return False
+
+    def connection_expired(self, connection: Connection, suspended: bool):
+        """
+        Copies the tasks of a suspended connection back to the available tasks,
+        or hands back the tasks of a removed connection and marks it as dead
+
+        :param connection:
+        :param suspended:
+        :return:
+        """
+        connection_id = connection.connection_id
+        if suspended:
+            try:
+                self.task_manager.connection_suspended(connection_id)
+            except Exception as error:
+                logger.log_error(f'{self.log_prefix}Suspending connection [{connection_id}] failed\n{error}')
+            self.status_manager.slave_disconnected()
+            return
+        was_suspended = connection.is_suspended()
+        if not connection.dead:
+            connection.timeout()
+        self.connection_removed(connection_id, was_suspended)
+
+    def connection_removed(self, connection_id: str, disconnected: bool):
+        """
+        Hands back the tasks of a removed connection
 
         :param connection_id:
-        :param timeout_secs:
+        :param disconnected: True if the slave is already counted as disconnected
+        :return:
+        """
+        try:
+            self.task_manager.connection_dropped(connection_id)
+        except Exception as error:
+            logger.log_error(f'{self.log_prefix}Dropping connection [{connection_id}] failed\n{error}')
+        if not disconnected:
+            self.status_manager.slave_disconnected()
+        logger.log_trace(f'{self.log_prefix}Connection [{connection_id}]: removed')
+
+    def connection_resumed(self, connection: Connection, held_task_ids: Optional[Set[int]] = None):
+        """
+        Gives a resumed connection back the tasks nobody else took over
+
+        :param connection:
+        :param held_task_ids: ids of the tasks the slave still holds, all of them if None
         :return:
         """
-        connection: Connection = Connection(connection_id, timeout_secs)
-        self.connections[connection_id] = connection
+        try:
+            self.task_manager.connection_resumed(connection.connection_id, held_task_ids)
+        except Exception as error:
+            logger.log_error(f'{self.log_prefix}Resuming connection [{connection.connection_id}] failed\n{error}')
         self.status_manager.new_slave_connected()
+        logger.log_success(f'{self.log_prefix}Connection [{connection.connection_id}] Resumed', 'CONNECTION RESUMED')
+
+    def cleanup_connections(self):
+        """
+        Suspends or removes dead and timed out connections straight away,
+        without waiting for the reaper thread
+
+        :return:
+        """
+        now = monotonic()
+        with self.condition:
+            expired: List[Tuple[Connection, bool]] = [
+                (connection, self.expire(connection)) for connection in list(self.connections.values())
+                if connection.dead or connection.deadline() <= now]
+        for connection, suspended in expired:
+            self.connection_expired(connection, suspended)
+
+    def add_connection(self, connection_id: str, detector: FailureDetector = None, held_task_ids: Optional[Set[int]] = None):
+        """
+        Adds a new connection to the connections dict
+        Will replace existing connection if one exists with the same connection id.
+        A suspended connection that is replaced is resumed, with only the tasks the slave still holds
+
+        :param connection_id:
+        :param detector: failure detector of the connection, one with the manager's settings by default
+        :param held_task_ids: ids of the tasks the slave still holds, all of them if None
+        :return:
+        """
+        detector = detector or FailureDetector(self.phi_threshold, self.heartbeat_interval_secs, self.acceptable_pause_secs)
+        connection: Connection = Connection(connection_id, detector, self.grace_secs)
+        with self.condition:
+            replaced: Optional[Connection] = self.connections.get(connection_id)
+            resumed = replaced is not None and replaced.is_suspended()
+            self.connections[connection_id] = connection
+            self.schedule(connection)
+        if resumed:
+            self.connection_resumed(connection, held_task_ids)
+            return
+        if replaced is None:
+            self.status_manager.new_slave_connected()
         logger.log_success(f'{self.log_prefix}Connection [{connection_id}] Added', 'NEW CONNECTION')
 
+    def remove_connection(self, connection_id: str):
+        """
+        Removes the connection of a slave that is leaving and hands back its tasks straight away
+        The tasks are handed back even if the connection is unknown
+
+        :param connection_id:
+        :return:
+        """
+        with self.condition:
+            connection: Optional[Connection] = self.connections.pop(connection_id, None)
+            was_suspended = connection is not None and connection.is_suspended()
+            if connection is not None:
+                connection.dead = True
+        # an unknown slave was never counted as connected
+        self.connection_removed(connection_id, was_suspended or connection is None)
+        logger.log_info(f'{self.log_prefix}Connection [{connection_id}] left')
+
     def reset_connection_timer(self, connection_id: str):
         """
-        Resets a connection's timer
+        Records a heartbeat of a connection, which resumes it if it is suspended
 
         :param connection_id:
         :return:
         """
         try:
-            connection: Connection = self.connections.get(connection_id)
-            if connection:
-                connection.reset_timer()
+            resumed = False
+            with self.condition:
+                connection: Connection = self.connections.get(connection_id)
+                if connection and connection.is_suspended():
+                    connection.resume()
+                    self.schedule(connection)
+                    resumed = True
+                elif connection:
+                    connection.reset_timer()
+                    # a steadier heartbeat may bring the deadline forward, which the reaper must not miss
+                    if connection.deadline() < connection.scheduled:
+                        self.schedule(connection)
+            if resumed:
+                self.connection_resumed(connection)
+            elif connection:
                 logger.log_trace(f'{self.log_prefix}Connection [{connection_id}] reset')
             else:
                 logger.log_warn(f'{self.log_prefix}Connection [{connection_id}] not found.')
         except Exception as error:
             logger.log_error(f"{self.log_prefix}\n{error}")
 
+    def suspicion(self, connection_id: str) -> float:
+        """
+        Returns the suspicion level, phi, that the slave of a connection has failed
+
+        :param connection_id:
+        :return Float:
+        """
+        return self.get_connection(connection_id).suspicion()
+
     def get_connection(self, connection_id: str):
         """
         Returns an alive connection if one is found`
@@ -175,3 +398,13 @@ class ConnectionManager:
             return connection
 
         raise ConnectionDead
+
+    def stop(self):
+        """
+        Stops the reaper thread
+
+        :return:
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
@@ -0,0 +1,133 @@
+"""
+Phi accrual failure detector, used by the Connection Manager to decide when a slave has failed
+See Hayashibara et al., The phi accrual failure detector
+"""
+
+# External imports
+from collections import deque
+from math import erfc, inf, log10, sqrt
+from statistics import NormalDist
+from time import monotonic
+from typing import Deque
+
+
+class FailureDetector:
+    """
+    FailureDetector object
+    Learns the distribution of the intervals between the heartbeats of one slave, as a normal distribution
+    over the last max_samples intervals, and reports how suspicious the silence since the last heartbeat is as phi.
+    phi is -log10 of the probability that the next heartbeat is still to come, so a phi of 8 means that a
+    heartbeat this late would be expected once in 10^8 intervals.
+    A slave with a steady heartbeat is suspected soon after it misses its heartbeats,
+    one with a jittery heartbeat is given more time
+    """
+
+    def __init__(self, threshold: float = 8.0, expected_interval_secs: float = 2.0, acceptable_pause_secs: float = 3.0,
+                 min_std_secs: float = 0.25, max_samples: int = 100):
+        """
+        :param threshold: phi at which the slave is considered failed
+        :param expected_interval_secs: interval the slave is expected to send heartbeats at, until intervals are learned
+        :param acceptable_pause_secs: added to the mean interval, so that this many seconds of missed heartbeats
+        on top of the usual interval are not suspicious
+        :param min_std_secs: lower bound of the standard deviation, so that a very steady heartbeat is not suspected
+        as soon as it is a little late
+        :param max_samples: number of intervals the distribution is learned from
+        """
+        if threshold <= 0:
+            raise ValueError('The threshold must be positive')
+        self.threshold = threshold
+        self.acceptable_pause_secs = acceptable_pause_secs
+        self.min_std_secs = min_std_secs
+        self.intervals: Deque[float] = deque(maxlen=max_samples)
+        self.interval_sum = 0.0
+        self.interval_square_sum = 0.0
+        # standard normal quantile at which phi reaches the threshold
+        self.threshold_z = -NormalDist().inv_cdf(10 ** -threshold)
+        # until intervals are learned, assume they are around the expected interval
+        std = expected_interval_secs / 4
+        self.add_interval(expected_interval_secs - std)
+        self.add_interval(expected_interval_secs + std)
+        self.last_heartbeat: float = monotonic()
+
+    def add_interval(self, interval: float):
+        """
+        Adds an interval to the samples, dropping the oldest one if there are max_samples
+
+        :param interval:
+        :return:
+        """
+        if len(self.intervals) == self.intervals.maxlen:
+            oldest = self.intervals[0]
+            self.interval_sum -= oldest
+            self.interval_square_sum -= oldest * oldest
+        self.intervals.append(interval)
+        self.interval_sum += interval
+        self.interval_square_sum += interval * interval
+
+    def heartbeat(self, now: float = None):
+        """
+        Records a heartbeat, learning the interval since the last one
+
+        :param now: monotonic time of the heartbeat, now by default
+        :return:
+        """
+        now = monotonic() if now is None else now
+        self.add_interval(now - self.last_heartbeat)
+        self.last_heartbeat = now
+
+    def restart(self, now: float = None):
+        """
+        Restarts the silence from now without learning the interval since the last heartbeat,
+        for a slave that was away and has come back
+
+        :param now: monotonic time, now by default
+        :return:
+        """
+        self.last_heartbeat = monotonic() if now is None else now
+
+    def mean(self) -> float:
+        """
+        Returns the mean interval between heartbeats
+
+        :return Float:
+        """
+        return self.interval_sum / len(self.intervals)
+
+    def std(self) -> float:
+        """
+        Returns the standard deviation of the intervals between heartbeats, at least min_std_secs
+
+        :return Float:
+        """
+        mean = self.mean()
+        variance = self.interval_square_sum / len(self.intervals) - mean * mean
+        return max(sqrt(max(variance, 0.0)), self.min_std_secs)
+
+    def phi(self, now: float = None) -> float:
+        """
+        Returns the suspicion level of the slave, given that no heartbeat arrived since the last one
+
+        :param now: monotonic time, now by default
+        :return Float:
+        """
+        now = monotonic() if now is None else now
+        y = (now - self.last_heartbeat - self.mean() - self.acceptable_pause_secs) / self.std()
+        probability_later = 0.5 * erfc(y / sqrt(2))
+        return -log10(probability_later) if probability_later > 0 else inf
+
+    def deadline(self) -> float:
+        """
+        Returns the monotonic time at which phi reaches the threshold, unless a heartbeat arrives
+
+        :return Float:
+        """
+        return self.last_heartbeat + self.mean() + self.acceptable_pause_secs + self.std() * self.threshold_z
+
+    def is_suspected(self, now: float = None) -> bool:
+        """
+        Returns True if phi has reached the threshold
+
+        :param now: monotonic time, now by default
+        :return Boolean:
+        """
+        return self.phi(now) >= self.threshold
@@ -0,0 +1,134 @@
+"""
+Weighted fair-share policy used by the Job Scheduler to pick the job of the next dispatched task
+"""
+
+from collections import deque
+from math import floor
+from typing import Callable, Deque, Dict, List, Optional
+
+
+class JobShare:
+    """
+    Scheduling state of a job: its weight, its class and its deficit
+    """
+    def __init__(self, weight: float = 1.0, interactive: bool = False):
+        self.weight = weight
+        self.interactive = interactive
+        # cost the job may still be dispatched in its current turn
+        self.deficit = 0.0
+
+
+class FairShare:
+    """
+    Deficit round robin between jobs
+    On its turn a job is credited weight * quantum, and keeps being picked until the cost of
+    the tasks dispatched from it uses up the credit. Over time each job with work gets slave
+    time in proportion to its weight. A job with nothing to dispatch keeps its credit, or its
+    debt for a task that cost more than its credit, until it is removed.
+    Interactive jobs are always picked before batch jobs, so an interactive job preempts
+    batch jobs at the next task boundary. Tasks already running are never interrupted.
+
+    Not thread safe, callers serialize select and charge
+    """
+
+    def __init__(self, quantum: float = 1.0):
+        self.quantum = quantum
+        self.shares: Dict[int, JobShare] = {}
+        self.interactive: Deque[int] = deque()
+        self.batch: Deque[int] = deque()
+
+    def add_job(self, job_id: int, weight: float = 1.0, interactive: bool = False):
+        """
+        Adds a job, or updates the weight and class of a job already added
+        A job already added keeps its deficit
+
+        :param job_id:
+        :param weight: must be greater than 0
+        :param interactive:
+        :return:
+        """
+        if weight <= 0:
+            raise ValueError(f'Weight of job {job_id} must be greater than 0')
+        share: JobShare = JobShare(weight, interactive)
+        if job_id in self.shares:
+            share.deficit = self.shares[job_id].deficit
+            self.remove_job(job_id)
+        self.shares[job_id] = share
+        (self.interactive if interactive else self.batch).append(job_id)
+
+    def remove_job(self, job_id: int):
+        """
+        Removes a job, if it was added
+
+        :param job_id:
+        :return:
+        """
+        share: Optional[JobShare] = self.shares.pop(job_id, None)
+        if share is not None:
+            (self.interactive if share.interactive else self.batch).remove(job_id)
+
+    def select(self, ready: Callable[[int], bool]) -> Optional[int]:
+        """
+        Returns the job to dispatch the next task from, or None if no job is ready
+
+        :param ready: returns True if the job with the given id has a task to dispatch
+        :return Integer or None:
+        """
+        for turns in (self.interactive, self.batch):
+            job_id: Optional[int] = self.select_from(turns, ready)
+            if job_id is not None:
+                return job_id
+        return None
+
+    def select_from(self, turns: Deque[int], ready: Callable[[int], bool]) -> Optional[int]:
+        """
+        Returns the ready job whose turn it is in a round of jobs, or None if none is ready
+        The job at the front of turns is the one whose turn it is.
+        If every ready job is still paying off a task that cost more than its credit, the rounds
+        in which none of them would be picked are credited at once rather than gone through
+
+        :param turns:
+        :param ready:
+        :return Integer or None:
+        """
+        while True:
+            # ready jobs found still in debt after their credit for the round
+            in_debt: List[JobShare] = []
+            for _ in range(len(turns)):
+                job_id = turns[0]
+                share = self.shares[job_id]
+                if ready(job_id):
+                    if share.deficit <= 0:
+                        share.deficit += share.weight * self.quantum
+                    if share.deficit > 0:
+                        return job_id
+                    in_debt.append(share)
+                turns.rotate(-1)
+            if not in_debt:
+                return None
+            # the job closest to paying off its debt is picked in the round after these
+            rounds = min(floor(-share.deficit / (share.weight * self.quantum)) for share in in_debt)
+            for share in in_debt:
+                share.deficit += rounds * share.weight * self.quantum
+
+    def charge(self, job_id: int, cost: float = 1.0):
+        """
+        Charges a job for a dispatched task. Ends the turn of the job once its credit is used up
+
+        :param job_id:
+        :param cost:
+        :return:
+        """
+        share: Optional[JobShare] = self.shares.get(job_id)
+        if share is None:
+            return
+        share.deficit -= cost
+        turns = self.interactive if share.interactive else self.batch
+        if share.deficit <= 0 and turns and turns[0] == job_id:
+            turns.rotate(-1)
+
+    def __len__(self):
+        return len(self.shares)
+
+    def __contains__(self, job_id: int):
+        return job_id in self.shares
@@ -0,0 +1,212 @@
+"""
+Job Scheduler shares the connected slaves between the jobs run by the Hyper Master
+"""
+
+from threading import Condition
+from time import monotonic
+from typing import Dict, List, Optional, Set, Tuple
+
+from common.logging import Logger
+from common.task import Task
+
+from master.fair_share import FairShare
+from master.task_manager import TaskManager, NoMoreTasks
+
+logger = Logger()
+
+
+class JobScheduler:
+    """
+    Keeps a Task Manager per job and connects tasks to slaves from any job with work left
+    The job of each task is picked by a FairShare policy, so jobs get slave time in proportion
+    to their weights and interactive jobs go before batch jobs. A task is charged its
+    estimated cost, or 1. Backup copies of long running tasks are only connected when no job
+    has a task available.
+    A long-lived scheduler never runs out of tasks, as more jobs may be submitted later
+    """
+    log_prefix = "[JobScheduler]\n"
+
+    def __init__(self, long_lived: bool = False, poll_secs: float = 0.05, quantum: float = 1.0):
+        self.jobs: Dict[int, TaskManager] = {}
+        self.long_lived = long_lived
+        # how often a long poll checks the queues of several jobs for new tasks
+        self.poll_secs = poll_secs
+        self.fair_share: FairShare = FairShare(quantum)
+        self.condition: Condition = Condition()
+        logger.log_trace(f'{self.log_prefix}Job Scheduler Initialized')
+
+    def add_job(self, job_id: int, task_manager: TaskManager, weight: float = 1.0, interactive: bool = False):
+        """
+        Adds a job, or replaces the Task Manager of a job already added
+        A job already added keeps its weight and class, see set_share
+
+        :param job_id:
+        :param task_manager:
+        :param weight: share of the slave time of the job, relative to the other jobs of its class
+        :param interactive: interactive jobs are dispatched before batch jobs
+        :return:
+        """
+        with self.condition:
+            if job_id not in self.fair_share:
+                self.fair_share.add_job(job_id, weight, interactive)
+            self.jobs[job_id] = task_manager
+            # wake long polling requests so they can connect tasks of the new job
+            self.condition.notify_all()
+        logger.log_trace(f'{self.log_prefix}Job {job_id} added')
+
+    def set_share(self, job_id: int, weight: float = 1.0, interactive: bool = False):
+        """
+        Sets the weight and class of a job already added
+
+        :param job_id:
+        :param weight:
+        :param interactive:
+        :return:
+        """
+        with self.condition:
+            if job_id not in self.jobs:
+                raise KeyError(job_id)
+            self.fair_share.add_job(job_id, weight, interactive)
+
+    def remove_job(self, job_id: int) -> Optional[TaskManager]:
+        """
+        Removes a job. Its tasks are no longer connected to slaves
+        Returns the Task Manager of the job, or None if the job was not added
+
+        :param job_id:
+        :return TaskManager or None:
+        """
+        with self.condition:
+            task_manager: Optional[TaskManager] = self.jobs.pop(job_id, None)
+            self.fair_share.remove_job(job_id)
+        if task_manager is not None:
+            logger.log_trace(f'{self.log_prefix}Job {job_id} removed')
+        return task_manager
+
+    def get_task_manager(self, job_id: int) -> Optional[TaskManager]:
+        """
+        Returns the Task Manager of a job, or None if the job was not added
+
+        :param job_id:
+        :return TaskManager or None:
+        """
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def active_jobs(self) -> List[Tuple[int, TaskManager]]:
+        """
+        Returns the jobs that are not drained, interactive jobs first
+
+        :return List[Tuple[int, TaskManager]]:
+        """
+        with self.condition:
+            jobs = [(job_id, task_manager) for job_id, task_manager in self.jobs.items()
+                    if not task_manager.is_drained()]
+            shares = self.fair_share.shares
+            jobs.sort(key=lambda job: not (job[0] in shares and shares[job[0]].interactive))
+        return jobs
+
+    def connect_available_tasks(self, num_tasks: int, connection_id: str, wait_secs: float = 0.0) -> List[Task]:
+        """
+        Connects up to num_tasks tasks from the jobs with a connection id, picking the job of each
+        If no task can be connected, waits up to wait_secs for a task to be added or requeued
+        Raises NoMoreTasks once every job is drained, unless the scheduler is long-lived
+        Returns a list of the tasks
+
+        :param num_tasks:
+        :param connection_id:
+        :param wait_secs:
+        :return List[Task]:
+        """
+        deadline = monotonic() + wait_secs
+        while True:
+            jobs = self.active_jobs()
+            if not jobs and not self.long_lived:
+                logger.log_trace(f'{self.log_prefix}No More Tasks')
+                raise NoMoreTasks
+            tasks: List[Task] = self.connect_queued_tasks(num_tasks, connection_id)
+            if not tasks:
+                for _, task_manager in jobs:
+                    backup_task: Optional[Task] = task_manager.connect_backup_task(connection_id)
+                    if backup_task is not None:
+                        tasks.append(backup_task)
+                        break
+            remaining = deadline - monotonic()
+            if tasks or remaining <= 0:
+                return tasks
+            if len(jobs) == 1:
+                jobs[0][1].available_tasks.wait(min(remaining, self.poll_secs))
+                continue
+            with self.condition:
+                self.condition.wait(min(remaining, self.poll_secs))
+
+    def connect_queued_tasks(self, num_tasks: int, connection_id: str) -> List[Task]:
+        """
+        Connects up to num_tasks queued tasks, picking the job of each task with the FairShare policy
+
+        :param num_tasks:
+        :param connection_id:
+        :return List[Task]:
+        """
+        tasks: List[Task] = []
+        while len(tasks) < num_tasks:
+            with self.condition:
+                job_id: Optional[int] = self.fair_share.select(
+                    lambda ready_job_id: not self.jobs[ready_job_id].available_tasks.empty())
+                task_manager: Optional[TaskManager] = self.jobs.get(job_id)
+            if task_manager is None:
+                break
+            # another request may have taken the last task of the job since it was picked
+            task: Optional[Task] = task_manager.connect_queued_task(connection_id)
+            if task is None:
+                continue
+            with self.condition:
+                self.fair_share.charge(job_id, task.estimated_cost or 1.0)
+            tasks.append(task)
+        return tasks
+
+    def connection_dropped(self, connection_id: str):
+        """
+        Called by the master.ConnectionManager when a connection is removed.
+        Passes the dropped connection to the Task Manager of every job
+
+        :param connection_id:
+        :return:
+        """
+        with self.condition:
+            task_managers: List[TaskManager] = list(self.jobs.values())
+        for task_manager in task_managers:
+            task_manager.connection_dropped(connection_id)
+
+    def connection_suspended(self, connection_id: str):
+        """
+        Called by the master.ConnectionManager when a slave is suspected to have failed.
+        Passes the suspended connection to the Task Manager of every job
+
+        :param connection_id:
+        :return:
+        """
+        with self.condition:
+            task_managers: List[TaskManager] = list(self.jobs.values())
+        for task_manager in task_managers:
+            task_manager.connection_suspended(connection_id)
+
+    def connection_resumed(self, connection_id: str, held_task_ids: Optional[Set[int]] = None):
+        """
+        Called by the master.ConnectionManager when a suspended slave is seen again.
+        Passes the resumed connection to the Task Manager of every job
+
+        :param connection_id:
+        :param held_task_ids: ids of the tasks the slave still holds, all of them if None
+        :return:
+        """
+        with self.condition:
+            task_managers: List[TaskManager] = list(self.jobs.values())
+        for task_manager in task_managers:
+            task_manager.connection_resumed(connection_id, held_task_ids)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __contains__(self, job_id: int):
+        return job_id in self.jobs
@@ -0,0 +1,394 @@
+"""
+Write-ahead journal of task state transitions, used to resume a job after the master restarts
+"""
+
+from hashlib import blake2b
+from os import fsync, replace
+from struct import Struct, error as StructError
+from threading import Condition, Thread
+from typing import Dict, Iterable, List, Optional, Set
+
+from common.logging import Logger
+from common.task import Task
+from common.wire import WireFormatError, decode_tasks, encode_tasks
+
+logger = Logger()
+
+# record type, job or task id, length of the data that follows
+RECORD = Struct('<BqI')
+
+JOB = 0
+LOADED = 1
+DISPATCHED = 2
+REQUEUED = 3
+FINISHED = 4
+JOB_FINISHED = 5
+
+
+def job_identity(job_path: Optional[str], file_names: Iterable[str]) -> bytes:
+    """
+    Returns a digest of the directory and files of a job
+    A journaled job is only resumed by a job with the same identity
+
+    :param job_path:
+    :param file_names:
+    :return bytes:
+    """
+    digest = blake2b(digest_size=16)
+    for part in (job_path or '', *file_names):
+        digest.update(part.encode())
+        digest.update(b'\x00')
+    return digest.digest()
+
+
+class JournalState:
+    """
+    State of a job as rebuilt from its journal
+    Records set the state of a task outright, so replaying a record more than once is harmless
+    """
+    def __init__(self):
+        self.job_id: Optional[int] = None
+        # job_identity of the job, empty if it was not recorded
+        self.job_identity: bytes = b''
+        # unfinished tasks, in the order they were loaded
+        self.tasks: Dict[int, Task] = {}
+        # task id to the connection id the task was last dispatched to
+        self.dispatched: Dict[int, str] = {}
+        self.finished: Set[int] = set()
+
+    def apply(self, record_type: int, record_id: int, data: bytes):
+        """
+        Applies a journal record to the state
+
+        :param record_type:
+        :param record_id:
+        :param data:
+        :return:
+        """
+        if record_type == JOB:
+            if self.job_id is not None and record_id != self.job_id:
+                self.__init__()
+            self.job_id = record_id
+            self.job_identity = data
+        elif record_type == JOB_FINISHED:
+            # the job is done, so there is nothing to resume
+            self.__init__()
+        elif record_type == LOADED:
+            if record_id not in self.finished and record_id not in self.tasks:
+                self.tasks[record_id] = decode_tasks(data)[0]
+        elif record_type == DISPATCHED:
+            if record_id in self.tasks:
+                self.dispatched[record_id] = data.decode()
+        elif record_type == REQUEUED:
+            self.dispatched.pop(record_id, None)
+        elif record_type == FINISHED:
+            self.tasks.pop(record_id, None)
+            self.dispatched.pop(record_id, None)
+            self.finished.add(record_id)
+
+
+def pack_record(record_type: int, record_id: int, data: bytes = b'') -> bytes:
+    """
+    Returns the encoding of a journal record
+
+    :param record_type:
+    :param record_id:
+    :param data:
+    :return bytes:
+    """
+    return RECORD.pack(record_type, record_id, len(data)) + data
+
+
+class Journal:
+    """
+    Append-only journal of the task state transitions of a job: loaded, dispatched, requeued and finished
+    Records are buffered and a writer thread group commits them with one write and fsync every
+    flush_secs, so recording a transition never waits on the disk. A crash loses at most the
+    last flush_secs of transitions, which only means redoing those tasks.
+    Every compact_every records the journal is rewritten as a snapshot of its state.
+    Once the job finishes, a completion record is written and the journal is truncated,
+    so a master restarted with the same journal starts a new job
+    """
+    log_prefix = "[Journal]\n"
+
+    def __init__(self, path: str, flush_secs: float = 0.05, compact_every: int = 100000):
+        self.path = path
+        self.flush_secs = flush_secs
+        self.compact_every = compact_every
+        self.state: JournalState = JournalState()
+        self.pending: List[bytes] = []
+        # number of pending records to write before the file is truncated, if it is to be
+        self.truncate_after: Optional[int] = None
+        self.records_since_compaction = 0
+        self.condition: Condition = Condition()
+        self.running = True
+        self.thread: Optional[Thread] = None
+        self.replay()
+        self.file = open(path, 'ab')
+        logger.log_trace(f'{self.log_prefix}Journal opened at {path}')
+
+    def replay(self):
+        """
+        Rebuilds the state from the journal file, if there is one
+        A record cut short by a crash is ignored and truncated away
+
+        :return:
+        """
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            try:
+                record_type, record_id, length = RECORD.unpack_from(data, offset)
+                end = offset + RECORD.size + length
+                if end > len(data):
+                    break
+                self.state.apply(record_type, record_id, data[offset + RECORD.size:end])
+            except (StructError, WireFormatError, UnicodeDecodeError) as error:
+                logger.log_warn(f'{self.log_prefix}Corrupt journal record at {offset}\n{error}')
+                break
+            offset = end
+            self.records_since_compaction += 1
+        if offset < len(data):
+            logger.log_warn(f'{self.log_prefix}Truncating {len(data) - offset} bytes of incomplete journal')
+            with open(self.path, 'r+b') as file:
+                file.truncate(offset)
+        logger.log_trace(f'{self.log_prefix}Replayed job {self.state.job_id}: {len(self.state.tasks)} unfinished '
+                         f'and {len(self.state.finished)} finished tasks')
+
+    def record(self, record_type: int, record_id: int, data: bytes = b''):
+        """
+        Applies a record to the state and buffers it for the writer thread
+
+        :param record_type:
+        :param record_id:
+        :param data:
+        :return:
+        """
+        with self.condition:
+            self.state.apply(record_type, record_id, data)
+            self.buffer(pack_record(record_type, record_id, data))
+
+    def buffer(self, packed_record: bytes):
+        """
+        Buffers a packed record for the writer thread. Must be called while holding the condition
+
+        :param packed_record:
+        :return:
+        """
+        self.pending.append(packed_record)
+        self.start_writer()
+
+    def is_known(self, task_id: int) -> bool:
+        """
+        Returns True if the task was already loaded or finished
+
+        :param task_id:
+        :return Boolean:
+        """
+        with self.condition:
+            return task_id in self.state.finished or task_id in self.state.tasks
+
+    def job_started(self, job_id: int, identity: bytes = b''):
+        """
+        Records the job id
+
+        :param job_id:
+        :param identity: job_identity of the job
+        :return:
+        """
+        self.record(JOB, job_id, identity)
+
+    def job_finished(self):
+        """
+        Records the end of the job, then truncates the journal once the record is written
+        Does nothing if no job is journaled
+
+        :return:
+        """
+        with self.condition:
+            if self.state.job_id is None:
+                return
+            self.record(JOB_FINISHED, self.state.job_id)
+            self.truncate_after = len(self.pending)
+        logger.log_trace(f'{self.log_prefix}Job finished')
+
+    def reset(self):
+        """
+        Discards the journaled job, for a master that starts a different job
+
+        :return:
+        """
+        with self.condition:
+            self.state = JournalState()
+            self.pending = []
+            self.truncate_after = 0
+            self.start_writer()
+        logger.log_trace(f'{self.log_prefix}Journal reset')
+
+    def start_writer(self):
+        """
+        Starts the writer thread on first use. Must be called while holding the condition
+
+        :return:
+        """
+        if self.thread is None and self.running:
+            self.thread = Thread(name='journal_writer_thread', target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def task_loaded(self, task: Task):
+        """
+        Records a task added to the Available Tasks Queue
+
+        :param task:
+        :return:
+        """
+        data = encode_tasks([task])
+        with self.condition:
+            if self.is_known(task.task_id):
+                return
+            # the state keeps the task itself rather than decoding a copy of it
+            self.state.tasks[task.task_id] = task
+            self.buffer(pack_record(LOADED, task.task_id, data))
+
+    def task_dispatched(self, task_id: int, connection_id: str):
+        """
+        Records a task connected to a slave
+
+        :param task_id:
+        :param connection_id:
+        :return:
+        """
+        self.record(DISPATCHED, task_id, connection_id.encode())
+
+    def task_requeued(self, task_id: int):
+        """
+        Records an in progress task moved back to the Available Tasks Queue
+
+        :param task_id:
+        :return:
+        """
+        self.record(REQUEUED, task_id)
+
+    def task_finished(self, task_id: int):
+        """
+        Records a completed task
+
+        :param task_id:
+        :return:
+        """
+        self.record(FINISHED, task_id)
+
+    def run(self):
+        """
+        Writer loop. Group commits the buffered records every flush_secs
+
+        :return:
+        """
+        while True:
+            with self.condition:
+                if not self.pending and self.truncate_after is None:
+                    if not self.running:
+                        return
+                    self.condition.wait(self.flush_secs)
+            try:
+                self.flush()
+                if self.records_since_compaction >= self.compact_every:
+                    self.compact()
+            except OSError as error:
+                logger.log_error(f'{self.log_prefix}Unable to write journal\n{error}')
+
+    def flush(self):
+        """
+        Writes the buffered records with a single write and fsync
+        Only the writer thread, or close once it has stopped, writes the file, so the disk
+        is accessed without holding the lock that recording a transition needs.
+        If the job finished, the file is truncated once the records up to its completion are written
+
+        :return:
+        """
+        with self.condition:
+            records, self.pending = self.pending, []
+            truncate_after, self.truncate_after = self.truncate_after, None
+        if truncate_after is not None:
+            self.write(records[:truncate_after])
+            self.file.truncate(0)
+            self.records_since_compaction = 0
+            records = records[truncate_after:]
+            logger.log_trace(f'{self.log_prefix}Journal truncated')
+        self.write(records)
+
+    def write(self, records: List[bytes]):
+        """
+        Appends records to the file with a single write and fsync
+
+        :param records:
+        :return:
+        """
+        if not records:
+            return
+        self.records_since_compaction += len(records)
+        self.file.write(b''.join(records))
+        self.file.flush()
+        fsync(self.file.fileno())
+
+    def compact(self):
+        """
+        Rewrites the journal as a snapshot of its state
+        Records made while the snapshot is written are appended after it
+
+        :return:
+        """
+        with self.condition:
+            job_id = self.state.job_id
+            identity = self.state.job_identity
+            finished = list(self.state.finished)
+            tasks = list(self.state.tasks.values())
+            dispatched = list(self.state.dispatched.items())
+            # buffered records are already part of the state, so the snapshot covers them
+            self.pending = []
+            self.truncate_after = None
+        compact_path = f'{self.path}.compact'
+        with open(compact_path, 'wb') as file:
+            if job_id is not None:
+                file.write(pack_record(JOB, job_id, identity))
+            file.write(b''.join(pack_record(FINISHED, task_id) for task_id in finished))
+            for task in tasks:
+                file.write(pack_record(LOADED, task.task_id, encode_tasks([task])))
+            file.write(b''.join(pack_record(DISPATCHED, task_id, connection_id.encode())
+                                for task_id, connection_id in dispatched))
+            with self.condition:
+                records, self.pending = self.pending, []
+                if self.truncate_after is not None:
+                    # the job finished while the snapshot was written
+                    records, self.truncate_after = records[self.truncate_after:], None
+                    file.seek(0)
+                    file.truncate()
+            file.write(b''.join(records))
+            file.flush()
+            fsync(file.fileno())
+        self.file.close()
+        replace(compact_path, self.path)
+        self.file = open(self.path, 'ab')
+        self.records_since_compaction = len(records)
+        logger.log_trace(f'{self.log_prefix}Compacted journal to {len(tasks)} unfinished '
+                         f'and {len(finished)} finished tasks')
+
+    def close(self):
+        """
+        Flushes the buffered records, stops the writer thread and closes the file
+
+        :return:
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        self.file.close()
+        logger.log_trace(f'{self.log_prefix}Journal closed')
@@ -0,0 +1,82 @@
+"""
+Lease Manager tracks task lease deadlines for the Task Manager
+"""
+
+from heapq import heappop, heappush
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable, List, Tuple
+
+from common.logging import Logger
+
+logger = Logger()
+
+
+class LeaseManager:
+    """
+    Keeps a min-heap of task lease deadlines and calls back when a lease expires
+    A single scheduler thread sleeps until the earliest deadline.
+    Renewed or finished leases are not removed from the heap, the callback
+    receives the expired deadline and is expected to ignore stale entries
+    """
+    log_prefix = "[LeaseManager]\n"
+
+    def __init__(self, on_lease_expired: Callable[[int, float], None]):
+        self.on_lease_expired = on_lease_expired
+        self.leases: List[Tuple[float, int]] = []
+        self.condition: Condition = Condition()
+        self.running = True
+        self.thread: Thread = None
+        logger.log_trace(f'{self.log_prefix}Lease Manager Initialized')
+
+    def add_lease(self, task_id: int, expiry: float):
+        """
+        Adds a lease deadline for a task
+        Starts the scheduler thread on first use
+
+        :param task_id:
+        :param expiry: monotonic time at which the lease expires
+        :return:
+        """
+        with self.condition:
+            heappush(self.leases, (expiry, task_id))
+            if self.thread is None and self.running:
+                self.thread = Thread(name='lease_manager_thread', target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+            # wake the scheduler if this lease is now the earliest deadline
+            if self.leases[0][1] == task_id:
+                self.condition.notify()
+
+    def run(self):
+        """
+        Scheduler loop. Pops expired leases off the heap and calls back for each
+
+        :return:
+        """
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if not self.leases:
+                    self.condition.wait()
+                    continue
+                delay = self.leases[0][0] - monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                expiry, task_id = heappop(self.leases)
+            try:
+                self.on_lease_expired(task_id, expiry)
+            except Exception as error:
+                logger.log_error(f'{self.log_prefix}Lease expiry for task {task_id} failed\n{error}')
+
+    def stop(self):
+        """
+        Stops the scheduler thread
+
+        :return:
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
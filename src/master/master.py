@@ -3,6 +3,7 @@ Implemented functionality to run a master node for a distributed workload
 """
 
 # External imports
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from json import dumps as json_dumps
 from math import ceil
@@ -11,18 +12,27 @@ from pathlib import Path
 from pickle import dumps as pickle_dumps, loads as pickle_loads, PicklingError, UnpicklingError
 from random import random
 from sys import exit as sys_exit
-from typing import List
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
 from zlib import compress, decompress, error as CompressionException
 from flask import Flask, Response, jsonify, request, send_file
 
 # Internal imports
 import common.api.endpoints as endpoints
 from common.api.types import MasterInfo
+from common.discovery import DISCOVERY_PORT
 from common.logging import Logger
 from common.networking import get_ip_addr
 from common.task import Task, TaskMessageType
+from common.wire import MIME_TYPE as TASKS_MIME_TYPE, WireFormatError, decode_tasks, encode_tasks, is_task_batch
+from .beacon import DiscoveryBeacon
 from .status_manager import StatusManager
 from .connection_manager import ConnectionManager
+from .job_scheduler import JobScheduler
+from .journal import Journal, job_identity
+from .result_cache import ResultCache
+from .result_store import ResultStore
+from .server_config import ServerConfig
 from .task_manager import TaskManager, NoMoreTasks, NoMoreAvailableTasks
 
 logger = Logger()
@@ -48,8 +58,14 @@ class JobNotInitialized(AttributeError):
 
 class WrongJob(Exception):
     """
-    Exception raised when an endpoint's job id is not associated to this
-    master's current job
+    Exception raised when an endpoint's job id is not associated to any
+    job of this master
+    """
+
+
+class RequestTooLarge(Exception):
+    """
+    Exception raised when a slave sends a request larger than the server allows
     """
 
 
@@ -58,35 +74,207 @@ class HyperMaster:
     HyperMaster Class.
     """
 
-    def __init__(self, host="0.0.0.0", port=5678):
+    def __init__(self, host="0.0.0.0", port=5678, max_long_poll_secs: float = 30.0,
+                 result_path: str = None, journal_path: str = None, incremental: bool = False,
+                 result_cache_bytes: int = 0, long_lived: bool = False, server_config: ServerConfig = None,
+                 phi_threshold: float = 8.0, session_grace_secs: float = 60.0,
+                 discovery_port: Optional[int] = DISCOVERY_PORT):
         self.host = host
         self.port = port
+        self.max_long_poll_secs = max_long_poll_secs
         self.test_config = None
+        self.server_config: ServerConfig = server_config or ServerConfig()
+        # taken by each long polling request, see ServerConfig
+        self.long_polls: BoundedSemaphore = BoundedSemaphore(self.server_config.max_long_polls)
         self.status_manager = StatusManager()
-        self.task_manager = TaskManager(self.status_manager)
+        # finished tasks are kept in an on-disk Result Store at result_path, if it is set
+        # in incremental mode, loaded tasks that already have a result in it are not run again.
+        # Otherwise the results of a previous run are discarded once a new job starts, see init_job
+        if incremental and not result_path:
+            logger.log_error('Incremental mode needs a result path')
+            raise ValueError
+        self.incremental = incremental
+        self.result_store: Optional[ResultStore] = \
+            ResultStore(result_path, keep_previous=incremental or bool(journal_path)) if result_path else None
+        # task state transitions are journaled at journal_path, if it is set, so the job can be resumed
+        self.journal: Optional[Journal] = Journal(journal_path) if journal_path else None
+        # results are cached by task content, across jobs, if result_cache_bytes is set
+        self.result_cache: Optional[ResultCache] = ResultCache(result_cache_bytes) if result_cache_bytes > 0 else None
+        self.task_manager = TaskManager(self.status_manager, result_store=self.result_store,
+                                        journal=self.journal, incremental=incremental,
+                                        result_cache=self.result_cache)
+        # shares the slaves between the current job and the jobs submitted while the master runs
+        # a long-lived master keeps its slaves connected once every job is done, waiting for more jobs
+        self.scheduler: JobScheduler = JobScheduler(long_lived)
+        # a slave's tasks are handed to other slaves once the suspicion that it failed reaches phi_threshold
+        # a slave that comes back within session_grace_secs resumes the tasks nobody else took over
         self.conn_manager: ConnectionManager = \
-            ConnectionManager(self.task_manager, self.status_manager)
+            ConnectionManager(self.scheduler, self.status_manager, phi_threshold=phi_threshold,
+                              grace_secs=session_grace_secs)
         self.job: JobInfo = JobInfo()
-
-    def load_tasks(self, tasks: List[Task]):
+        # jobs submitted with submit_job, by job id
+        self.submitted_jobs: Dict[int, JobInfo] = {}
+        # every job id handed out by this master, including those of removed jobs
+        self.job_ids: Set[int] = set()
+        # completed tasks are passed to completion_callback on callback_executor, see on_task_completed
+        self.completion_callback: Optional[Callable[[Task], None]] = None
+        self.callback_executor: Optional[ThreadPoolExecutor] = None
+        self.callback_executor_lock: Lock = Lock()
+        # taken by each completed task waiting for or running the callback
+        self.pending_callbacks: Optional[BoundedSemaphore] = None
+        # slaves find the master through the beacon on the UDP discovery port, unless it is None
+        self.discovery_port = discovery_port
+        self.beacon: Optional[DiscoveryBeacon] = None
+
+    def load_tasks(self, tasks: Iterable[Task], estimated_total: int = None, window: int = 1000):
         """
-        Loads tasks into the Task Manager
+        Loads tasks of the current job into the Task Manager
         Meant to be used by app that imports master to load prepared tasks
+        A list is loaded at once. Any other iterable, such as a generator, is read lazily,
+        see TaskManager.load_tasks
 
         :param tasks:
+        :param estimated_total:
+        :param window:
         :return:
         """
         if not hasattr(self.job, 'job_id'):
             logger.log_error("Can't load tasks for uninitialized job")
             raise JobNotInitialized
 
-        self.task_manager.add_new_available_tasks(tasks, self.job.job_id)
-        self.status_manager.tasks_loaded(len(tasks))
+        self.scheduler.add_job(self.job.job_id, self.task_manager)
+        self.task_manager.load_tasks(tasks, self.job.job_id, estimated_total, window)
+
+    def new_job_id(self) -> int:
+        """
+        Returns a job id not yet handed out by this master
+
+        :return Integer:
+        """
+        while True:
+            job_id = ceil(random() * random() * 9999)
+            if job_id not in self.job_ids:
+                self.job_ids.add(job_id)
+                return job_id
+
+    def submit_job(self, job: JobInfo, tasks: Iterable[Task], estimated_total: int = None,
+                   window: int = 1000, weight: float = 1.0, interactive: bool = False) -> int:
+        """
+        Submits a job to run alongside the current job and any other submitted job
+        The job gets its own task queue and status, and the connected slaves take its
+        tasks without restarting. Tasks are loaded as in load_tasks.
+        Jobs get slave time in proportion to their weights, and the tasks of interactive jobs
+        are dispatched before those of batch jobs
+        Submitted jobs are not journaled and their results are not kept in the Result Store
+        Returns the job id
+
+        :param job:
+        :param tasks:
+        :param estimated_total:
+        :param window:
+        :param weight:
+        :param interactive:
+        :return Integer:
+        """
+        for file_name in job.file_names:
+            if not Path(f'{job.job_path}/{file_name}').exists():
+                logger.log_error(f'{file_name} not found in job folder. Cannot submit job')
+                raise FileNotFoundError(file_name)
+
+        job.job_id = self.new_job_id()
+        status_manager = StatusManager()
+        status_manager.job_id = job.job_id
+        task_manager = TaskManager(status_manager, result_cache=self.result_cache)
+        if self.completion_callback is not None:
+            task_manager.set_completion_callback(self.dispatch_completed)
+        if self.result_cache is not None:
+            self.result_cache.set_job_files(job.job_path, job.file_names, job.job_id)
+        self.submitted_jobs[job.job_id] = job
+        self.scheduler.add_job(job.job_id, task_manager, weight, interactive)
+        task_manager.load_tasks(tasks, job.job_id, estimated_total, window)
+        logger.log_success(f'Job {job.job_id} submitted ')
+        return job.job_id
+
+    def set_job_share(self, job_id: int, weight: float = 1.0, interactive: bool = False):
+        """
+        Sets the weight and class of the current job or of a submitted job
+        Raises KeyError if the master has no such job
+
+        :param job_id:
+        :param weight:
+        :param interactive:
+        :return:
+        """
+        self.scheduler.set_share(job_id, weight, interactive)
+
+    def remove_job(self, job_id: int):
+        """
+        Removes a submitted job, along with its unfinished tasks and its completed tasks
+        Meant to be called once the app that submitted the job is done with it
+        Raises KeyError if no job with the job id was submitted
+
+        :param job_id:
+        :return:
+        """
+        self.submitted_jobs.pop(job_id)
+        task_manager: Optional[TaskManager] = self.scheduler.remove_job(job_id)
+        if task_manager is not None:
+            # stops the loader of a lazy task source
+            task_manager.available_tasks.close()
+        if self.result_cache is not None:
+            self.result_cache.remove_job_files(job_id)
+        logger.log_info(f'Job {job_id} removed')
+
+    def get_task_manager(self, job_id: int = None) -> TaskManager:
+        """
+        Returns the Task Manager of a job, the current job by default
+        Raises KeyError if the master has no such job
+
+        :param job_id:
+        :return TaskManager:
+        """
+        if job_id is None or job_id == getattr(self.job, 'job_id', None):
+            return self.task_manager
+        task_manager: Optional[TaskManager] = self.scheduler.get_task_manager(job_id)
+        if task_manager is None:
+            raise KeyError(job_id)
+        return task_manager
+
+    def get_job_info(self, job_id: int) -> Optional[JobInfo]:
+        """
+        Returns the JobInfo of a job, or None if the master has no such job
+
+        :param job_id:
+        :return JobInfo or None:
+        """
+        if job_id == getattr(self.job, 'job_id', None):
+            return self.job
+        return self.submitted_jobs.get(job_id)
+
+    def job_for_slave(self) -> Optional[JobInfo]:
+        """
+        Returns the job given to a slave that requests one: the current job while it is not done,
+        otherwise a submitted job that is not done, or None if there is no such job
+
+        :return JobInfo or None:
+        """
+        if not self.is_job_done() and \
+                (hasattr(self.job, 'job_id') or not (self.scheduler.long_lived or self.submitted_jobs)):
+            return self.job
+        for job_id, job in list(self.submitted_jobs.items()):
+            task_manager: Optional[TaskManager] = self.scheduler.get_task_manager(job_id)
+            if task_manager is not None and not task_manager.status_manager.is_job_done():
+                return job
+        return None
 
     def init_job(self, job: JobInfo):
         """
         Initializes the job for the master.
         Ensures job files exist
+        If the journal holds an unfinished job with the same directory and files, that job is resumed
+        with the same job id, its unfinished tasks are restored and the stored results of its finished
+        tasks are kept. Loading the same tasks again skips those already restored or finished.
+        The journal of a different job is discarded, and so are the stored results unless in incremental mode
 
         :param job:
         :return:
@@ -98,19 +286,110 @@ class HyperMaster:
                     f'{file_name} not found in job folder. Cannot continue')
                 sys_exit(1)
 
+        if hasattr(self.job, 'job_id'):
+            self.scheduler.remove_job(self.job.job_id)
         self.job = job
-        self.job.job_id = ceil(random() * random() * 9999)
+        identity: bytes = job_identity(getattr(job, 'job_path', None), job.file_names)
+        if self.journal is not None and self.journal.state.job_id is not None \
+                and self.journal.state.job_identity != identity:
+            logger.log_warn(f'Journal holds job {self.journal.state.job_id} with different job files. Not resuming it')
+            self.journal.reset()
+        if self.journal is not None and self.journal.state.job_id is not None:
+            self.job.job_id = self.journal.state.job_id
+            self.job_ids.add(self.job.job_id)
+            self.status_manager.job_id = self.job.job_id
+            if self.result_cache is not None:
+                self.result_cache.set_job_files(job.job_path, job.file_names, self.job.job_id)
+            self.scheduler.add_job(self.job.job_id, self.task_manager)
+            if self.result_store is not None:
+                # the results of the tasks finished before the restart are results of the resumed job
+                for task_id in self.journal.state.finished:
+                    self.result_store.reuse(task_id)
+            num_finished = len(self.journal.state.finished)
+            num_restored = self.task_manager.restore()
+            if num_finished + num_restored > 0:
+                self.status_manager.tasks_loaded(num_finished + num_restored)
+            if num_finished > 0:
+                self.status_manager.tasks_completed(num_finished)
+            logger.log_success(f'Job {self.job.job_id} resumed with {num_finished} tasks already done ')
+            return
+
+        self.job.job_id = self.new_job_id()
         self.status_manager.job_id = self.job.job_id
+        if self.result_cache is not None:
+            self.result_cache.set_job_files(job.job_path, job.file_names, self.job.job_id)
+        if self.result_store is not None and not self.incremental:
+            self.result_store.discard_previous()
+        self.scheduler.add_job(self.job.job_id, self.task_manager)
+        if self.journal is not None:
+            self.journal.job_started(self.job.job_id, identity)
         logger.log_success(f'Job {self.job.job_id} initialized ')
 
-    def start_server(self):
+    def start_server(self, debug: bool = False):
         """
         Starts the server
+        Serves the master with the multi-threaded production server, configured by server_config,
+        or with the Flask development server and its debugger if debug is set.
+        The master is announced on the discovery port while it serves, and the journal is closed when it stops
 
+        :param debug:
         :return:
         """
         app = create_app(self)
-        app.run(host=self.host, port=self.port, debug=True, use_reloader=False)
+        self.start_beacon()
+        try:
+            if debug:
+                app.run(host=self.host, port=self.port, debug=True, use_reloader=False)
+                return
+            server = self.create_server(app)
+            logger.log_success(f'Serving on {self.host}:{self.port} with {self.server_config.threads} threads')
+            server.run()
+        finally:
+            self.stop_beacon()
+            if self.journal is not None:
+                self.journal.close()
+
+    def start_beacon(self):
+        """
+        Starts announcing the master on the discovery port, if it is set
+        The master can still be found by scanning if the port is taken
+
+        :return:
+        """
+        if self.discovery_port is None:
+            return
+        self.beacon = DiscoveryBeacon(self.port, self.discovery_port)
+        try:
+            self.beacon.start()
+        except OSError as error:
+            logger.log_warn(f'Discovery beacon could not start, slaves will scan for the master\n{error}')
+            self.beacon = None
+
+    def stop_beacon(self):
+        """
+        Stops announcing the master
+
+        :return:
+        """
+        if self.beacon is not None:
+            self.beacon.stop()
+            self.beacon = None
+
+    def create_server(self, app: Flask):
+        """
+        Creates the production server for the app, listening on the master's host and port
+
+        :param app:
+        :return waitress server:
+        """
+        # waitress is only needed to serve the master, not to use it with the Flask test client
+        from waitress import create_server  # pylint: disable=C0415
+
+        config = self.server_config
+        return create_server(app, host=self.host, port=self.port, threads=config.threads,
+                             connection_limit=config.connection_limit, channel_timeout=config.keep_alive_secs,
+                             backlog=config.backlog, max_request_body_size=config.max_request_bytes,
+                             ident='hypercube')
 
     def create_routes(self, app):
         """
@@ -121,6 +400,9 @@ class HyperMaster:
         """
 
         def job_check(job_id: int):
+            # slaves of a master running several jobs may name any of them
+            if job_id in self.job_ids:
+                return
             if not hasattr(self.job, 'job_id'):
                 logger.log_error("Uninitialized Job")
                 raise JobNotInitialized
@@ -136,6 +418,106 @@ class HyperMaster:
                 attachment_filename=file_name
             )
 
+        def encode_tasks_body(tasks: List[Task]) -> bytes:
+            """
+            Encodes tasks in the binary task batch format if the slave accepts it,
+            otherwise as compressed pickled tasks
+
+            :param tasks:
+            :return bytes:
+            """
+            if TASKS_MIME_TYPE in request.headers.get('Accept', ''):
+                return encode_tasks(tasks)
+            return compress(pickle_dumps(tasks))
+
+        def decode_tasks_body(raw_data: bytes) -> List[Task]:
+            """
+            Decodes tasks sent by a slave in either the binary task batch format
+            or as compressed pickled tasks
+
+            :param raw_data:
+            :return List[Task]:
+            """
+            if is_task_batch(raw_data):
+                return decode_tasks(raw_data)
+            return pickle_loads(decompress(raw_data))
+
+        def check_tasks_done_size():
+            """
+            Raises RequestTooLarge if the completed tasks sent by the slave exceed max_tasks_done_bytes
+
+            :return:
+            """
+            content_length: Optional[int] = request.content_length
+            if content_length is not None and content_length > self.server_config.max_tasks_done_bytes:
+                logger.log_warn(f'Completed tasks of {content_length} bytes exceed the size limit')
+                raise RequestTooLarge
+
+        def finish_tasks(tasks: List[Task], conn_id: str):
+            """
+            Hands completed tasks to the Task Managers of their jobs
+            Results of tasks of a removed job are dropped
+
+            :param tasks:
+            :param conn_id:
+            :return:
+            """
+            if not self.submitted_jobs:
+                self.task_manager.tasks_finished(tasks, conn_id)
+                return
+            tasks_by_job: Dict[Optional[int], List[Task]] = {}
+            for task in tasks:
+                tasks_by_job.setdefault(getattr(task, 'job_id', None), []).append(task)
+            for task_job_id, job_tasks in tasks_by_job.items():
+                try:
+                    self.get_task_manager(task_job_id).tasks_finished(job_tasks, conn_id)
+                except KeyError:
+                    logger.log_warn(f'Dropping {len(job_tasks)} results of removed job {task_job_id}')
+
+        def create_tasks_resp(job_id: int, num_tasks: int, conn_id: str):
+            """
+            Connects up to num_tasks tasks to the slave and returns them "formatted" for the slave
+            With several jobs, or on a long-lived master, the tasks may belong to any job
+            Long polls for up to the 'wait' query argument seconds when no task is available.
+            If too many requests are long polling already, answers straight away with a Retry-After header
+
+            :param job_id:
+            :param num_tasks:
+            :param conn_id:
+            :return Any:
+            """
+            wait_secs = min(max(request.args.get('wait', default=0.0, type=float), 0.0),
+                            self.max_long_poll_secs)
+            # a long poll is only admitted while it leaves the reserved threads free
+            long_polling = wait_secs > 0 and self.long_polls.acquire(blocking=False)
+            try:
+                connect_available_tasks = self.scheduler.connect_available_tasks \
+                    if self.submitted_jobs or self.scheduler.long_lived else self.task_manager.connect_available_tasks
+                tasks: List[Task] = connect_available_tasks(num_tasks, conn_id, wait_secs if long_polling else 0.0)
+                if not tasks:
+                    raise NoMoreAvailableTasks
+                return create_binary_resp(encode_tasks_body(tasks), f'tasks_job_{job_id}')
+
+            except NoMoreAvailableTasks:
+                if wait_secs > 0 and not long_polling:
+                    # the slave asked to wait but was not let, so it waits before asking again
+                    return Response(status=42, headers={'Retry-After': '1'})
+                return Response(status=42)
+
+            except NoMoreTasks:
+                if self.submitted_jobs or self.status_manager.is_job_done():
+                    job_finished_task = Task(-1, "", [], None, "", "")
+                    job_finished_task.set_message_type(TaskMessageType.JOB_END)
+                    return create_binary_resp(encode_tasks_body([job_finished_task]),
+                                              f'job_{job_id}_done')
+
+                logger.log_error('Unable to retrieve tasks from manager')
+                return Response(status=500)
+
+            finally:
+                if long_polling:
+                    self.long_polls.release()
+
         @app.route(f'/{endpoints.JOB}')
         # pylint: disable=W0612
         def get_job():
@@ -144,17 +526,42 @@ class HyperMaster:
 
             :return Any:
             """
-            if self.is_job_done():
-                return Response(status=404)
+            job: Optional[JobInfo] = self.job_for_slave()
+            if job is None:
+                # a long-lived master keeps the slave waiting for the next job
+                return Response(status=42 if self.scheduler.long_lived else 404)
 
             conn_id = request.cookies.get('id')
+            # a reconnecting slave lists the tasks it still holds, so only those are given back to it
+            held = request.args.get('held')
+            try:
+                held_task_ids: Optional[Set[int]] = None if held is None else \
+                    {int(task_id) for task_id in held.split(',') if task_id}
+            except ValueError:
+                return Response(status=400)
 
             logger.log_info(
                 f'Job request from {conn_id},\nSaving connection...')
-            self.conn_manager.add_connection(conn_id)
+            self.conn_manager.add_connection(conn_id, held_task_ids=held_task_ids)
 
             # read and parse the JSON
-            job_json = json_dumps(self.job, default=lambda o: o.__dict__, sort_keys=True)
+            job_json = json_dumps(job, default=lambda o: o.__dict__, sort_keys=True)
+            return jsonify(job_json)
+
+        @app.route(f'/{endpoints.JOB}/<int:job_id>')
+        # pylint: disable=W0612
+        def get_job_by_id(job_id: int):
+            """
+            Endpoint to handle a request for a job by a slave that received one of its tasks
+
+            :param job_id:
+            :return Any:
+            """
+            job: Optional[JobInfo] = self.get_job_info(job_id)
+            if job is None:
+                return Response(status=404)
+
+            job_json = json_dumps(job, default=lambda o: o.__dict__, sort_keys=True)
             return jsonify(job_json)
 
         @app.route(f'/{endpoints.FILE}/<int:job_id>/<string:file_name>', methods=["GET"])
@@ -169,7 +576,10 @@ class HyperMaster:
             """
             try:
                 job_check(job_id)
-                with open(f'{self.job.job_path}/{file_name}', "rb") as file:
+                job: Optional[JobInfo] = self.get_job_info(job_id)
+                if job is None:
+                    raise FileNotFoundError(file_name)
+                with open(f'{job.job_path}/{file_name}', "rb") as file:
                     file_data = file.read()
                     compressed_data = compress(file_data)
                     logger.log_info(
@@ -200,6 +610,8 @@ class HyperMaster:
             """
             fetch task from the queue
             return this task "formatted" back to slave
+            The optional 'wait' query argument long polls for up to that many seconds
+            (capped at max_long_poll_secs) when no task is available
 
             :param job_id: Integer
             :param num_tasks: Integer
@@ -208,24 +620,7 @@ class HyperMaster:
             try:
                 conn_id = request.cookies.get('id')
                 job_check(job_id)
-                tasks: List[Task] = self.task_manager.connect_available_tasks(num_tasks, conn_id)
-                pickled_tasks = pickle_dumps(tasks)
-                compressed_data = compress(pickled_tasks)
-                return create_binary_resp(compressed_data, f'tasks_job_{self.job.job_id}')
-
-            except NoMoreAvailableTasks:
-                return Response(status=42)
-
-            except NoMoreTasks:
-                if self.status_manager.is_job_done():
-                    job_finished_task = Task(-1, "", [], None, "", "")
-                    job_finished_task.set_message_type(TaskMessageType.JOB_END)
-                    pickled_tasks = pickle_dumps([job_finished_task])
-                    compressed_data = compress(pickled_tasks)
-                    return create_binary_resp(compressed_data, f'job_{self.job.job_id}_done')
-
-                logger.log_error('Unable to retrieve tasks from manager')
-                return Response(status=500)
+                return create_tasks_resp(job_id, num_tasks, conn_id)
 
             except JobNotInitialized:
                 return Response(response="Job Not Initialized", status=403)
@@ -237,6 +632,10 @@ class HyperMaster:
                 logger.log_error(f'Unable to pickle tasks\n{error}')
                 return Response(status=500)
 
+            except WireFormatError as error:
+                logger.log_error(f'Unable to encode tasks\n{error}')
+                return Response(status=500)
+
             except CompressionException as error:
                 logger.log_error(f'Unable to compress pickled tasks\n{error}')
                 return Response(status=500)
@@ -257,10 +656,12 @@ class HyperMaster:
             :return Response:
             """
             try:
+                conn_id = request.cookies.get('id')
                 job_check(job_id)
+                check_tasks_done_size()
                 raw_data = request.get_data()
-                tasks: List[Task] = pickle_loads(decompress(raw_data))
-                self.task_manager.tasks_finished(tasks)
+                tasks: List[Task] = decode_tasks_body(raw_data)
+                finish_tasks(tasks, conn_id)
                 return Response(status=200)
 
             except JobNotInitialized:
@@ -269,6 +670,9 @@ class HyperMaster:
             except WrongJob:
                 return Response(response="Wrong Master", status=403)
 
+            except RequestTooLarge:
+                return Response(response="Completed Tasks Too Large", status=413)
+
             except CompressionException as error:
                 logger.log_error(f'Unable to decompress raw data\n{error}')
                 return Response(status=500)
@@ -277,6 +681,88 @@ class HyperMaster:
                 logger.log_error(f'Unable to unpickle decompressed tasks\n{error}')
                 return Response(status=500)
 
+            except WireFormatError as error:
+                logger.log_error(f'Unable to decode tasks\n{error}')
+                return Response(status=500)
+
+            except Exception as error:
+                logger.log_error(f'{type(error)} {error}')
+                return Response(status=501)
+
+        @app.route(f'/{endpoints.TASKS_EXCHANGE}/<int:job_id>/<int:num_tasks>', methods=["POST"])
+        # pylint: disable=W0612
+        def tasks_exchange(job_id: int, num_tasks: int):
+            """
+            Gets completed tasks and returns the next tasks for the slave in the same round trip
+            Accepts the same 'wait' query argument as the tasks endpoint
+
+            :param job_id:
+            :param num_tasks:
+            :return Any:
+            """
+            try:
+                conn_id = request.cookies.get('id')
+                job_check(job_id)
+                check_tasks_done_size()
+                raw_data = request.get_data()
+                if raw_data:
+                    tasks: List[Task] = decode_tasks_body(raw_data)
+                    finish_tasks(tasks, conn_id)
+                return create_tasks_resp(job_id, num_tasks, conn_id)
+
+            except JobNotInitialized:
+                return Response(response="Job Not Initialized", status=403)
+
+            except WrongJob:
+                return Response(response="Wrong Master", status=403)
+
+            except RequestTooLarge:
+                return Response(response="Completed Tasks Too Large", status=413)
+
+            except CompressionException as error:
+                logger.log_error(f'Unable to (de)compress tasks\n{error}')
+                return Response(status=500)
+
+            except (PicklingError, UnpicklingError) as error:
+                logger.log_error(f'Unable to (un)pickle tasks\n{error}')
+                return Response(status=500)
+
+            except WireFormatError as error:
+                logger.log_error(f'Unable to encode or decode tasks\n{error}')
+                return Response(status=500)
+
+            except Exception as error:
+                logger.log_error(f'{type(error)} {error}')
+                return Response(status=501)
+
+        @app.route(f'/{endpoints.RENEW_LEASES}/<int:job_id>', methods=["POST"])
+        # pylint: disable=W0612
+        def renew_leases(job_id: int):
+            """
+            Renews the leases of long running tasks held by the slave
+            Expects a JSON list of task ids. With several jobs, the leases the slave holds
+            in any of them are renewed
+
+            :param job_id:
+            :return Response:
+            """
+            try:
+                conn_id = request.cookies.get('id')
+                job_check(job_id)
+                task_ids: List[int] = request.get_json(force=True)
+                renewed = self.task_manager.renew_leases(task_ids, conn_id)
+                for submitted_job_id in list(self.submitted_jobs):
+                    task_manager: Optional[TaskManager] = self.scheduler.get_task_manager(submitted_job_id)
+                    if task_manager is not None:
+                        renewed += task_manager.renew_leases(task_ids, conn_id)
+                return jsonify(renewed)
+
+            except JobNotInitialized:
+                return Response(response="Job Not Initialized", status=403)
+
+            except WrongJob:
+                return Response(response="Wrong Master", status=403)
+
             except Exception as error:
                 logger.log_error(f'{type(error)} {error}')
                 return Response(status=501)
@@ -308,21 +794,49 @@ class HyperMaster:
 
             return Response(status=200)
 
-    def is_job_done(self):
+        @app.route(f'/{endpoints.LEAVE}', methods=['POST'])
+        # pylint: disable=W0612
+        def leave():
+            """
+            A draining slave is leaving. Its unfinished tasks are handed to other slaves straight away
+
+            :return Response:
+            """
+            conn_id = request.cookies.get('id')
+            self.conn_manager.remove_connection(conn_id)
+
+            return Response(status=200)
+
+    def is_job_done(self, job_id: int = None):
         """
         Convenience Function that calls StatusManager function of same name
+        for a job, the current job by default
 
+        :param job_id:
         :return Boolean:
         """
-        return self.status_manager.is_job_done()
+        return self.get_task_manager(job_id).status_manager.is_job_done()
 
-    def get_status(self):
+    def is_job_failed(self, job_id: int = None):
         """
         Convenience Function that calls StatusManager function of same name
+        for a job, the current job by default
+        A failed job is also done, see is_job_done
+
+        :param job_id:
+        :return Boolean:
+        """
+        return self.get_task_manager(job_id).status_manager.is_job_failed()
 
+    def get_status(self, job_id: int = None):
+        """
+        Convenience Function that calls StatusManager function of same name
+        for a job, the current job by default
+
+        :param job_id:
         :return String:
         """
-        return self.status_manager.get_status()
+        return self.get_task_manager(job_id).status_manager.get_status()
 
     def print_status(self):
         """
@@ -331,17 +845,102 @@ class HyperMaster:
         :return:
         """
         self.status_manager.print_status()
-        # TODO: Below Is a BAD Hot Fix, find real issue later
-        # Issue is the connection cleanup timer stops running for some reason.
-        self.conn_manager.cleanup_connections()
 
-    def get_completed_tasks(self):
+    def get_completed_tasks(self, job_id: int = None):
         """
-        Returns completed tasks from the TaskManager
+        Returns completed tasks of a job, the current job by default, from its TaskManager
 
+        :param job_id:
         :return List[Task]:
         """
-        return self.task_manager.flush_finished_tasks()
+        return self.get_task_manager(job_id).flush_finished_tasks()
+
+    def get_result(self, task_id: int) -> Task:
+        """
+        Returns the completed task with the task id from the Result Store
+        Raises KeyError if the task has no stored result
+
+        :param task_id:
+        :return Task:
+        """
+        if self.result_store is None:
+            raise KeyError(task_id)
+        return self.result_store.get_result(task_id)
+
+    def iter_completed(self, job_id: int = None) -> Iterator[Task]:
+        """
+        Yields completed tasks of a job, the current job by default, as they arrive, until the job is done
+        Meant to be used by app that imports master to process results while the job runs
+
+        :param job_id:
+        :return Iterator[Task]:
+        """
+        return self.get_task_manager(job_id).iter_finished_tasks()
+
+    def on_task_completed(self, callback: Callable[[Task], None], max_workers: int = None, max_pending: int = 1000):
+        """
+        Calls the callback with each completed task, of the current job and of every submitted job,
+        on a pool of worker threads
+        Completed tasks are no longer kept by the master, so get_completed_tasks and
+        iter_completed return nothing once a callback is set.
+        At most max_pending tasks wait for or run the callback. Once that many do, completing a task
+        waits for a callback to return, which holds back the slave reporting it
+
+        :param callback:
+        :param max_workers: size of the worker pool, defaults to the ThreadPoolExecutor default
+        :param max_pending:
+        :return:
+        """
+        def run_callback(task: Task):
+            try:
+                callback(task)
+            except Exception as error:
+                logger.log_error(f'Completed task callback failed for task {task.task_id}\n{error}')
+
+        with self.callback_executor_lock:
+            if self.callback_executor is None:
+                self.callback_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                            thread_name_prefix='completed_task_callback')
+            self.pending_callbacks = BoundedSemaphore(max_pending)
+            self.completion_callback = run_callback
+        self.task_manager.set_completion_callback(self.dispatch_completed)
+        for job_id in list(self.submitted_jobs):
+            task_manager: Optional[TaskManager] = self.scheduler.get_task_manager(job_id)
+            if task_manager is not None:
+                task_manager.set_completion_callback(self.dispatch_completed)
+
+    def dispatch_completed(self, task: Task):
+        """
+        Hands a completed task to the worker pool, once fewer than max_pending tasks are pending
+        Once the pool is stopped by wait_for_callbacks, the callback is called on the calling thread instead
+
+        :param task:
+        :return:
+        """
+        pending_callbacks: BoundedSemaphore = self.pending_callbacks
+        pending_callbacks.acquire()
+        with self.callback_executor_lock:
+            executor: Optional[ThreadPoolExecutor] = self.callback_executor
+            if executor is not None:
+                future = executor.submit(self.completion_callback, task)
+                future.add_done_callback(lambda _: pending_callbacks.release())
+                return
+        try:
+            self.completion_callback(task)
+        finally:
+            pending_callbacks.release()
+
+    def wait_for_callbacks(self):
+        """
+        Waits for every submitted completed task callback to return and stops the worker pool
+        Meant to be called once the job is done. Tasks completed later run the callback on the thread completing them
+
+        :return:
+        """
+        with self.callback_executor_lock:
+            executor, self.callback_executor = self.callback_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
 
 # OVERLOADED DO NOT RENAME
@@ -0,0 +1,138 @@
+"""
+Content-addressed cache of task results, shared by the jobs run on a master
+"""
+
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from typing import Dict, List, Optional, Tuple, Union
+
+from common.logging import Logger
+from common.task import Task
+from common.wire import LENGTH
+
+logger = Logger()
+
+Payload = Union[bytes, str, None]
+
+
+def payload_size(payload: Payload) -> int:
+    """
+    Returns the number of bytes a payload counts for against the cache size bound
+
+    :param payload:
+    :return Integer:
+    """
+    return 0 if payload is None else len(payload)
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of result payloads keyed by a content hash of the task that produced them
+    The key covers the program, the contents of the job files the task references and the payload.
+    Other arguments, such as per-task payload and result file names, only count by position,
+    so deterministic tasks that repeat across jobs share an entry.
+    Job files are digested per job, as concurrent jobs may use the same file names for different contents.
+    """
+    log_prefix = "[ResultCache]\n"
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        # job id to the digests of the job files, by file name
+        self.job_file_digests: Dict[Optional[int], Dict[str, bytes]] = {}
+        self.lock: Lock = Lock()
+        logger.log_trace(f'{self.log_prefix}Result Cache Initialized with {max_bytes} bytes')
+
+    def set_job_files(self, job_path: str, file_names: List[str], job_id: int = None):
+        """
+        Digests the contents of the job files, which tasks refer to by name in their arguments
+
+        :param job_path:
+        :param file_names:
+        :param job_id: job of the tasks that refer to the files
+        :return:
+        """
+        digests: Dict[str, bytes] = {}
+        for file_name in file_names:
+            digest = blake2b(digest_size=16)
+            with open(f'{job_path}/{file_name}', 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(chunk)
+            digests[file_name] = digest.digest()
+        with self.lock:
+            self.job_file_digests[job_id] = digests
+
+    def remove_job_files(self, job_id: int = None):
+        """
+        Forgets the digests of the job files of a job
+
+        :param job_id:
+        :return:
+        """
+        with self.lock:
+            self.job_file_digests.pop(job_id, None)
+
+    def key(self, task: Task) -> bytes:
+        """
+        Returns the content hash of a task
+
+        :param task:
+        :return bytes:
+        """
+        digest = blake2b(digest_size=16)
+        program = task.program.encode()
+        digest.update(LENGTH.pack(len(program)))
+        digest.update(program)
+        job_file_digests: Dict[str, bytes] = self.job_file_digests.get(getattr(task, 'job_id', None), {})
+        for arg_file_name in task.arg_file_names:
+            job_file_digest: Optional[bytes] = job_file_digests.get(arg_file_name)
+            digest.update(b'A' if job_file_digest is None else b'F' + job_file_digest)
+        payload = task.payload
+        if payload is None:
+            digest.update(b'\x00')
+        else:
+            digest.update(b'\x01')
+            digest.update(payload.encode() if isinstance(payload, str) else payload)
+        return digest.digest()
+
+    def get(self, key: bytes) -> Tuple[bool, Payload]:
+        """
+        Looks up a result payload and marks it as recently used
+        Returns whether the key was found and the payload
+
+        :param key:
+        :return Tuple[bool, Payload]:
+        """
+        with self.lock:
+            if key not in self.entries:
+                return False, None
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+
+    def put(self, key: bytes, payload: Payload):
+        """
+        Stores a result payload, evicting the least recently used entries to stay within max_bytes
+        A payload larger than max_bytes is not stored
+
+        :param key:
+        :param payload:
+        :return:
+        """
+        if isinstance(payload, (bytearray, memoryview)):
+            payload = bytes(payload)
+        size = payload_size(payload)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= payload_size(self.entries.pop(key))
+            self.entries[key] = payload
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= payload_size(evicted)
+
+    def __len__(self):
+        return len(self.entries)
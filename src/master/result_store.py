@@ -0,0 +1,284 @@
+"""
+Append-only on-disk store of the results of finished tasks
+"""
+
+from hashlib import blake2b
+from mmap import mmap, ACCESS_READ
+from os import fstat
+from struct import Struct
+from threading import Condition
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from common.logging import Logger
+from common.task import Task
+from common.wire import LENGTH, WireFormatError, decode_tasks, encode_tasks
+
+logger = Logger()
+
+IDENTITY_SIZE = 16
+# length of the task batch that follows, identity of the task that produced the result
+RECORD = Struct(f'<I{IDENTITY_SIZE}s')
+
+
+def task_identity(task: Task) -> bytes:
+    """
+    Returns a digest of the program, arguments and payload of a task
+    A stored result is only reused for a task with the same id and identity
+
+    :param task:
+    :return bytes:
+    """
+    digest = blake2b(digest_size=IDENTITY_SIZE)
+    for part in (task.program, *task.arg_file_names):
+        encoded = part.encode()
+        digest.update(LENGTH.pack(len(encoded)))
+        digest.update(encoded)
+    payload = task.payload
+    if payload is None:
+        digest.update(b'\x00')
+    else:
+        digest.update(b'\x01')
+        digest.update(payload.encode() if isinstance(payload, str) else payload)
+    return digest.digest()
+
+
+class ResultStore:
+    """
+    Keeps finished tasks in an append-only file instead of in memory
+    Each record is a length prefixed task batch holding one task, along with the identity of the
+    task that produced it. An in-memory index maps task ids to record offsets and identities.
+    Records are read back through mmap.
+    An existing file is truncated on open, unless keep_previous is set. Then its records are indexed
+    as previous results, which are only looked up by has_result and become results of this run
+    once reused, so results outlive the master process without stale ones being returned.
+    If a task is stored twice, the latest record is the one returned by get_result
+    """
+    log_prefix = "[ResultStore]\n"
+
+    def __init__(self, path: str, keep_previous: bool = False):
+        self.path = path
+        self.file = open(path, 'ab+')
+        # results of this run, by task id, as their offset, end and identity
+        self.index: Dict[int, Tuple[int, int, bytes]] = {}
+        # results of previous runs, by task id
+        self.previous: Dict[int, Tuple[int, int, bytes]] = {}
+        # task id, offset and end of the records of this run, in the order they were stored
+        self.records: List[Tuple[int, int, int]] = []
+        self.size = 0
+        self.mapped: Optional[mmap] = None
+        self.mapped_size = 0
+        self.condition: Condition = Condition()
+        if keep_previous:
+            self.rebuild_index()
+        else:
+            self.file.truncate(0)
+        logger.log_trace(f'{self.log_prefix}Result Store opened at {path} with {len(self.previous)} previous results')
+
+    def rebuild_index(self):
+        """
+        Scans the file and indexes its records as previous results
+        A record cut short by a crash is truncated away
+
+        :return:
+        """
+        file_size = fstat(self.file.fileno()).st_size
+        offset = 0
+        self.remap(file_size)
+        while offset + RECORD.size <= file_size:
+            length, identity = RECORD.unpack_from(self.mapped, offset)
+            end = offset + RECORD.size + length
+            if end > file_size:
+                break
+            try:
+                task: Task = decode_tasks(self.mapped[offset + RECORD.size:end])[0]
+            except (WireFormatError, IndexError):
+                break
+            self.previous[task.task_id] = (offset, end, identity)
+            offset = end
+        if offset < file_size:
+            logger.log_warn(f'{self.log_prefix}Truncating {file_size - offset} bytes of incomplete results')
+            self.close_map()
+            self.file.truncate(offset)
+        self.size = offset
+
+    def remap(self, size: int):
+        """
+        Maps the first size bytes of the file, if they are not mapped already
+
+        :param size:
+        :return:
+        """
+        if size <= self.mapped_size:
+            return
+        self.file.flush()
+        self.close_map()
+        self.mapped = mmap(self.file.fileno(), size, access=ACCESS_READ)
+        self.mapped_size = size
+
+    def close_map(self):
+        """
+        Unmaps the file
+
+        :return:
+        """
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+            self.mapped_size = 0
+
+    def append(self, task: Task, identity: bytes = bytes(IDENTITY_SIZE)):
+        """
+        Appends the result of a finished task to the file
+
+        :param task:
+        :param identity: task_identity of the task that produced the result
+        :return:
+        """
+        record = encode_tasks([task])
+        with self.condition:
+            offset = self.size
+            self.file.write(RECORD.pack(len(record), identity))
+            self.file.write(record)
+            self.size = offset + RECORD.size + len(record)
+            self.index[task.task_id] = (offset, self.size, identity)
+            self.records.append((task.task_id, offset, self.size))
+            self.condition.notify_all()
+
+    def reuse(self, task_id: int):
+        """
+        Makes the previous result of a task a result of this run, if there is one
+
+        :param task_id:
+        :return:
+        """
+        with self.condition:
+            entry = self.previous.pop(task_id, None)
+            if entry is None or task_id in self.index:
+                return
+            self.index[task_id] = entry
+            self.records.append((task_id, entry[0], entry[1]))
+            self.condition.notify_all()
+
+    def discard_previous(self):
+        """
+        Discards the results of previous runs. The file is truncated if no result of this run is stored yet
+
+        :return:
+        """
+        with self.condition:
+            self.previous = {}
+            if not self.records:
+                self.close_map()
+                self.file.truncate(0)
+                self.size = 0
+        logger.log_trace(f'{self.log_prefix}Previous results discarded')
+
+    def read(self, offset: int, end: int) -> Task:
+        """
+        Reads the task of the record between offset and end
+
+        :param offset:
+        :param end:
+        :return Task:
+        """
+        with self.condition:
+            self.remap(end)
+            record = self.mapped[offset + RECORD.size:end]
+        return decode_tasks(record)[0]
+
+    def get_result(self, task_id: int) -> Task:
+        """
+        Returns the finished task with the task id
+        Raises KeyError if there is no result for the task
+
+        :param task_id:
+        :return Task:
+        """
+        offset, end, _ = self.index[task_id]
+        return self.read(offset, end)
+
+    def has_result(self, task: Task) -> bool:
+        """
+        Returns True if there is a result, of this run or a previous one, produced by a task with the same id and identity
+
+        :param task:
+        :return Boolean:
+        """
+        with self.condition:
+            entry = self.index.get(task.task_id) or self.previous.get(task.task_id)
+        return entry is not None and entry[2] == task_identity(task)
+
+    def iter_results(self, until: Callable[[], bool] = None, poll_secs: float = 0.1, position: int = 0) -> Iterator[Task]:
+        """
+        Yields the results of this run in the order they were stored, from the record at position on
+        Only the latest result of a task that was stored more than once is yielded.
+        Without until, stops at the last record. Otherwise waits for more results
+        and stops at the last record once until returns True
+
+        :param until:
+        :param poll_secs: how often to call until while no result is stored
+        :param position: number of records to skip
+        :return Iterator[Task]:
+        """
+        while True:
+            done = until is None or until()
+            with self.condition:
+                num_records = len(self.records)
+            yield from self.iter_records(position, num_records)
+            position = num_records
+            if done:
+                return
+            with self.condition:
+                if len(self.records) == num_records:
+                    self.condition.wait(poll_secs)
+
+    def results_from(self, position: int) -> Tuple[List[Task], int]:
+        """
+        Returns the results stored from the record at position on, and the position after them
+
+        :param position: number of records to skip
+        :return Tuple[List[Task], int]:
+        """
+        with self.condition:
+            num_records = len(self.records)
+        return list(self.iter_records(position, num_records)), num_records
+
+    def iter_records(self, start: int, stop: int) -> Iterator[Task]:
+        """
+        Yields the results of the records from start to stop that are the latest of their task
+
+        :param start:
+        :param stop:
+        :return Iterator[Task]:
+        """
+        for position in range(start, stop):
+            with self.condition:
+                task_id, offset, end = self.records[position]
+                latest = self.index[task_id][0] == offset
+            if latest:
+                yield self.read(offset, end)
+
+    def task_ids(self) -> List[int]:
+        """
+        Returns the ids of the tasks with a stored result
+
+        :return List[int]:
+        """
+        with self.condition:
+            return list(self.index)
+
+    def close(self):
+        """
+        Closes the file
+
+        :return:
+        """
+        with self.condition:
+            self.close_map()
+            self.file.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, task_id: int):
+        return task_id in self.index
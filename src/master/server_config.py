@@ -0,0 +1,27 @@
+"""
+Configuration of the waitress server that serves the master
+"""
+
+
+class ServerConfig:
+    """
+    Settings of the production server the master is served by
+    Every long polling slave request holds one of the threads while it waits, and a slave long polls
+    on one request at a time, so threads are sized from the expected number of slaves by default.
+    Long polls never hold the last reserved_threads threads: once the other threads are all long polling,
+    further requests for tasks are answered straight away, so heartbeats and results are always served
+    """
+    def __init__(self, threads: int = None, connection_limit: int = 1000, keep_alive_secs: float = 120.0,
+                 backlog: int = 1024, max_request_bytes: int = 1024 * 1024 * 1024,
+                 max_tasks_done_bytes: int = 256 * 1024 * 1024, expected_slaves: int = 32, reserved_threads: int = 8):
+        self.threads = threads or expected_slaves + reserved_threads
+        # threads long polls may hold at once
+        self.max_long_polls = max(self.threads - reserved_threads, 0)
+        self.connection_limit = connection_limit
+        # how long an idle keep-alive connection is kept open
+        self.keep_alive_secs = keep_alive_secs
+        self.backlog = backlog
+        # size limit of any request body
+        self.max_request_bytes = max_request_bytes
+        # size limit of the completed tasks sent to the tasks done and tasks exchange endpoints
+        self.max_tasks_done_bytes = max_tasks_done_bytes
@@ -2,6 +2,9 @@
 Contains implemented functionality for handling status changes and status logging
 """
 
+from threading import Lock
+from typing import Optional
+
 from common.logging import Logger
 
 logger = Logger()
@@ -15,7 +18,14 @@ class Status:
         self.num_slaves: int = 0
         self.num_tasks_done: int = 0
         self.num_tasks: int = 0
+        # True while tasks are still being loaded and num_tasks is an estimate
+        self.num_tasks_estimated: bool = False
         self.job_done: bool = False
+        # why the job failed, if it did. A failed job is also done
+        self.job_error: Optional[str] = None
+        # result cache lookups, shown once the cache has been used
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
 
 
 class StatusManager:
@@ -27,6 +37,7 @@ class StatusManager:
     def __init__(self):
         self.status = Status()
         self.job_id: int = -1
+        self.lock: Lock = Lock()
         logger.log_trace(f"{self.log_prefix}Status Manager Initialized")
 
     def new_slave_connected(self):
@@ -35,7 +46,8 @@ class StatusManager:
 
         :return:
         """
-        self.status.num_slaves += 1
+        with self.lock:
+            self.status.num_slaves += 1
         logger.log_trace(f"{self.log_prefix}Status updated.\n{self.get_status()}")
 
     def slave_disconnected(self):
@@ -44,7 +56,8 @@ class StatusManager:
 
         :return:
         """
-        self.status.num_slaves -= 1
+        with self.lock:
+            self.status.num_slaves -= 1
         logger.log_trace(f"{self.log_prefix}Status updated.\n{self.get_status()}")
 
     def tasks_loaded(self, num_tasks: int):
@@ -55,12 +68,39 @@ class StatusManager:
         :return:
         """
         if num_tasks > 0:
-            self.status.num_tasks = num_tasks
+            with self.lock:
+                self.status.num_tasks = num_tasks
+                self.status.num_tasks_estimated = False
             logger.log_trace(f"{self.log_prefix}Status updated.\n{self.get_status()}")
         else:
             logger.log_error(f"{self.log_prefix}Number of tasks loaded must be greater than 0")
             raise ValueError
 
+    def tasks_loading(self, estimated_total: int = None):
+        """
+        Updates the status when tasks start being loaded lazily
+        The total is an estimate, or unknown if estimated_total is None, until tasks_loaded is called
+
+        :param estimated_total:
+        :return:
+        """
+        with self.lock:
+            self.status.num_tasks = estimated_total or 0
+            self.status.num_tasks_estimated = True
+        logger.log_trace(f"{self.log_prefix}Status updated.\n{self.get_status()}")
+
+    def tasks_pulled(self, num_pulled: int):
+        """
+        Updates the status with the number of tasks loaded so far by a lazy load
+        The estimated total is raised if more tasks than estimated have been loaded
+
+        :param num_pulled:
+        :return:
+        """
+        with self.lock:
+            if self.status.num_tasks_estimated and num_pulled > self.status.num_tasks:
+                self.status.num_tasks = num_pulled
+
     def tasks_completed(self, num_completed: int = 1):
         """
         Updates the status when tasks have been completed
@@ -69,12 +109,26 @@ class StatusManager:
         :return:
         """
         if num_completed > 0:
-            self.status.num_tasks_done += num_completed
+            with self.lock:
+                self.status.num_tasks_done += num_completed
             logger.log_trace(f"{self.log_prefix}Status updated.\n{self.get_status()}")
         else:
             logger.log_error(f"{self.log_prefix}Number of tasks completed must be greater than 0")
             raise ValueError
 
+    def cache_lookup(self, hit: bool):
+        """
+        Updates the status when a task is looked up in the result cache
+
+        :param hit:
+        :return:
+        """
+        with self.lock:
+            if hit:
+                self.status.cache_hits += 1
+            else:
+                self.status.cache_misses += 1
+
     def job_completed(self):
         """
         Updates the status when the job has completed
@@ -84,6 +138,25 @@ class StatusManager:
         self.status.job_done = True
         logger.log_trace(f"{self.log_prefix}Status updated.\n{self.get_status()}")
 
+    def job_failed(self, error: str):
+        """
+        Updates the status when the job has ended without all of its tasks, such as when its task source failed
+
+        :param error:
+        :return:
+        """
+        self.status.job_error = error
+        self.status.job_done = True
+        logger.log_error(f"{self.log_prefix}Job failed\n{error}")
+
+    def is_job_failed(self) -> bool:
+        """
+        Returns True if the job failed. False otherwise
+
+        :return Boolean:
+        """
+        return self.status.job_error is not None
+
     def is_job_done(self):
         """
         Returns True is the job is completed. False otherwise
@@ -104,9 +177,20 @@ class StatusManager:
         status_output = f'Job ID: {self.job_id}\n'
         status_output += f'Connected Slaves: {self.status.num_slaves}\n'
         status_output += f'Tasks Done: {self.status.num_tasks_done}\n'
-        status_output += f'Total Tasks: {self.status.num_tasks}\n'
+        if not self.status.num_tasks_estimated:
+            status_output += f'Total Tasks: {self.status.num_tasks}\n'
+        elif self.status.num_tasks > 0:
+            status_output += f'Total Tasks: {self.status.num_tasks} (estimated)\n'
+        else:
+            status_output += 'Total Tasks: unknown\n'
         status_output += 'Progress: {:0.2f}%\n'.format(completion_percentage)
-        status_output += f'Job Completed: {self.is_job_done()}'
+        if self.status.cache_hits or self.status.cache_misses:
+            status_output += f'Cache Hits: {self.status.cache_hits}\n'
+            status_output += f'Cache Misses: {self.status.cache_misses}\n'
+        if self.is_job_failed():
+            status_output += f'Job Failed: {self.status.job_error}'
+        else:
+            status_output += f'Job Completed: {self.is_job_done()}'
         return status_output
 
     def print_status(self):
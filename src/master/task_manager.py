@@ -2,13 +2,23 @@
 Task Manager manages the Available, In Progress, and Completed Tasks for the Hyper Master
 """
 
+from collections import deque
 from queue import SimpleQueue, Empty
-from typing import List, Dict
+from statistics import median
+from threading import Lock, Thread
+from time import monotonic
+from typing import Callable, Deque, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 
 from common.task import Task, TaskMessageType
 from common.logging import Logger
 
+from master.journal import Journal
+from master.lease_manager import LeaseManager
+from master.result_cache import ResultCache
+from master.result_store import ResultStore, task_identity
+from master.task_queue import AvailableTaskQueue
 from master.status_manager import StatusManager
+from master.task_store import ConnectedTask, InProgressStore
 
 logger = Logger()
 
@@ -31,99 +41,417 @@ class UnknownTaskMessage(Exception):
     """
 
 
-class ConnectedTask:
-    """
-    A ConnectedTask is a task that is associated with a connected slave
-    """
-    def __init__(self, task: Task, connection_id: str):
-        self.task = task
-        self.connection_id = connection_id
-
-
 class TaskManager:
     """
     Manages Tasks
+    Safe to use from concurrent Flask request threads, the connection reaper thread
+    and the application thread. In progress tasks are kept in a lock-sharded store.
     """
     log_prefix = "[TaskManager]\n"
 
-    def __init__(self, status_manager: StatusManager):
-        self.available_tasks: SimpleQueue = SimpleQueue()
-        self.in_progress: Dict[int, ConnectedTask] = {}
+    def __init__(self, status_manager: StatusManager,
+                 speculative_execution: bool = True, max_backups_per_task: int = 1,
+                 task_lease_secs: float = 600.0, shard_count: int = 16,
+                 result_store: ResultStore = None, journal: Journal = None, incremental: bool = False,
+                 result_cache: ResultCache = None, backup_age_factor: float = 2.0, min_backup_age_secs: float = 30.0):
+        self.available_tasks: AvailableTaskQueue = AvailableTaskQueue()
+        self.in_progress: InProgressStore = InProgressStore(shard_count)
         self.finished_tasks: SimpleQueue = SimpleQueue()
         self.status_manager = status_manager
+        self.speculative_execution = speculative_execution
+        self.max_backups_per_task = max_backups_per_task
+        # a task is only backed up once it has run backup_age_factor times the median completion time,
+        # and at least min_backup_age_secs, so only stragglers get a backup
+        self.backup_age_factor = backup_age_factor
+        self.min_backup_age_secs = min_backup_age_secs
+        # how long the most recently completed tasks ran, for the median completion time
+        self.completion_secs: Deque[float] = deque(maxlen=101)
+        self.completion_secs_lock: Lock = Lock()
+        self.task_lease_secs = task_lease_secs
+        self.lease_manager: LeaseManager = LeaseManager(self.lease_expired)
+        # ids of suspended tasks with a copy in the Available Tasks Queue, changed under the shard lock of the task
+        self.queued_copies: Set[int] = set()
+        # number of added tasks that have not been completed yet
+        self.unfinished_tasks = 0
+        self.unfinished_tasks_lock: Lock = Lock()
+        # True while a lazy task source may still produce tasks
+        self.loading = False
+        # error raised by the lazy task source, if it failed
+        self.source_error: Optional[Exception] = None
+        self.loader: Optional[Thread] = None
+        # when set, completed tasks are passed to it instead of the Finished Tasks Queue
+        self.on_task_completed: Optional[Callable[[Task], None]] = None
+        # when set, completed tasks are written to it instead of the Finished Tasks Queue
+        self.result_store = result_store
+        # number of records of the Result Store already returned by flush_finished_tasks
+        self.flushed_results = 0
+        self.flushed_results_lock: Lock = Lock()
+        # when set, task state transitions are recorded in it so a restarted master can resume the job
+        self.journal = journal
+        # when set, tasks with a result in the Result Store are completed instead of being queued
+        self.incremental = incremental and result_store is not None
+        # when set, results are cached by task content and tasks with a cached result are not dispatched
+        self.result_cache = result_cache
         logger.log_trace(f'{self.log_prefix}Task Manager Initialized')
 
     def connect_available_task(self, connection_id: str) -> Task:
         """
         Connects a task with a connection id associated with the connected slave
+        When no tasks are available, a backup copy of a long running task may be connected instead
         Returns the task
 
         :param connection_id:
         :return Task:
         """
-        try:
-            task: Task = self.available_tasks.get(timeout=0.05)
-            connected_task: ConnectedTask = ConnectedTask(task, connection_id)
-            self.in_progress[task.task_id] = connected_task
+        task: Optional[Task] = self.connect_queued_task(connection_id)
+        if task is not None:
+            return task
+        if self.is_drained():
+            logger.log_trace(f'{self.log_prefix}No More Tasks')
+            raise NoMoreTasks
+        backup_task: Optional[Task] = self.connect_backup_task(connection_id)
+        if backup_task is not None:
+            return backup_task
+        logger.log_trace(f'{self.log_prefix}No More Available Tasks')
+        raise NoMoreAvailableTasks
+
+    def connect_queued_task(self, connection_id: str, timeout: float = 0.0) -> Optional[Task]:
+        """
+        Connects the next task of the Available Tasks Queue with a connection id
+        Waits up to timeout seconds for a task to be available
+        Returns the task, or None if the queue stayed empty
+
+        :param connection_id:
+        :param timeout:
+        :return Task or None:
+        """
+        deadline = monotonic() + timeout
+        while True:
+            try:
+                task: Task = self.available_tasks.get(timeout=max(deadline - monotonic(), 0.0))
+            except Empty:
+                return None
+            with self.in_progress.lock_for(task.task_id):
+                if task.task_id in self.queued_copies:
+                    self.queued_copies.discard(task.task_id)
+                    connected_task: Optional[ConnectedTask] = self.in_progress.get(task.task_id)
+                    if connected_task is None or not connected_task.suspended:
+                        # finished by a late result or resumed by its slave since the copy was queued
+                        continue
+                    connected_task.take_over(connection_id)
+                    self.in_progress.track(connection_id, task.task_id)
+                    if self.task_lease_secs is not None:
+                        connected_task.renew_lease(self.task_lease_secs)
+                elif task.task_id in self.in_progress:
+                    continue
+                else:
+                    connected_task = ConnectedTask(task, connection_id, self.task_lease_secs)
+                    self.in_progress.add(connected_task)
+            if connected_task.lease_expiry is not None:
+                self.lease_manager.add_lease(task.task_id, connected_task.lease_expiry)
+            if self.journal is not None:
+                self.journal.task_dispatched(task.task_id, connection_id)
             logger.log_trace(f'{self.log_prefix}Task connected to slave {connection_id}')
             return task
-        except Empty:
-            if len(self.in_progress.values()) == 0:
-                logger.log_trace(f'{self.log_prefix}No More Tasks')
-                raise NoMoreTasks
-            logger.log_trace(f'{self.log_prefix}No More Available Tasks')
-            raise NoMoreAvailableTasks
 
-    def connect_available_tasks(self, num_tasks: int, connection_id: str) -> List[Task]:
+    def connect_backup_task(self, connection_id: str) -> Optional[Task]:
+        """
+        Connects a backup copy of the longest running in progress task to the connection id
+        Only tasks running for longer than backup_age_secs, not already run by the connection
+        and below the backup limit are considered
+        Returns the task, or None if there is no task to back up
+
+        :param connection_id:
+        :return Task or None:
+        """
+        if not self.speculative_execution:
+            return None
+        started_before = monotonic() - self.backup_age_secs()
+        candidates: List[ConnectedTask] = [
+            connected_task for connected_task in self.in_progress.values()
+            if connected_task.connected_at <= started_before
+            and len(connected_task.backup_connection_ids) < self.max_backups_per_task
+            and not connected_task.is_connected_to(connection_id)
+        ]
+        for connected_task in sorted(candidates, key=lambda candidate: candidate.connected_at):
+            task_id = connected_task.task.task_id
+            with self.in_progress.lock_for(task_id):
+                # the task may have finished or gained a backup since the snapshot
+                if self.in_progress.get(task_id) is not connected_task \
+                        or len(connected_task.backup_connection_ids) >= self.max_backups_per_task \
+                        or connected_task.is_connected_to(connection_id):
+                    continue
+                connected_task.backup_connection_ids.add(connection_id)
+                self.in_progress.track(connection_id, task_id)
+            logger.log_trace(f'{self.log_prefix}Backup of task {task_id} '
+                             f'connected to slave {connection_id}')
+            return connected_task.task
+        return None
+
+    def backup_age_secs(self) -> float:
+        """
+        Returns how long a task has to run before it is backed up
+        backup_age_factor times the median completion time of the recently completed tasks,
+        and at least min_backup_age_secs
+
+        :return Float:
+        """
+        with self.completion_secs_lock:
+            completion_secs: List[float] = list(self.completion_secs)
+        if not completion_secs:
+            return self.min_backup_age_secs
+        return max(self.min_backup_age_secs, self.backup_age_factor * median(completion_secs))
+
+    def connect_available_tasks(self, num_tasks: int, connection_id: str, wait_secs: float = 0.0) -> List[Task]:
         """
         Connects num_tasks amount of tasks with a connection id associated with the connected slave
+        If no task can be connected, waits up to wait_secs for a task to be added or requeued,
+        or for the job to end
         Returns a list of the tasks
 
         :param num_tasks:
         :param connection_id:
+        :param wait_secs:
         :return List[Task]:
         """
         tasks: List[Task] = []
-        for _ in range(num_tasks):
-            try:
-                tasks.append(self.connect_available_task(connection_id))
-            except NoMoreAvailableTasks:
+        deadline = monotonic() + wait_secs
+        while True:
+            for _ in range(num_tasks - len(tasks)):
+                try:
+                    tasks.append(self.connect_available_task(connection_id))
+                except NoMoreAvailableTasks:
+                    break
+            remaining = deadline - monotonic()
+            if tasks or remaining <= 0:
                 return tasks
-            except NoMoreTasks:
-                raise NoMoreTasks
-        return tasks
+            self.available_tasks.wait(remaining)
+
+    def requeue(self, connected_task: ConnectedTask):
+        """
+        Moves an in progress task back to the Available Tasks Queue
+        Must be called while holding the shard lock of the task
+
+        :param connected_task:
+        :return:
+        """
+        self.in_progress.pop(connected_task.task.task_id)
+        if connected_task.suspended:
+            # a copy is already queued, which is now the only copy of the task
+            self.queued_copies.discard(connected_task.task.task_id)
+            logger.log_trace(f'{self.log_prefix}Task {connected_task.task.task_id} requeued')
+            return
+        connected_task.task.set_message_type(TaskMessageType.TASK_RAW)
+        if self.journal is not None:
+            self.journal.task_requeued(connected_task.task.task_id)
+        self.available_tasks.put(connected_task.task)
+        logger.log_trace(f'{self.log_prefix}Task {connected_task.task.task_id} requeued')
 
     def connection_dropped(self, connection_id: str):
         """
         Called by the master.ConnectionManager when a connection is removed.
-        Removes the task from the list of In Progress Tasks
-        Adds the task to the Available Tasks Queue
+        Removes the connection's tasks from the list of In Progress Tasks
+        Adds the tasks to the Available Tasks Queue, unless a backup copy is still running
+        Only the tasks held by the connection are touched
 
         :param connection_id:
         :return:
         """
-        new_in_progress: Dict[int, ConnectedTask] = {}
-        for connected_task in self.in_progress.values():
-            if connected_task.connection_id == connection_id:
-                self.add_new_available_task(connected_task.task, connected_task.task.job_id)
-            else:
-                new_in_progress[connected_task.task.task_id] = connected_task
-        self.in_progress = new_in_progress
+        task_ids: Set[int] = self.in_progress.pop_connection(connection_id)
+        for shard_task_ids in self.in_progress.group_by_shard(task_ids).values():
+            with self.in_progress.lock_for(shard_task_ids[0]):
+                for task_id in shard_task_ids:
+                    connected_task: Optional[ConnectedTask] = self.in_progress.get(task_id)
+                    if connected_task is None or not connected_task.is_connected_to(connection_id):
+                        continue
+                    if connected_task.release(connection_id):
+                        continue
+                    self.requeue(connected_task)
         logger.log_trace(f'{self.log_prefix}'
-                         f'Migrating tasks for dropped connection ({connection_id})')
+                         f'Migrating {len(task_ids)} tasks for dropped connection ({connection_id})')
 
-    def add_new_available_task(self, task: Task, job_id: int):
+    def connection_suspended(self, connection_id: str):
+        """
+        Called by the master.ConnectionManager when a slave is suspected to have failed, but may still resume.
+        Queues a copy of each task the connection runs alone, so other slaves can take it over straight away.
+        The tasks stay connected to the connection, so its late results are accepted,
+        until connection_dropped is called
+
+        :param connection_id:
+        :return:
+        """
+        task_ids: Set[int] = self.in_progress.connection_task_ids(connection_id)
+        num_queued = 0
+        for shard_task_ids in self.in_progress.group_by_shard(task_ids).values():
+            with self.in_progress.lock_for(shard_task_ids[0]):
+                for task_id in shard_task_ids:
+                    connected_task: Optional[ConnectedTask] = self.in_progress.get(task_id)
+                    if connected_task is None or connected_task.connection_id != connection_id \
+                            or connected_task.suspended:
+                        continue
+                    if connected_task.backup_connection_ids:
+                        # a backup copy is running, so it takes over and the suspended slave becomes the backup
+                        connected_task.take_over(connected_task.backup_connection_ids.pop())
+                        continue
+                    connected_task.suspended = True
+                    self.queued_copies.add(task_id)
+                    connected_task.task.set_message_type(TaskMessageType.TASK_RAW)
+                    if self.journal is not None:
+                        self.journal.task_requeued(task_id)
+                    self.available_tasks.put(connected_task.task)
+                    num_queued += 1
+        logger.log_trace(f'{self.log_prefix}'
+                         f'Queued copies of {num_queued} tasks of suspended connection ({connection_id})')
+
+    def connection_resumed(self, connection_id: str, held_task_ids: Optional[Set[int]] = None):
+        """
+        Called by the master.ConnectionManager when a suspended slave is seen again.
+        Gives the slave back the tasks that no other slave has taken over, withdrawing their queued copies.
+        A slave that reconnects tells which tasks it still holds, held_task_ids. Its other tasks
+        were dropped, so they are released from the connection and left to their queued copies
+        or backups
+
+        :param connection_id:
+        :param held_task_ids: ids of the tasks the slave still runs or has results of, all of them if None
+        :return:
+        """
+        task_ids: Set[int] = self.in_progress.connection_task_ids(connection_id)
+        num_resumed = 0
+        num_released = 0
+        for shard_task_ids in self.in_progress.group_by_shard(task_ids).values():
+            with self.in_progress.lock_for(shard_task_ids[0]):
+                for task_id in shard_task_ids:
+                    connected_task: Optional[ConnectedTask] = self.in_progress.get(task_id)
+                    if connected_task is None or not connected_task.is_connected_to(connection_id):
+                        continue
+                    if held_task_ids is not None and task_id not in held_task_ids:
+                        self.release_connection(connected_task, connection_id)
+                        num_released += 1
+                        continue
+                    if connected_task.connection_id != connection_id or not connected_task.suspended:
+                        continue
+                    connected_task.suspended = False
+                    self.withdraw_queued_copy(connected_task.task)
+                    if self.journal is not None:
+                        self.journal.task_dispatched(task_id, connection_id)
+                    num_resumed += 1
+        logger.log_trace(f'{self.log_prefix}Resumed {num_resumed} and released {num_released} tasks '
+                         f'of connection ({connection_id})')
+
+    def release_connection(self, connected_task: ConnectedTask, connection_id: str):
+        """
+        Removes a connection from an in progress task, requeuing the task unless another copy is running
+        Must be called while holding the shard lock of the task
+
+        :param connected_task:
+        :param connection_id:
+        :return:
+        """
+        if connected_task.release(connection_id):
+            self.in_progress.untrack(connection_id, connected_task.task.task_id)
+            return
+        self.requeue(connected_task)
+
+    def withdraw_queued_copy(self, task: Task):
+        """
+        Removes the queued copy of a suspended task, unless a slave is taking it already
+        Must be called while holding the shard lock of the task
+
+        :param task:
+        :return:
+        """
+        if task.task_id in self.queued_copies and self.available_tasks.remove(task):
+            self.queued_copies.discard(task.task_id)
+
+    def renew_leases(self, task_ids: List[int], connection_id: str) -> int:
+        """
+        Renews the leases of in progress tasks held by the connection
+        Returns the number of leases renewed
+
+        :param task_ids:
+        :param connection_id:
+        :return Integer:
+        """
+        if self.task_lease_secs is None:
+            return 0
+        renewed = 0
+        for shard_task_ids in self.in_progress.group_by_shard(task_ids).values():
+            with self.in_progress.lock_for(shard_task_ids[0]):
+                for task_id in shard_task_ids:
+                    connected_task: Optional[ConnectedTask] = self.in_progress.get(task_id)
+                    if connected_task is None or not connected_task.is_connected_to(connection_id):
+                        continue
+                    self.lease_manager.add_lease(task_id, connected_task.renew_lease(self.task_lease_secs))
+                    renewed += 1
+        logger.log_trace(f'{self.log_prefix}Renewed {renewed} leases for slave {connection_id}')
+        return renewed
+
+    def lease_expired(self, task_id: int, expiry: float):
+        """
+        Called by the LeaseManager when a task lease deadline has passed
+        Promotes a backup copy if one is running, otherwise adds the task back to the Available Tasks Queue
+        Deadlines of finished, renewed or reconnected tasks are ignored
+
+        :param task_id:
+        :param expiry:
+        :return:
+        """
+        with self.in_progress.lock_for(task_id):
+            connected_task: Optional[ConnectedTask] = self.in_progress.get(task_id)
+            if connected_task is None or connected_task.lease_expiry is None \
+                    or connected_task.lease_expiry > expiry:
+                return
+            logger.log_warn(f'{self.log_prefix}Lease of task {task_id} held by slave '
+                            f'{connected_task.connection_id} expired')
+            expired_connection_id = connected_task.connection_id
+            if connected_task.release(expired_connection_id):
+                self.in_progress.untrack(expired_connection_id, task_id)
+                self.lease_manager.add_lease(task_id, connected_task.renew_lease(self.task_lease_secs))
+                return
+            self.requeue(connected_task)
+
+    def add_new_available_task(self, task: Task, job_id: int) -> bool:
         """
         Adds the task to the Available Tasks Queue and attaches job id to them
+        A task the journal already knows about, because it was finished or restored, is skipped
+        In incremental mode, a task with a stored result from the same program, arguments and
+        payload is counted as completed instead. A task with a result in the Result Cache is
+        completed with the cached result
+        Returns True if the task was added
 
         :param task:
         :param job_id:
-        :return:
+        :return Boolean:
         """
+        if self.journal is not None and self.journal.is_known(task.task_id):
+            logger.log_trace(f'{self.log_prefix}Task {task.task_id} already in journal. Skipping')
+            return False
+        if self.incremental and self.result_store.has_result(task):
+            self.result_store.reuse(task.task_id)
+            self.status_manager.tasks_completed(1)
+            logger.log_trace(f'{self.log_prefix}Task {task.task_id} already has a result. Skipping')
+            return False
         task.set_job(job_id)
+        if self.result_cache is not None:
+            hit, payload = self.result_cache.get(self.result_cache.key(task))
+            self.status_manager.cache_lookup(hit)
+            if hit:
+                cached_task = Task(task.task_id, task.program, task.arg_file_names, payload,
+                                   task.result_filename, task.payload_filename, task.priority, task.estimated_cost)
+                cached_task.set_job(job_id)
+                cached_task.set_message_type(TaskMessageType.TASK_PROCESSED)
+                self.deliver_result(cached_task, task)
+                self.status_manager.tasks_completed(1)
+                logger.log_trace(f'{self.log_prefix}Task {task.task_id} result found in cache. Skipping')
+                return False
         task.set_message_type(TaskMessageType.TASK_RAW)
+        if self.journal is not None:
+            self.journal.task_loaded(task)
+        with self.unfinished_tasks_lock:
+            self.unfinished_tasks += 1
         self.available_tasks.put(task)
         logger.log_trace(f'{self.log_prefix}New Available Task {task.task_id}')
+        return True
 
     def add_new_available_tasks(self, tasks: List[Task], job_id: int):
         """
@@ -133,52 +461,304 @@ class TaskManager:
         :param job_id:
         :return:
         """
+        skipped = False
         for task in tasks:
-            self.add_new_available_task(task, job_id)
+            if not self.add_new_available_task(task, job_id):
+                skipped = True
+        if skipped:
+            # every task may have been finished already
+            self.complete_if_drained()
 
-    def task_finished(self, finished_task: Task):
+    def load_tasks(self, tasks: Iterable[Task], job_id: int, estimated_total: int = None, window: int = 1000):
+        """
+        Adds the tasks of a job
+        A list is added at once. Any other iterable, such as a generator, is read lazily
+        so that at most window tasks are waiting to be dispatched at a time.
+        The total of a lazy load is unknown, or estimated_total, until the iterable runs out
+
+        :param tasks:
+        :param job_id:
+        :param estimated_total:
+        :param window:
+        :return:
+        """
+        if isinstance(tasks, list):
+            self.add_new_available_tasks(tasks, job_id)
+            self.status_manager.tasks_loaded(len(tasks))
+            return
+
+        self.status_manager.tasks_loading(estimated_total)
+        self.load_task_source(tasks, job_id, window)
+
+    def load_task_source(self, tasks: Iterable[Task], job_id: int, window: int):
+        """
+        Starts pulling tasks lazily from an iterable in a loader thread
+        At most window tasks are kept in the Available Tasks Queue, the loader blocks until
+        slaves take tasks off the queue, so the source is only read as fast as the job is worked on
+
+        :param tasks:
+        :param job_id:
+        :param window:
+        :return:
+        """
+        self.loading = True
+        self.source_error = None
+        self.loader = Thread(name='task_loader_thread', target=self.pull_tasks,
+                             args=(iter(tasks), job_id, max(1, window)))
+        self.loader.daemon = True
+        self.loader.start()
+
+    def pull_tasks(self, tasks: Iterable[Task], job_id: int, window: int):
+        """
+        Loader loop. Adds tasks from the source whenever the Available Tasks Queue has space
+        Marks the job as finished if every task is already done when the source runs out.
+        If the source raises, the tasks pulled so far still run, then the job is marked as failed
+
+        :param tasks:
+        :param job_id:
+        :param window:
+        :return:
+        """
+        num_pulled = 0
+        try:
+            for task in tasks:
+                while not self.available_tasks.wait_for_space(window):
+                    if self.available_tasks.closed:
+                        return
+                self.add_new_available_task(task, job_id)
+                num_pulled += 1
+                self.status_manager.tasks_pulled(num_pulled)
+        except Exception as error:
+            logger.log_error(f'{self.log_prefix}Task source failed after {num_pulled} tasks\n{error}')
+            self.source_error = error
+        finally:
+            if num_pulled > 0 and self.source_error is None:
+                self.status_manager.tasks_loaded(num_pulled)
+            self.loading = False
+            logger.log_trace(f'{self.log_prefix}Task source exhausted after {num_pulled} tasks')
+        self.complete_if_drained()
+
+    def complete_if_drained(self):
+        """
+        Marks the job as finished if it is drained, or as failed if its task source failed
+        The journal records the end of a finished job, so it is not resumed by a restarted master
+
+        :return:
+        """
+        if self.is_drained():
+            if self.source_error is not None:
+                self.status_manager.job_failed(f'Task source failed\n{self.source_error}')
+            else:
+                self.status_manager.job_completed()
+                if self.journal is not None:
+                    self.journal.job_finished()
+            # wake long polling requests so they can report the end of the job
+            self.available_tasks.close()
+            logger.log_trace(f'{self.log_prefix}No more tasks. Marking job as finished.')
+
+    def restore(self) -> int:
+        """
+        Restores the unfinished tasks of the journal
+        Tasks that were in progress are connected to their last connection with a new lease,
+        so results from slaves that reconnect are accepted. Other tasks are made available
+        Returns the number of restored tasks
+
+        :return Integer:
+        """
+        state = self.journal.state
+        for task in list(state.tasks.values()):
+            task.set_message_type(TaskMessageType.TASK_RAW)
+            with self.unfinished_tasks_lock:
+                self.unfinished_tasks += 1
+            connection_id: Optional[str] = state.dispatched.get(task.task_id)
+            if connection_id is None:
+                self.available_tasks.put(task)
+                continue
+            connected_task: ConnectedTask = ConnectedTask(task, connection_id, self.task_lease_secs)
+            self.in_progress.add(connected_task)
+            if connected_task.lease_expiry is not None:
+                self.lease_manager.add_lease(task.task_id, connected_task.lease_expiry)
+        logger.log_trace(f'{self.log_prefix}Restored {len(state.tasks)} tasks from journal')
+        return len(state.tasks)
+
+    def is_drained(self) -> bool:
+        """
+        Returns True if every added task has been completed and none are available or in progress
+        The unfinished count covers a task that is between the queue and in_progress
+
+        :return Boolean:
+        """
+        return not self.loading and self.unfinished_tasks <= 0 and self.available_tasks.empty() \
+            and len(self.in_progress) == 0
+
+    def task_finished(self, finished_task: Task, connection_id: str = None):
         """
         Removes the task from the list of In Progress Tasks
         Adds the task to the Finished Tasks Queue
+        The first copy of a task to finish is accepted, results of other copies are dropped
+        The result is delivered once the shard lock is released
 
         :param finished_task:
+        :param connection_id:
         :return:
         """
-        # TODO: Add try expects
-        task = self.in_progress.pop(finished_task.task_id).task
+        with self.in_progress.lock_for(finished_task.task_id):
+            connected_task = self.accept_result(finished_task, connection_id)
+        if connected_task is not None:
+            self.complete_task(finished_task, connected_task)
+
+    def accept_result(self, finished_task: Task, connection_id: str = None) -> Optional[ConnectedTask]:
+        """
+        Removes a processed task from the list of In Progress Tasks, or hands a failed one back
+        Returns the accepted task, whose result is yet to be delivered with complete_task
+        Must be called holding the shard lock of the task
+
+        :param finished_task:
+        :param connection_id:
+        :return Optional[ConnectedTask]:
+        """
+        connected_task: Optional[ConnectedTask] = self.in_progress.get(finished_task.task_id)
+        if connected_task is None:
+            logger.log_trace(f'{self.log_prefix}Task {finished_task.task_id} already finished.'
+                             f'\nDropping duplicate result')
+            return None
         if finished_task.message_type == TaskMessageType.TASK_FAILED or finished_task.message_type == TaskMessageType.TASK_RAW:
+            if connection_id is not None and not connected_task.is_connected_to(connection_id):
+                logger.log_trace(f'{self.log_prefix}Task {finished_task.task_id} not processed by '
+                                 f'stale slave {connection_id}.\nIgnoring')
+                return None
+            if connection_id is not None and connected_task.release(connection_id):
+                self.in_progress.untrack(connection_id, finished_task.task_id)
+                logger.log_trace(f'{self.log_prefix}Copy of task {finished_task.task_id} not processed.'
+                                 f'\nAnother copy is still running')
+                return None
             logger.log_trace(f'{self.log_prefix}Task {finished_task.task_id} not processed.'
                              f'\nAdding it back into available tasks queue')
-            self.add_new_available_task(task, task.job_id)
-        elif finished_task.message_type == TaskMessageType.TASK_PROCESSED:
-            self.status_manager.tasks_completed(1)
-            self.finished_tasks.put(finished_task)
-            logger.log_trace(f'{self.log_prefix}Task {finished_task.task_id} completed')
-            if len(self.in_progress) == 0 and self.available_tasks.empty():
-                self.status_manager.job_completed()
-                logger.log_trace(f'{self.log_prefix}No more tasks. Marking job as finished.')
-        else:
+            self.requeue(connected_task)
+            return None
+        if finished_task.message_type != TaskMessageType.TASK_PROCESSED:
             raise UnknownTaskMessage
+        self.in_progress.pop(finished_task.task_id)
+        with self.completion_secs_lock:
+            self.completion_secs.append(monotonic() - connected_task.connected_at)
+        if connected_task.suspended:
+            # late result of a suspended slave
+            self.withdraw_queued_copy(connected_task.task)
+        return connected_task
 
-    def tasks_finished(self, tasks: List[Task]):
+    def complete_task(self, finished_task: Task, connected_task: ConnectedTask):
+        """
+        Caches and delivers the result of a task accepted by accept_result
+        Called without holding the shard lock, so slow stores and callbacks do not block other tasks
+
+        :param finished_task:
+        :param connected_task:
+        :return:
+        """
+        if self.result_cache is not None:
+            self.result_cache.put(self.result_cache.key(connected_task.task), finished_task.payload)
+        self.deliver_result(finished_task, connected_task.task)
+        # the task stays unfinished until delivered, so the job is not done before its last result is stored
+        with self.unfinished_tasks_lock:
+            self.unfinished_tasks -= 1
+        self.status_manager.tasks_completed(1)
+        logger.log_trace(f'{self.log_prefix}Task {finished_task.task_id} completed')
+        self.complete_if_drained()
+
+    def deliver_result(self, finished_task: Task, original_task: Task):
+        """
+        Records a completed task and hands it to the Result Store, the completion callback
+        or the Finished Tasks Queue
+
+        :param finished_task:
+        :param original_task: the task as it was loaded, before it was processed
+        :return:
+        """
+        if self.journal is not None:
+            self.journal.task_finished(finished_task.task_id)
+        if self.result_store is not None:
+            self.result_store.append(finished_task, task_identity(original_task))
+        if self.on_task_completed is not None:
+            self.on_task_completed(finished_task)
+        elif self.result_store is None:
+            self.finished_tasks.put(finished_task)
+
+    def tasks_finished(self, tasks: List[Task], connection_id: str = None):
         """
         Removes the tasks from the list of In Progress Tasks
         Adds the tasks to the Finished Tasks Queue
+        Each shard lock is taken once for all of the tasks in the batch that belong to it
+        Results are delivered after the shard lock is released
 
         :param tasks:
+        :param connection_id:
         :return:
         """
+        tasks_by_id: Dict[int, List[Task]] = {}
         for task in tasks:
-            self.task_finished(task)
+            tasks_by_id.setdefault(task.task_id, []).append(task)
+        for shard_task_ids in self.in_progress.group_by_shard(tasks_by_id.keys()).values():
+            accepted: List[Tuple[Task, ConnectedTask]] = []
+            with self.in_progress.lock_for(shard_task_ids[0]):
+                for task_id in shard_task_ids:
+                    for task in tasks_by_id[task_id]:
+                        connected_task = self.accept_result(task, connection_id)
+                        if connected_task is not None:
+                            accepted.append((task, connected_task))
+            for task, connected_task in accepted:
+                self.complete_task(task, connected_task)
+
+    def set_completion_callback(self, callback: Callable[[Task], None]):
+        """
+        Passes each completed task to the callback instead of the Finished Tasks Queue
+        Tasks already in the queue are passed to the callback straight away
+
+        :param callback:
+        :return:
+        """
+        self.on_task_completed = callback
+        while True:
+            try:
+                callback(self.finished_tasks.get_nowait())
+            except Empty:
+                break
+
+    def iter_finished_tasks(self, poll_secs: float = 0.1) -> Iterator[Task]:
+        """
+        Yields tasks from the Finished Tasks Queue, or the Result Store, as they are completed
+        Stops once the job is done and every completed task has been yielded
+
+        :param poll_secs: how often to check whether the job is done while no task completes
+        :return Iterator[Task]:
+        """
+        if self.result_store is not None:
+            yield from self.result_store.iter_results(self.status_manager.is_job_done, poll_secs)
+            return
+        while True:
+            try:
+                yield self.finished_tasks.get(timeout=poll_secs)
+            except Empty:
+                if self.status_manager.is_job_done():
+                    # the last tasks may have been completed between the timeout and the check
+                    yield from self.flush_finished_tasks()
+                    return
 
     def flush_finished_tasks(self) -> List[Task]:
         """
         Removes all tasks from the Finished Tasks Queue and returns them
+        With a Result Store, returns the results stored since the last flush instead. Stored results are not removed
 
         :return List[Task]:
         """
+        if self.result_store is not None:
+            with self.flushed_results_lock:
+                tasks, self.flushed_results = self.result_store.results_from(self.flushed_results)
+            return tasks
         tasks: List[Task] = []
-        for _ in range(self.finished_tasks.qsize()):
-            tasks.append(self.finished_tasks.get())
+        while True:
+            try:
+                tasks.append(self.finished_tasks.get_nowait())
+            except Empty:
+                break
         logger.log_trace(f'{self.log_prefix}Flushed all finished tasks')
         return tasks
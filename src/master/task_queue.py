@@ -0,0 +1,194 @@
+"""
+Priority queue of the Available Tasks used by the Task Manager
+"""
+
+from collections import deque
+from heapq import heapify, heappop, heappush
+from queue import Empty
+from threading import Condition, Lock
+from time import monotonic
+from typing import Deque, Dict, List, Tuple, Union
+
+from common.task import Task
+
+
+class AvailableTaskQueue:
+    """
+    Thread-safe priority queue of tasks with the same get/put interface as queue.SimpleQueue
+    Tasks are ordered by priority (highest first), then by estimated cost (longest first),
+    then in the order they were put. A requeued task keeps its priority and cost hints,
+    so it goes back in at its original place in the ordering
+
+    Only the distinct sort keys are kept in a heap. The only task of a key is kept as is,
+    and tasks that share a key are kept in a FIFO bucket, so a queued task costs one deque slot
+    when hints repeat, and no more than its key when every task has its own hints
+    """
+
+    def __init__(self):
+        self.keys: List[Tuple[int, float]] = []
+        # the task of a key, or the bucket of the tasks of a key once a second task shares it
+        self.buckets: Dict[Tuple[int, float], Union[Task, Deque[Task]]] = {}
+        self.size = 0
+        lock = Lock()
+        self.condition: Condition = Condition(lock)
+        # notified when a task is taken, for producers waiting on a bounded window
+        self.space: Condition = Condition(lock)
+        self.closed = False
+
+    @staticmethod
+    def sort_key(task: Task) -> Tuple[int, float]:
+        """
+        Returns the heap sort key of a task. Tasks without hints sort as priority 0 and cost 0
+
+        :param task:
+        :return Tuple[int, float]:
+        """
+        priority = getattr(task, 'priority', 0) or 0
+        estimated_cost = getattr(task, 'estimated_cost', None) or 0.0
+        return -priority, -estimated_cost
+
+    def put(self, task: Task):
+        """
+        Adds a task to the queue
+
+        :param task:
+        :return:
+        """
+        key = self.sort_key(task)
+        with self.condition:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = task
+                heappush(self.keys, key)
+            elif isinstance(bucket, deque):
+                bucket.append(task)
+            else:
+                self.buckets[key] = deque((bucket, task))
+            self.size += 1
+            self.condition.notify()
+
+    def get(self, block: bool = True, timeout: float = None) -> Task:
+        """
+        Removes and returns the next task to dispatch
+        Raises queue.Empty if no task becomes available within the timeout
+
+        :param block:
+        :param timeout:
+        :return Task:
+        """
+        with self.condition:
+            if block:
+                deadline = None if timeout is None else monotonic() + timeout
+                while not self.size and not self.closed:
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            if not self.size:
+                raise Empty
+            key = self.keys[0]
+            bucket = self.buckets[key]
+            if isinstance(bucket, deque):
+                task = bucket.popleft()
+            else:
+                task, bucket = bucket, None
+            if not bucket:
+                heappop(self.keys)
+                del self.buckets[key]
+            self.size -= 1
+            self.space.notify()
+            return task
+
+    def remove(self, task: Task) -> bool:
+        """
+        Removes a task from the queue, if it is still queued
+        Returns True if the task was removed
+
+        :param task:
+        :return Boolean:
+        """
+        key = self.sort_key(task)
+        with self.condition:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                return False
+            if not isinstance(bucket, deque):
+                if bucket is not task:
+                    return False
+                bucket = None
+            else:
+                for i, queued_task in enumerate(bucket):
+                    if queued_task is task:
+                        del bucket[i]
+                        break
+                else:
+                    return False
+            if not bucket:
+                self.keys.remove(key)
+                heapify(self.keys)
+                del self.buckets[key]
+            self.size -= 1
+            self.space.notify()
+            return True
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until a task is put, the queue is closed or the timeout passes
+        Returns True if a task is available
+
+        :param timeout:
+        :return Boolean:
+        """
+        with self.condition:
+            if not self.size and not self.closed:
+                self.condition.wait(timeout)
+            return bool(self.size)
+
+    def wait_for_space(self, limit: int, timeout: float = None) -> bool:
+        """
+        Blocks until fewer than limit tasks are queued, the queue is closed or the timeout passes
+        Returns True if there is space
+
+        :param limit:
+        :param timeout:
+        :return Boolean:
+        """
+        with self.space:
+            self.space.wait_for(lambda: self.size < limit or self.closed, timeout)
+            return self.size < limit
+
+    def close(self):
+        """
+        Wakes every waiting consumer. Once closed, consumers no longer block on an empty queue
+
+        :return:
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            self.space.notify_all()
+
+    def get_nowait(self) -> Task:
+        """
+        Removes and returns the next task to dispatch without blocking
+        Raises queue.Empty if there is no task
+
+        :return Task:
+        """
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        """
+        Returns the number of tasks in the queue
+
+        :return Integer:
+        """
+        return self.size
+
+    def empty(self) -> bool:
+        """
+        Returns True if the queue is empty
+
+        :return Boolean:
+        """
+        return not self.size
@@ -0,0 +1,243 @@
+"""
+Lock-sharded store of the In Progress Tasks used by the Task Manager
+"""
+
+from threading import Lock, RLock
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Set
+
+from common.task import Task
+
+
+class ConnectedTask:
+    """
+    A ConnectedTask is a task that is associated with a connected slave
+    It may also be associated with backup slaves running speculative copies of the task
+    """
+    def __init__(self, task: Task, connection_id: str, lease_secs: float = None):
+        self.task = task
+        self.connection_id = connection_id
+        self.connected_at: float = monotonic()
+        self.backup_connection_ids: Set[str] = set()
+        # True while the owning slave is suspected to have failed and a copy of the task is queued
+        self.suspended = False
+        self.lease_expiry: Optional[float] = None
+        if lease_secs is not None:
+            self.renew_lease(lease_secs)
+
+    def renew_lease(self, lease_secs: float) -> float:
+        """
+        Extends the lease of the task to lease_secs from now
+        Returns the new lease expiry
+
+        :param lease_secs:
+        :return Float:
+        """
+        self.lease_expiry = monotonic() + lease_secs
+        return self.lease_expiry
+
+    def is_connected_to(self, connection_id: str) -> bool:
+        """
+        Returns True if the connection is running this task, either as its owner or as a backup
+
+        :param connection_id:
+        :return Boolean:
+        """
+        return connection_id == self.connection_id or connection_id in self.backup_connection_ids
+
+    def release(self, connection_id: str) -> bool:
+        """
+        Removes a connection from the task. If the owner is removed, a backup is promoted.
+        Returns True if another copy of the task is still running
+
+        :param connection_id:
+        :return Boolean:
+        """
+        if connection_id in self.backup_connection_ids:
+            self.backup_connection_ids.discard(connection_id)
+            return True
+        if connection_id == self.connection_id and self.backup_connection_ids:
+            self.connection_id = self.backup_connection_ids.pop()
+            return True
+        return False
+
+    def take_over(self, connection_id: str):
+        """
+        Makes a connection the owner of a suspended task. The suspended owner is kept as a backup,
+        so a late result from it is still accepted
+
+        :param connection_id:
+        :return:
+        """
+        self.backup_connection_ids.add(self.connection_id)
+        self.connection_id = connection_id
+        self.connected_at = monotonic()
+        self.suspended = False
+
+
+class InProgressStore:
+    """
+    Concurrent map of task id to ConnectedTask, with an index of connection id to task ids
+    Tasks are sharded by task id and the index is sharded by connection id, each shard
+    with its own lock, so concurrent requests only contend when they touch the same shard.
+
+    Callers that read and then modify an entry must hold lock_for(task_id) for the duration.
+    Index locks are only held inside this class and never while acquiring another lock.
+    """
+
+    def __init__(self, shard_count: int = 16):
+        self.shard_count = max(1, shard_count)
+        self.shards: List[Dict[int, ConnectedTask]] = [{} for _ in range(self.shard_count)]
+        self.locks: List[RLock] = [RLock() for _ in range(self.shard_count)]
+        self.index_shards: List[Dict[str, Set[int]]] = [{} for _ in range(self.shard_count)]
+        self.index_locks: List[Lock] = [Lock() for _ in range(self.shard_count)]
+
+    def shard_of(self, task_id: int) -> int:
+        """
+        Returns the shard number of a task id
+
+        :param task_id:
+        :return Integer:
+        """
+        return hash(task_id) % self.shard_count
+
+    def lock_for(self, task_id: int) -> RLock:
+        """
+        Returns the lock guarding the shard that holds the task id
+
+        :param task_id:
+        :return RLock:
+        """
+        return self.locks[self.shard_of(task_id)]
+
+    def group_by_shard(self, task_ids: Iterable[int]) -> Dict[int, List[int]]:
+        """
+        Groups task ids by shard number so batches can take each shard lock once
+
+        :param task_ids:
+        :return Dict[int, List[int]]:
+        """
+        groups: Dict[int, List[int]] = {}
+        for task_id in task_ids:
+            groups.setdefault(self.shard_of(task_id), []).append(task_id)
+        return groups
+
+    def get(self, task_id: int) -> Optional[ConnectedTask]:
+        """
+        Returns the ConnectedTask of a task id, or None
+
+        :param task_id:
+        :return ConnectedTask or None:
+        """
+        return self.shards[self.shard_of(task_id)].get(task_id)
+
+    def add(self, connected_task: ConnectedTask):
+        """
+        Adds a ConnectedTask and indexes its owning connection
+
+        :param connected_task:
+        :return:
+        """
+        task_id = connected_task.task.task_id
+        with self.lock_for(task_id):
+            self.shards[self.shard_of(task_id)][task_id] = connected_task
+            self.track(connected_task.connection_id, task_id)
+
+    def pop(self, task_id: int) -> ConnectedTask:
+        """
+        Removes a ConnectedTask and removes all of its connections from the index
+        Raises KeyError if the task is not in progress
+
+        :param task_id:
+        :return ConnectedTask:
+        """
+        with self.lock_for(task_id):
+            connected_task = self.shards[self.shard_of(task_id)].pop(task_id)
+            self.untrack(connected_task.connection_id, task_id)
+            for connection_id in connected_task.backup_connection_ids:
+                self.untrack(connection_id, task_id)
+        return connected_task
+
+    def index_of(self, connection_id: str) -> int:
+        """
+        Returns the index shard number of a connection id
+
+        :param connection_id:
+        :return Integer:
+        """
+        return hash(connection_id) % self.shard_count
+
+    def track(self, connection_id: str, task_id: int):
+        """
+        Records in the index that the connection is running the task
+
+        :param connection_id:
+        :param task_id:
+        :return:
+        """
+        index = self.index_of(connection_id)
+        with self.index_locks[index]:
+            self.index_shards[index].setdefault(connection_id, set()).add(task_id)
+
+    def untrack(self, connection_id: str, task_id: int):
+        """
+        Removes the task from the index entry of the connection
+
+        :param connection_id:
+        :param task_id:
+        :return:
+        """
+        index = self.index_of(connection_id)
+        with self.index_locks[index]:
+            task_ids: Optional[Set[int]] = self.index_shards[index].get(connection_id)
+            if task_ids is None:
+                return
+            task_ids.discard(task_id)
+            if not task_ids:
+                del self.index_shards[index][connection_id]
+
+    def pop_connection(self, connection_id: str) -> Set[int]:
+        """
+        Removes a connection from the index and returns the task ids it was running
+
+        :param connection_id:
+        :return Set[int]:
+        """
+        index = self.index_of(connection_id)
+        with self.index_locks[index]:
+            return self.index_shards[index].pop(connection_id, set())
+
+    def connection_task_ids(self, connection_id: str) -> Set[int]:
+        """
+        Returns a copy of the task ids the connection is running
+
+        :param connection_id:
+        :return Set[int]:
+        """
+        index = self.index_of(connection_id)
+        with self.index_locks[index]:
+            return set(self.index_shards[index].get(connection_id, set()))
+
+    def values(self) -> List[ConnectedTask]:
+        """
+        Returns a snapshot of all ConnectedTasks
+
+        :return List[ConnectedTask]:
+        """
+        connected_tasks: List[ConnectedTask] = []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                connected_tasks.extend(shard.values())
+        return connected_tasks
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def __contains__(self, task_id: int):
+        return task_id in self.shards[self.shard_of(task_id)]
+
+    def __getitem__(self, task_id: int) -> ConnectedTask:
+        return self.shards[self.shard_of(task_id)][task_id]
+
+    def __setitem__(self, task_id: int, connected_task: ConnectedTask):
+        self.add(connected_task)
@@ -5,8 +5,7 @@ An example app that imports master and prepares the tasks
 from os import path
 from sys import exit as sys_exit
 from threading import Thread
-from time import sleep
-from typing import List
+from typing import Dict, Iterator
 
 from common.task import Task
 from master.master import HyperMaster, JobInfo
@@ -30,6 +29,23 @@ DATA = "We're no strangers to love You know the rules and so do I A full commitm
        "desert you Never gonna make you cry "
 
 words = DATA.split(' ')
+
+
+def make_tasks() -> Iterator[Task]:
+    """
+    Yields one task per word. The master pulls tasks as slaves need them
+
+    :return Iterator[Task]:
+    """
+    for i, word in enumerate(words):
+        PROGRAM = "./slave_app_ex.sh"
+        payload_file_name = f'payload_{i}.txt'
+        result_file_name = f'output_{i}.txt'
+        ARGS = [payload_file_name, result_file_name]
+        PAYLOAD = str.encode(word)
+        yield Task(i, PROGRAM, ARGS, PAYLOAD, result_file_name, payload_file_name)
+
+
 if __name__ == "__main__":
     # Step 1: Initialise HyperMaster
     master: HyperMaster = HyperMaster()
@@ -40,18 +56,8 @@ if __name__ == "__main__":
     job.file_names = ["test_file.txt"]
     master.init_job(job)
 
-    # Step 3: Setup Tasks
-    tasks: List[Task] = []
-    for i, word in enumerate(words):
-        PROGRAM = "./slave_app_ex.sh"
-        payload_file_name = f'payload_{i}.txt'
-        result_file_name = f'output_{i}.txt'
-        ARGS = [payload_file_name, result_file_name]
-        PAYLOAD = str.encode(word)
-        tasks.append(Task(i, PROGRAM, ARGS, PAYLOAD, result_file_name, payload_file_name))
-
-    # Step 4: Load Tasks
-    master.load_tasks(tasks)
+    # Step 3 & 4: Setup and Load Tasks lazily
+    master.load_tasks(make_tasks(), estimated_total=len(words))
 
     # Step 5: Start Master Server
     master_thread = Thread(name='hypermaster_server_thread', target=master.start_server)
@@ -59,16 +65,17 @@ if __name__ == "__main__":
     master_thread.start()
 
     try:
-        # Step 6: Wait for job to be completed
-        while not master.is_job_done():
-            master.print_status()
-            sleep(10)
+        # Step 6: Collect completed tasks as they arrive, until the job is completed
+        results: Dict[int, str] = {}
+        for task in master.iter_completed():
+            results[task.task_id] = task.payload.decode()
+            if len(results) % 100 == 0:
+                master.print_status()
+        master.print_status()
 
         # Step 7: Reassemble completed tasks
-        completed_tasks: List[Task] = master.get_completed_tasks()
-        completed_tasks.sort(key=lambda t: t.task_id)
-        for task in completed_tasks:
-            print(task.payload.decode())
+        for task_id in sorted(results):
+            print(results[task_id])
         sys_exit(0)
 
     except KeyboardInterrupt:
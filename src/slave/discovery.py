@@ -0,0 +1,64 @@
+"""
+Master discovery for the slave, see common.discovery
+"""
+
+# External imports
+from select import select
+from socket import AF_INET, SO_BROADCAST, SO_REUSEADDR, SOCK_DGRAM, SOL_SOCKET, socket
+from time import monotonic
+from typing import List, Optional, Tuple
+
+# Internal imports
+from common.discovery import BROADCAST_ADDRESS, DISCOVERY_PORT, PROBE, decode_announcement
+from common.logging import Logger
+
+logger = Logger()
+
+
+def discover_master(timeout_secs: float = 1.0, discovery_port: int = DISCOVERY_PORT,
+                    probe_interval_secs: float = 0.1) -> Optional[Tuple[str, int]]:
+    """
+    Broadcasts probes every probe_interval_secs and listens for the master's answer or announcement
+    Returns the address and HTTP port of the first master heard from within timeout_secs, or None
+
+    :param timeout_secs:
+    :param discovery_port:
+    :param probe_interval_secs:
+    :return Tuple[str, int] or None:
+    """
+    sockets: List[socket] = []
+    try:
+        # answers to probes come back to the probing socket
+        probe_sock = socket(AF_INET, SOCK_DGRAM)
+        sockets.append(probe_sock)
+        probe_sock.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+        probe_sock.bind(('', 0))
+        # announcements are broadcast to the discovery port
+        listen_sock = socket(AF_INET, SOCK_DGRAM)
+        sockets.append(listen_sock)
+        listen_sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        try:
+            listen_sock.bind(('', discovery_port))
+        except OSError:
+            sockets.remove(listen_sock)
+            listen_sock.close()
+
+        deadline = monotonic() + timeout_secs
+        next_probe = monotonic()
+        while monotonic() < deadline:
+            if monotonic() >= next_probe:
+                try:
+                    probe_sock.sendto(PROBE, (BROADCAST_ADDRESS, discovery_port))
+                except OSError as error:
+                    logger.log_trace(f'Discovery probe failed\n{error}')
+                next_probe = monotonic() + probe_interval_secs
+            readable, _, _ = select(sockets, [], [], max(min(next_probe, deadline) - monotonic(), 0.0))
+            for sock in readable:
+                data, address = sock.recvfrom(1024)
+                port = decode_announcement(data)
+                if port is not None:
+                    return address[0], port
+        return None
+    finally:
+        for sock in sockets:
+            sock.close()
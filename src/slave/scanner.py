@@ -0,0 +1,92 @@
+"""
+Network scan for the master, the slave's fallback when the discovery beacon cannot be heard
+"""
+
+# External imports
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import ip_network
+from socket import create_connection, error as SocketError
+from threading import Event, Lock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+def network_hosts(networks: Iterable[str]) -> List[str]:
+    """
+    Returns the host addresses of the given networks in CIDR notation, each address once
+    An address, such as the slave's own, is taken as its network, so '10.0.0.7/24' is 10.0.0.0/24
+
+    :param networks: such as ['192.168.1.0/24', '10.0.0.0/22']
+    :return List[str]:
+    :raises ValueError: if a network is not valid
+    """
+    hosts: Dict[str, None] = {}
+    for network in networks:
+        parsed = ip_network(network, strict=False)
+        # a /32 has no hosts other than its address
+        for host in (parsed.hosts() if parsed.num_addresses > 2 else parsed):
+            hosts[str(host)] = None
+    return list(hosts)
+
+
+def port_open(host: str, port: int, timeout_secs: float) -> bool:
+    """
+    Returns True if host accepts a TCP connection on port within timeout_secs
+
+    :param host:
+    :param port:
+    :param timeout_secs:
+    :return Boolean:
+    """
+    try:
+        with create_connection((host, port), timeout=timeout_secs):
+            return True
+    except (SocketError, ValueError):
+        return False
+
+
+def scan(hosts: Iterable[str], port: int, confirm: Callable[[str], Optional[T]], max_workers: int = 64,
+         timeout_secs: float = 0.1, discard: Callable[[T], None] = None) -> Optional[Tuple[str, T]]:
+    """
+    Probes hosts for an open port, max_workers at a time, and confirms the hosts that have it open
+    Stops at the first host confirm returns a result for, and returns that host and result, or None.
+    Probing is a bare TCP connection, so only hosts with the port open are sent a request.
+    confirm is called from several threads at once
+
+    :param hosts:
+    :param port:
+    :param confirm: returns a result if host is the one looked for, otherwise None
+    :param max_workers: maximum number of hosts probed at once
+    :param timeout_secs: how long a host has to accept the connection
+    :param discard: called with the results of hosts confirmed after the first, such as to close them
+    :return Tuple[str, T] or None:
+    """
+    remaining: Iterator[str] = iter(hosts)
+    lock: Lock = Lock()
+    found: List[Tuple[str, T]] = []
+    done: Event = Event()
+
+    def probe_hosts():
+        while not done.is_set():
+            with lock:
+                host = next(remaining, None)
+            if host is None:
+                return
+            if not port_open(host, port, timeout_secs):
+                continue
+            result = confirm(host)
+            if result is None:
+                continue
+            with lock:
+                first = not found
+                if first:
+                    found.append((host, result))
+            if not first and discard is not None:
+                discard(result)
+            done.set()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hyperslave_scan') as executor:
+        for _ in range(max_workers):
+            executor.submit(probe_hosts)
+    return found[0] if found else None
@@ -3,16 +3,20 @@ Implemented functionality to run a slave node for a distributed workload
 """
 
 # External imports
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from json import loads as json_loads
+from os import cpu_count
 from pathlib import Path
 from random import random
 from shutil import rmtree
-from pickle import dumps as pickle_dumps, loads as pickle_loads, PicklingError, UnpicklingError
-from subprocess import CalledProcessError, run
+from pickle import loads as pickle_loads, PicklingError, UnpicklingError
+from signal import SIGTERM, signal
+from subprocess import CalledProcessError, Popen, TimeoutExpired, run
 from sys import exit as sys_exit
-from time import sleep
-from typing import List
-from zlib import compress, decompress, error as CompressionException
+from threading import Event, Lock, Thread, current_thread, main_thread
+from time import monotonic, perf_counter, sleep
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from zlib import decompress, error as CompressionException
 from requests import Session, cookies, exceptions as RequestExceptions
 
 # Internal imports
@@ -21,20 +25,115 @@ from common.api.types import MasterInfo
 from common.logging import Logger
 from common.networking import get_ip_addr
 from common.task import Task, TaskMessageType
+from common.wire import MIME_TYPE as TASKS_MIME_TYPE, WireFormatError, decode_tasks, encode_tasks, is_task_batch
+from .discovery import discover_master
 from .heartbeat import Heartbeat
+from .scanner import network_hosts, scan
 
 logger = Logger()
 
+# file in the job root directory the address of the last master is kept in
+MASTER_ADDRESS_FILE = 'master_address'
 
-def run_shell_command(command):
+
+class TaskProcesses:
+    """
+    The subprocesses of the running tasks, so a stopping slave can kill those that outlive its drain
+    Once killed, no new subprocess is started
+    """
+
+    def __init__(self):
+        self.processes: Set[Popen] = set()
+        # subprocess of each task, for the tasks run with their id
+        self.task_processes: Dict[int, Popen] = {}
+        self.lock: Lock = Lock()
+        self.killed = False
+
+    def run(self, command, task_id: int = None) -> int:
+        """
+        Runs a command to completion and returns its returncode, or -1 if the processes were killed
+
+        :param command:
+        :param task_id: id of the task the command runs, so it can be killed with kill_task
+        :return Integer:
+        """
+        with self.lock:
+            if self.killed:
+                return -1
+            process = Popen(command)
+            self.processes.add(process)
+            if task_id is not None:
+                self.task_processes[task_id] = process
+        try:
+            return process.wait()
+        finally:
+            with self.lock:
+                self.processes.discard(process)
+                if task_id is not None and self.task_processes.get(task_id) is process:
+                    del self.task_processes[task_id]
+
+    def kill_task(self, task_id: int, timeout_secs: float = 1.0) -> bool:
+        """
+        Terminates the subprocess of a task, and kills it if it is still running after timeout_secs
+        Returns True if the task had a subprocess running
+
+        :param task_id:
+        :param timeout_secs:
+        :return Boolean:
+        """
+        with self.lock:
+            process: Optional[Popen] = self.task_processes.get(task_id)
+        if process is None:
+            return False
+        process.terminate()
+        try:
+            process.wait(timeout_secs)
+        except TimeoutExpired:
+            process.kill()
+            process.wait()
+        return True
+
+    def kill(self, timeout_secs: float = 1.0) -> int:
+        """
+        Terminates the running subprocesses, kills those still running after timeout_secs,
+        and stops new ones from starting
+        Returns the number of subprocesses stopped
+
+        :param timeout_secs:
+        :return Integer:
+        """
+        with self.lock:
+            self.killed = True
+            processes = list(self.processes)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout_secs)
+            except TimeoutExpired:
+                process.kill()
+                process.wait()
+        return len(processes)
+
+
+def run_shell_command(command, processes: TaskProcesses = None, task_id: int = None):
     """
     Execute a shell command outputing stdout/stderr to a result.txt file.
     Returns the shell commands returncode.
+    With processes, the subprocess is tracked by it, so it can be killed
 
     :param command:
+    :param processes:
+    :param task_id: id of the task the command runs, if it is tracked by processes
     :return returncode:
     """
     try:
+        if processes is not None:
+            returncode = processes.run(command, task_id)
+            if returncode != 0:
+                logger.log_error(f'Command {command} returned non-zero exit status {returncode}')
+            return returncode
+
         output = run(command, check=True)
 
         return output.returncode
@@ -53,9 +152,13 @@ class HyperSlave:
     can import to begin using the features of the system on the slave itself
     """
 
-    def __init__(self, port=5678):
+    def __init__(self, port=5678, max_workers: int = None, long_poll_secs: float = 10.0, drain_secs: float = 30.0,
+                 discovery_secs: float = 0.5, scan_networks: Sequence[str] = None, scan_workers: int = 64,
+                 lease_renewal_secs: float = 60.0, max_task_secs: Optional[float] = 3600.0):
         self.heartbeat = None
         self.session: Session = None
+        # kept across reconnections, so the master can give a slave that comes back its tasks
+        self.session_id: str = None
         self.ip_addr = None
         self.host = None
         self.port = port
@@ -64,6 +167,36 @@ class HyperSlave:
         self.job_done = False
         self.master_info: MasterInfo = None
         self.running = True
+        self.max_workers: int = max_workers or cpu_count() or 1
+        self.long_poll_secs = long_poll_secs
+        self.executor: ThreadPoolExecutor = None
+        self.running_tasks: Set[Future] = set()
+        self.processes: TaskProcesses = TaskProcesses()
+        # ids of the tasks the workers are running, to when they started. Their leases are renewed every
+        # lease_renewal_secs, which must be shorter than the task lease of the master, 600 seconds by default
+        self.running_task_ids: Dict[int, float] = {}
+        self.running_task_ids_lock: Lock = Lock()
+        self.lease_renewal_secs = lease_renewal_secs
+        # a task running for longer is taken as hung: its subprocess is killed and its lease is no longer
+        # renewed, so the master hands it to another slave. Leases are renewed for as long as tasks run if None
+        self.max_task_secs = max_task_secs
+        self.lease_renewer: Optional[Thread] = None
+        self.lease_renewer_stop: Event = Event()
+        # results that could not be sent because the master was unreachable, sent again once the slave reconnects
+        self.unsent_results: List[Task] = []
+        self.unsent_results_lock: Lock = Lock()
+        # how long a stopping slave waits for its running tasks to finish before killing them and handing them back
+        self.drain_secs = drain_secs
+        # how long the slave listens for the master's discovery beacon before scanning the network
+        self.discovery_secs = discovery_secs
+        # networks, in CIDR notation, scanned for the master when the beacon cannot be heard,
+        # the /24 network of the slave by default
+        self.scan_networks: Optional[Sequence[str]] = scan_networks
+        # maximum number of addresses probed at once by the scan
+        self.scan_workers = scan_workers
+        # jobs whose files have been downloaded, other than the job the slave was given
+        self.prepared_jobs: Set[int] = set()
+        self.prepare_lock: Lock = Lock()
 
     def connect(self, hostname, port):
         """
@@ -73,6 +206,24 @@ class HyperSlave:
         :param port:
         :return session or None:
         """
+        found = self.probe_master(hostname, port)
+        if found is None:
+            return None
+        session, self.master_info = found
+        return session
+
+    @staticmethod
+    def probe_master(hostname, port) -> Optional[Tuple[Session, MasterInfo]]:
+        """
+        Asks a hostname on given port for the master's info
+        Returns a session with the master and its info, or None if the host is not a master.
+        Any request error means the host is not a master, and the session is closed.
+        Safe to call from several threads, such as the scan's
+
+        :param hostname:
+        :param port:
+        :return Tuple[Session, MasterInfo] or None:
+        """
         session: Session = Session()
         try:
             # try for a response within 0.075s
@@ -80,63 +231,147 @@ class HyperSlave:
                 f'http://{hostname}:{port}/{endpoints.DISCOVERY}', timeout=0.075)
             # 200 okay returned, master discovery succeeded
             if resp.status_code == 200:
-                try:
-                    self.master_info = resp.json()
-                    return session
-
-                except ValueError:
-                    logger.log_error('Master provided no info')
-
-        except (ConnectionError, RequestExceptions.ConnectionError):
-            return None
-
-        # allows breaking out of the loop
-        except KeyboardInterrupt:
-            logger.log_debug('Keyboard Interrupt detected. Exiting...')
-            sys_exit(0)
-
-        except Exception as error:
-            logger.log_error(
-                f'Exception of type {type(error)} occurred\n{error.with_traceback(error.__traceback__)}')
-            sys_exit(1)
-
+                return session, resp.json()
+        except ValueError:
+            logger.log_error(f'Master at {hostname}:{port} provided no info')
+        except (ConnectionError, RequestExceptions.RequestException):
+            pass
+        session.close()
         return None
 
     def attempt_master_connection(self, master_port):
         """
         Attempt to find and connect to the master node
+        Tries the last master the slave connected to, then the master's discovery beacon,
+        then scans the network
 
         :param master_port:
         :return String or None:
         """
 
         self.ip_addr = get_ip_addr()
-        network_id = self.ip_addr.rpartition('.')[0]
         logger.log_info('Attempting master connection')
-        for i in range(0, 256):
-            hostname = network_id + "." + str(i)
-            session = self.connect(hostname, master_port)
-            if session is not None:
-                self.set_session(session)
-                logger.log_success(
-                    f"Connected to {hostname}:{master_port}", "MASTER CONNECTED")
-                return hostname
-            logger.print_sameline(f'Master not at: {hostname}:{master_port}')
+        start = perf_counter()
+        find_methods: List[Tuple[str, Callable[[int], Optional[Tuple[str, int, Session]]]]] = [
+            ('last known address', self.connect_remembered_master),
+            ('discovery beacon', self.connect_discovered_master),
+            ('network scan', self.scan_for_master)]
+        for method, find_master in find_methods:
+            found = find_master(master_port)
+            if found is None:
+                continue
+            hostname, port, session = found
+            self.port = port
+            self.set_session(session)
+            self.remember_master(hostname, port)
+            logger.log_success(f"Connected to {hostname}:{port} through {method} "
+                               f"in {(perf_counter() - start) * 1000:.0f} ms", "MASTER CONNECTED")
+            return hostname
         return None
 
+    def master_address_path(self) -> Optional[str]:
+        """
+        Returns the path of the file the address of the last master is kept in, or None without a job root
+
+        :return String or None:
+        """
+        return f'{self.job_path}/{MASTER_ADDRESS_FILE}' if self.job_path else None
+
+    def remember_master(self, hostname: str, port: int):
+        """
+        Keeps the address of the master, so the slave tries it first the next time it connects
+
+        :param hostname:
+        :param port:
+        :return:
+        """
+        path = self.master_address_path()
+        if path is None:
+            return
+        try:
+            with open(path, 'w') as file:
+                file.write(f'{hostname}:{port}')
+        except OSError as error:
+            logger.log_warn(f'Unable to remember the master address\n{error}')
+
+    def connect_remembered_master(self, _master_port) -> Optional[Tuple[str, int, Session]]:
+        """
+        Connects to the last master the slave connected to
+        Returns its hostname, port and session, or None
+
+        :param _master_port: unused, the remembered port is used
+        :return Tuple[str, int, Session] or None:
+        """
+        path = self.master_address_path()
+        if path is None or not Path(path).is_file():
+            return None
+        try:
+            with open(path) as file:
+                hostname, _, port = file.read().strip().rpartition(':')
+            port = int(port)
+        except (OSError, ValueError):
+            return None
+        session = self.connect(hostname, port)
+        return None if session is None else (hostname, port, session)
+
+    def connect_discovered_master(self, _master_port) -> Optional[Tuple[str, int, Session]]:
+        """
+        Connects to the master that answers the discovery probe
+        Returns its hostname, port and session, or None
+
+        :param _master_port: unused, the master announces its port
+        :return Tuple[str, int, Session] or None:
+        """
+        address = discover_master(self.discovery_secs)
+        if address is None:
+            return None
+        hostname, port = address
+        session = self.connect(hostname, port)
+        return None if session is None else (hostname, port, session)
+
+    def scan_for_master(self, master_port) -> Optional[Tuple[str, int, Session]]:
+        """
+        Probes every address of the scan networks for the master, scan_workers at a time
+        Returns the hostname, port and session of the first master found, or None
+
+        :param master_port:
+        :return Tuple[str, int, Session] or None:
+        """
+        networks = self.scan_networks or [f'{self.ip_addr}/24']
+        try:
+            hosts = network_hosts(networks)
+        except ValueError as error:
+            logger.log_error(f'Invalid scan network\n{error}')
+            return None
+        start = perf_counter()
+        found = scan(hosts, master_port, lambda host: self.probe_master(host, master_port), self.scan_workers,
+                     discard=lambda probed: probed[0].close())
+        elapsed_ms = (perf_counter() - start) * 1000
+        if found is None:
+            logger.log_info(f'Master not found on {", ".join(networks)}: '
+                            f'scanned {len(hosts)} hosts in {elapsed_ms:.0f} ms')
+            return None
+        hostname, (session, self.master_info) = found
+        logger.log_info(f'Master found at {hostname} scanning {len(hosts)} hosts in {elapsed_ms:.0f} ms')
+        return hostname, master_port, session
+
     def set_session(self, session: Session):
         """
         Setup the session through the use of a cookie
-        Cookie is created with a unique session id
+        Cookie is created with a unique session id the first time,
+        and reuses it when the slave reconnects
 
         :param session:
         :return:
         """
-        session_id = self.ip_addr + '-' + str(random() * random() * 123456789)
-        cookie = cookies.create_cookie('id', session_id)
+        if self.session_id is None:
+            self.session_id = self.ip_addr + '-' + str(random() * random() * 123456789)
+            logger.log_info(f"New Session: {self.session_id}")
+        else:
+            logger.log_info(f"Resuming Session: {self.session_id}")
+        cookie = cookies.create_cookie('id', self.session_id)
         session.cookies.set_cookie(cookie)
         self.session = session
-        logger.log_info(f"New Session: {session_id}")
 
     def start(self):
         """
@@ -158,8 +393,63 @@ class HyperSlave:
         self.heartbeat = Heartbeat(
             session=self.session, url=f'http://{self.host}:{self.port}/{endpoints.HEARTBEAT}')
         self.heartbeat.start_beating()
+        self.start_lease_renewal()
+        # signal handlers can only be set from the main thread
+        if current_thread() is main_thread():
+            signal(SIGTERM, self.terminate)
         self.req_job()
 
+    def reconnect(self):
+        """
+        Starts the slave again after it lost its master or failed to process its job.
+        The session id is kept, so a master that suspended the slave gives it back the tasks
+        it still holds, see held_task_ids
+
+        :return:
+        """
+        logger.log_info(f'Reconnecting with session {self.session_id}')
+        self.running = True
+        self.processes = TaskProcesses()
+        self.start()
+
+    def held_task_ids(self) -> Set[int]:
+        """
+        Returns the ids of the tasks the slave is running or has unsent results of
+
+        :return Set[int]:
+        """
+        with self.running_task_ids_lock:
+            task_ids: Set[int] = set(self.running_task_ids)
+        with self.unsent_results_lock:
+            task_ids.update(task.task_id for task in self.unsent_results)
+        return task_ids
+
+    def keep_unsent_results(self, tasks: List[Task]):
+        """
+        Keeps the processed tasks of a batch the master could not be reached to send,
+        so they are sent again once the slave reconnects
+
+        :param tasks:
+        :return:
+        """
+        processed: List[Task] = [task for task in tasks if task.message_type == TaskMessageType.TASK_PROCESSED]
+        if processed:
+            with self.unsent_results_lock:
+                self.unsent_results.extend(processed)
+            logger.log_warn(f'Keeping {len(processed)} results to send once the master is reachable')
+
+    def send_unsent_results(self):
+        """
+        Sends the results kept while the master could not be reached
+
+        :return:
+        """
+        with self.unsent_results_lock:
+            tasks, self.unsent_results = self.unsent_results, []
+        if tasks:
+            logger.log_info(f'Sending {len(tasks)} results kept while the master was unreachable')
+            self.send_tasks(tasks)
+
     def init_job_root(self):
         """
         Initializes the job root directory
@@ -171,29 +461,31 @@ class HyperSlave:
         Path.mkdir(Path(job_root_dir_path), parents=True, exist_ok=True)
         self.job_path = job_root_dir_path
 
-    def create_job_dir(self):
+    def create_job_dir(self, job_id: int = None):
         """
-        Create job directory based on job id
+        Create job directory based on job id, the job the slave was given by default
         Overwrites the directory if it exists
 
+        :param job_id:
         :return String:
         """
 
-        job_path = f'{self.job_path}/{self.job_id}'
+        job_path = f'{self.job_path}/{self.job_id if job_id is None else job_id}'
         rmtree(path=job_path, ignore_errors=True)
         Path(job_path).mkdir(parents=True, exist_ok=False)
         return job_path
 
-    def save_processed_data(self, file_name, file_data):
+    def save_processed_data(self, file_name, file_data, job_id: int = None):
         """
-        Write job bytes to file
+        Write job bytes to file in the directory of a job, the job the slave was given by default
 
         :param file_name:
         :param file_data:
+        :param job_id:
         :return:
         """
         try:
-            path = f'{self.job_path}/{self.job_id}/{file_name}'
+            path = f'{self.job_path}/{self.job_id if job_id is None else job_id}/{file_name}'
             with open(path, 'wb') as new_file:
                 new_file.write(file_data)
             sleep(0.05)
@@ -206,17 +498,19 @@ class HyperSlave:
 
         logger.log_success(f'Processed data saved: {path}')
 
-    def get_file(self, file_name):
+    def get_file(self, file_name, job_id: int = None):
         """
-        Requests a file from the master.
+        Requests a file of a job from the master, the job the slave was given by default
         Returns a success boolean
 
         :param file_name:
+        :param job_id:
         :return Boolean:
         """
+        job_id = self.job_id if job_id is None else job_id
         logger.log_info(f'requesting file: {file_name}')
         resp = self.session.get(
-            f'http://{self.host}:{self.port}/{endpoints.FILE}/{self.job_id}/{file_name}'
+            f'http://{self.host}:{self.port}/{endpoints.FILE}/{job_id}/{file_name}', timeout=30
         )
         if not resp:
             logger.log_error(f'File: {file_name} was not returned')
@@ -230,18 +524,103 @@ class HyperSlave:
             logger.log_error(f'Get_file Compression exception\n{error.with_traceback(error.__traceback__)}')
             return False
 
-        self.save_processed_data(file_name, file_data)
+        self.save_processed_data(file_name, file_data, job_id)
         return True
 
+    def task_job_id(self, task: Task) -> int:
+        """
+        Returns the job id of a task, or the id of the job the slave was given if the task has none
+
+        :param task:
+        :return Integer:
+        """
+        job_id: Optional[int] = getattr(task, 'job_id', None)
+        return self.job_id if job_id is None else job_id
+
+    def prepare_job(self, job_id: int) -> bool:
+        """
+        Downloads the files of a job the first time one of its tasks is received
+        A long-lived master hands out tasks of every job it runs, so the slave moves from job
+        to job without requesting a new job
+        Returns a success boolean
+
+        :param job_id:
+        :return Boolean:
+        """
+        if job_id == self.job_id:
+            return True
+        with self.prepare_lock:
+            if job_id in self.prepared_jobs:
+                return True
+            resp = self.session.get(f'http://{self.host}:{self.port}/{endpoints.JOB}/{job_id}', timeout=5)
+            if resp.status_code != 200:
+                logger.log_error(f'Job {job_id} not returned, response_code: {resp.status_code}')
+                return False
+            job_json = json_loads(resp.json())
+            self.create_job_dir(job_id)
+            for file_name in job_json.get("file_names"):
+                if not self.get_file(file_name, job_id):
+                    return False
+            self.prepared_jobs.add(job_id)
+            logger.log_info(f'Files of job {job_id} received')
+            return True
+
     def stop(self):
         """
-        kills the heartbeat and sets the running flag to false
+        Drains the slave: sets the running flag to false so no new tasks are taken,
+        waits up to drain_secs for the running tasks to finish and send their results,
+        kills the subprocesses of the tasks still running, then tells the master the slave is leaving,
+        so it hands back the unfinished tasks straight away.
+        Finally kills the heartbeat
 
         :return:
         """
         self.running = False
-        self.heartbeat.stop_beating()
-        del self.heartbeat
+        if self.executor is not None:
+            _, unfinished = wait(self.running_tasks, timeout=self.drain_secs)
+            if unfinished:
+                logger.log_warn(f'{len(unfinished)} tasks still running, killing them and handing them back to the master')
+                self.processes.kill()
+                # killed tasks fail, and their workers send them back without taking new ones
+                wait(unfinished, timeout=10)
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.stop_lease_renewal()
+        if self.session is not None:
+            self.leave()
+        if self.heartbeat is not None:
+            self.heartbeat.stop_beating()
+            self.heartbeat = None
+
+    def terminate(self, _signal_number, _frame):
+        """
+        SIGTERM handler. Drains the slave, see stop, and exits
+
+        :param _signal_number:
+        :param _frame:
+        :return:
+        """
+        logger.log_info('SIGTERM received, draining')
+        self.stop()
+        sys_exit(0)
+
+    def leave(self):
+        """
+        Tells the master the slave is leaving, so it hands back the tasks the slave still holds
+        Returns True if the master was told
+
+        :return Boolean:
+        """
+        try:
+            resp = self.session.post(f'http://{self.host}:{self.port}/{endpoints.LEAVE}', timeout=5)
+            if resp.status_code != 200:
+                logger.log_warn(f'Leave failed, response_code: {resp.status_code}')
+                return False
+            logger.log_info('Left the master')
+            return True
+        except Exception as error:
+            logger.log_warn(f'Leave failed\n{error.with_traceback(error.__traceback__)}')
+            return False
 
     def req_job(self):
         """
@@ -250,8 +629,17 @@ class HyperSlave:
         :return:
         """
         try:
+            # a master that suspended the slave only gives it back the tasks it still holds
+            params = {'held': ','.join(str(task_id) for task_id in sorted(self.held_task_ids()))}
             resp = self.session.get(
-                f'http://{self.host}:{self.port}/{endpoints.JOB}', timeout=5)
+                f'http://{self.host}:{self.port}/{endpoints.JOB}', params=params, timeout=5)
+
+            # long-lived master without a job to run yet
+            while resp.status_code == 42 and self.running:
+                logger.log_info('No job available yet, waiting.')
+                sleep(1)
+                resp = self.session.get(
+                    f'http://{self.host}:{self.port}/{endpoints.JOB}', params=params, timeout=5)
 
             # TODO: better way to determine job is done
             if resp.status_code == 404:
@@ -276,8 +664,10 @@ class HyperSlave:
             for file_name in job_file_names:
                 self.get_file(file_name)
 
+            self.send_unsent_results()
+
             retries_left = 2
-            while not self.job_done:
+            while not self.job_done and self.running:
                 success = self.process_job()
                 if success:
                     continue
@@ -302,35 +692,87 @@ class HyperSlave:
     def process_job(self):
         """
         Process the job
+        Requests as many tasks as there are free worker slots and hands each
+        task to the worker pool. Workers return their results and fetch their
+        next task through the combined exchange endpoint
 
         :return Boolean:
         """
         # request job tasks
         retry_attempts = 2
-        max_concurrent_tasks = 1
-        tasks: List[Task] = []
-        for i in range(retry_attempts):
-            tasks = self.req_tasks(max_concurrent_tasks)
-            if not tasks or len(tasks) == 0:
-                if i < retry_attempts:
-                    continue
-                logger.log_error(f'Task data not received after {retry_attempts} attempts')
-                return False
-            break
-        # handle tasks
-        success, handled_tasks = self.handle_tasks(tasks)
-        if success:
-            # send tasks back
-            self.send_tasks(handled_tasks)
+        free_slots = self.wait_for_free_slots()
+        tasks: List[Task] = None
+        for _ in range(retry_attempts):
+            tasks = self.req_tasks(free_slots)
+            if tasks is not None:
+                break
+        if tasks is None:
+            logger.log_error(f'Task data not received after {retry_attempts} attempts')
+            return False
+
+        if len(tasks) > 0 and tasks[0].message_type == TaskMessageType.JOB_END:
+            self.job_done = True
             return True
-        # TODO: Contingency Plan when task handling fails
-        return False
+
+        # hand tasks to the worker pool
+        for task in tasks:
+            self.running_tasks.add(self.executor.submit(self.run_task, task))
+        return True
+
+    def wait_for_free_slots(self):
+        """
+        Blocks until at least one worker slot is free
+        Returns the number of free worker slots
+
+        :return Integer:
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix='hyperslave_worker')
+        self.running_tasks = {future for future in self.running_tasks if not future.done()}
+        if len(self.running_tasks) >= self.max_workers:
+            _, self.running_tasks = wait(self.running_tasks, return_when=FIRST_COMPLETED)
+        return self.max_workers - len(self.running_tasks)
+
+    def run_task(self, task: Task):
+        """
+        Runs tasks on a worker thread
+        Each result is sent back to the master in the same round trip that fetches the
+        worker's next task. The worker keeps running tasks until the master has none left for it,
+        or the slave is stopped
+
+        :param task:
+        :return Boolean:
+        """
+        while task is not None:
+            with self.running_task_ids_lock:
+                self.running_task_ids[task.task_id] = monotonic()
+            try:
+                success, handled_tasks = self.handle_tasks([task])
+            finally:
+                with self.running_task_ids_lock:
+                    self.running_task_ids.pop(task.task_id, None)
+            if not success:
+                # TODO: Contingency Plan when task handling fails
+                return False
+            if not self.running:
+                # draining, so the result is sent without taking a new task
+                return self.send_tasks(handled_tasks)
+            next_tasks = self.exchange_tasks(handled_tasks, 1)
+            if next_tasks is None:
+                return self.send_tasks(handled_tasks)
+            if len(next_tasks) > 0 and next_tasks[0].message_type == TaskMessageType.JOB_END:
+                self.job_done = True
+                return True
+            task = next_tasks[0] if len(next_tasks) > 0 else None
+        return True
 
     def req_tasks(self, max_tasks: int):
         """
-        Requests a task from the master node, if task failed to receive try up to 5 times
-        TODO: make this request tasks for as many cpu cores
-              as it has using multiprocessings cpu_count()
+        Requests up to max_tasks tasks from the master node
+        The master holds the request for up to long_poll_secs while it has no available tasks,
+        unless it is busy, in which case the slave waits as long as the master asks before returning
+        Returns an empty list if the master still has no available tasks
 
         :param max_tasks:
         :return List[Task] or None:
@@ -338,11 +780,24 @@ class HyperSlave:
         try:
             resp = self.session.get(
                 f'http://{self.host}:{self.port}/'
-                f'{endpoints.GET_TASKS}/{self.job_id}/{max_tasks}', timeout=5)
-
-            tasks: List[Task] = pickle_loads(decompress(resp.content))
+                f'{endpoints.GET_TASKS}/{self.job_id}/{max_tasks}',
+                params={'wait': self.long_poll_secs}, headers={'Accept': TASKS_MIME_TYPE},
+                timeout=5 + self.long_poll_secs)
+
+            # master has no available tasks, but the job is not done yet
+            if resp.status_code == 42:
+                # the master had no thread to spare for a long poll
+                retry_after = self.retry_after_secs(resp.headers.get('Retry-After'))
+                if retry_after > 0:
+                    sleep(min(retry_after, self.long_poll_secs))
+                return []
+
+            tasks: List[Task] = self.decode_tasks_resp(resp.content)
             return tasks
 
+        except WireFormatError as error:
+            logger.log_error(f'Unable to decode tasks\n{error.with_traceback(error.__traceback__)}')
+            return None
         except CompressionException as error:
             logger.log_error(f'Unable to decompress raw data\n{error.with_traceback(error.__traceback__)}')
             return None
@@ -353,6 +808,148 @@ class HyperSlave:
             logger.log_warn(f'Task data not received, trying again.\n{error.with_traceback(error.__traceback__)}')
             return None
 
+    @staticmethod
+    def retry_after_secs(retry_after) -> float:
+        """
+        Returns the seconds of a Retry-After header, or 0 if it is missing or not a number of seconds
+
+        :param retry_after:
+        :return Float:
+        """
+        try:
+            return max(float(retry_after), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @staticmethod
+    def decode_tasks_resp(content: bytes) -> List[Task]:
+        """
+        Decodes tasks sent by the master in either the binary task batch format
+        or as compressed pickled tasks. Binary payloads are not copied out of the response
+
+        :param content:
+        :return List[Task]:
+        """
+        if is_task_batch(content):
+            return decode_tasks(content, zero_copy=True)
+        return pickle_loads(decompress(content))
+
+    def exchange_tasks(self, tasks: List[Task], max_tasks: int):
+        """
+        Sends (processed) tasks back to the master and requests up to max_tasks new tasks
+        in the same request. The master does not long poll, so results never wait on new tasks
+        Returns an empty list if the master has no available tasks right now
+
+        :param tasks:
+        :param max_tasks:
+        :return List[Task] or None:
+        """
+        try:
+            resp = self.session.post(f'http://{self.host}:{self.port}/'
+                                     f'{endpoints.TASKS_EXCHANGE}/{self.job_id}/{max_tasks}',
+                                     data=encode_tasks(tasks), timeout=5,
+                                     headers={'Accept': TASKS_MIME_TYPE, 'Content-Type': TASKS_MIME_TYPE})
+
+            # master has no available tasks, but the job is not done yet
+            if resp.status_code == 42:
+                return []
+
+            if resp.status_code != 200:
+                logger.log_error(f'Task exchange failed, response_code: {resp.status_code}')
+                return None
+
+            next_tasks: List[Task] = self.decode_tasks_resp(resp.content)
+            logger.log_info('Completed tasks sent back to master successfully')
+            return next_tasks
+
+        except WireFormatError as error:
+            logger.log_error(f'Unable to encode or decode tasks\n{error.with_traceback(error.__traceback__)}')
+            return None
+        except (PicklingError, UnpicklingError) as error:
+            logger.log_error(f'Unable to (un)pickle tasks\n{error.with_traceback(error.__traceback__)}')
+            return None
+        except CompressionException as error:
+            logger.log_error(f'Unable to (de)compress tasks\n{error.with_traceback(error.__traceback__)}')
+            return None
+        except Exception as error:
+            logger.log_warn(f'Task exchange failed\n{error.with_traceback(error.__traceback__)}')
+            return None
+
+    def renew_leases(self, task_ids: List[int]):
+        """
+        Renews the master's leases on long running tasks held by this slave
+        Returns the number of leases the master renewed
+
+        :param task_ids:
+        :return Integer:
+        """
+        try:
+            resp = self.session.post(f'http://{self.host}:{self.port}/'
+                                     f'{endpoints.RENEW_LEASES}/{self.job_id}',
+                                     json=task_ids, timeout=5)
+            if resp.status_code != 200:
+                logger.log_warn(f'Lease renewal failed, response_code: {resp.status_code}')
+                return 0
+            return resp.json()
+        except Exception as error:
+            logger.log_warn(f'Lease renewal failed\n{error.with_traceback(error.__traceback__)}')
+            return 0
+
+    def start_lease_renewal(self):
+        """
+        Starts renewing the leases of the running tasks every lease_renewal_secs in a daemon thread,
+        so the master does not hand a task that outlives its lease to another slave
+
+        :return:
+        """
+        if self.lease_renewer is not None:
+            return
+        # a new event, so a renewer stopped earlier cannot be revived by it
+        self.lease_renewer_stop = Event()
+        self.lease_renewer = Thread(name='hyperslave_lease_renewer', target=self.renew_running_leases,
+                                    args=(self.lease_renewer_stop,))
+        self.lease_renewer.daemon = True
+        self.lease_renewer.start()
+
+    def renew_running_leases(self, stopped: Event):
+        """
+        Lease renewal loop. Renews the leases of the running tasks until stopped is set
+
+        :param stopped:
+        :return:
+        """
+        while not stopped.wait(self.lease_renewal_secs):
+            self.renew_or_kill_running_tasks()
+
+    def renew_or_kill_running_tasks(self):
+        """
+        Renews the leases of the running tasks, and kills the subprocesses of those running for longer
+        than max_task_secs instead. A killed task fails, so it is handed back to the master
+
+        :return:
+        """
+        started_before = None if self.max_task_secs is None else monotonic() - self.max_task_secs
+        with self.running_task_ids_lock:
+            running = list(self.running_task_ids.items())
+        renewed: List[int] = []
+        for task_id, started_at in running:
+            if started_before is None or started_at > started_before:
+                renewed.append(task_id)
+                continue
+            logger.log_warn(f'Task {task_id} ran for longer than {self.max_task_secs} seconds, killing it')
+            self.processes.kill_task(task_id)
+        if renewed:
+            self.renew_leases(renewed)
+
+    def stop_lease_renewal(self):
+        """
+        Stops renewing leases
+
+        :return:
+        """
+        self.lease_renewer_stop.set()
+        self.lease_renewer = None
+
     def handle_tasks(self, tasks: List[Task]):
         """
         Handle the tasks
@@ -373,14 +970,17 @@ class HyperSlave:
 
             # For each task make a file containing the the task content
             for task in tasks:
-                self.save_processed_data(task.payload_filename, task.payload)
+                job_id = self.task_job_id(task)
+                if not self.prepare_job(job_id):
+                    return False, []
+                self.save_processed_data(task.payload_filename, task.payload, job_id)
                 logger.log_info(f"Creating '{task.payload_filename}' file to use during execution")
 
             failed_tasks = self.execute_tasks(tasks)
 
             for task in tasks:
                 if task not in failed_tasks:
-                    with open(f'{self.job_path}/{self.job_id}/'
+                    with open(f'{self.job_path}/{self.task_job_id(task)}/'
                               f'{task.result_filename}', 'rb') as file:
                         payload = file.read()
                     task_status = TaskMessageType.TASK_PROCESSED
@@ -395,7 +995,7 @@ class HyperSlave:
                                           task.result_filename,
                                           task.payload_filename)
                 handled_task.message_type = task_status
-                handled_task.job_id = self.job_id
+                handled_task.job_id = self.task_job_id(task)
                 handled_tasks.append(handled_task)
             return True, handled_tasks
         except Exception as error:
@@ -405,7 +1005,6 @@ class HyperSlave:
     def execute_tasks(self, tasks):
         """
         Executes the received tasks
-        TODO: make these tasks run using multiprocessing instead of subprocess.run()
 
         :param tasks:
         :return List[Task] or None:
@@ -415,8 +1014,8 @@ class HyperSlave:
             for task in tasks:
                 command: List[str] = [task.program]
                 for file in task.arg_file_names:
-                    command.append(f' {self.job_path}/{self.job_id}/{file}')
-                status = run_shell_command(command)
+                    command.append(f' {self.job_path}/{self.task_job_id(task)}/{file}')
+                status = run_shell_command(command, self.processes, task.task_id)
                 if status != 0:
                     failed_tasks.append(task)
                     logger.log_info(f'Task {task.task_id} failed')
@@ -430,16 +1029,16 @@ class HyperSlave:
     def send_tasks(self, tasks: List[Task]):
         """
         Sends (processed) tasks back to the master
+        Results the master cannot be reached for are kept and sent again once the slave reconnects
 
         :param tasks:
         :return Boolean:
         """
         try:
-            pickled_tasks = pickle_dumps(tasks)
-            compressed_data = compress(pickled_tasks)
             response = self.session.post(f'http://{self.host}:{self.port}/'
                                          f'{endpoints.TASKS_DONE}/{self.job_id}',
-                                         data=compressed_data)
+                                         data=encode_tasks(tasks), timeout=5,
+                                         headers={'Content-Type': TASKS_MIME_TYPE})
 
             if response.status_code == 200:
                 logger.log_info('Completed tasks sent back to master successfully')
@@ -448,15 +1047,16 @@ class HyperSlave:
                     'Completed tasks failed to send back to master '
                     f'successfully, response_code: {response.status_code}')
             return True
-        except PicklingError as error:
-            logger.log_error(f'Unable to pickle tasks\n{error.with_traceback(error.__traceback__)}')
-            return False
-        except CompressionException as error:
-            logger.log_error(f'Unable to compress pickled tasks\n{error.with_traceback(error.__traceback__)}')
+        except WireFormatError as error:
+            logger.log_error(f'Unable to encode tasks\n{error.with_traceback(error.__traceback__)}')
             return False
         except FileNotFoundError as error:
             logger.log_error(f'Send_tasks file not found\n{error.with_traceback(error.__traceback__)}')
             return False
+        except RequestExceptions.RequestException as error:
+            logger.log_error(f'Unable to reach the master to send tasks\n{error}')
+            self.keep_unsent_results(tasks)
+            return False
         except Exception as error:
             logger.log_error(f'Send_tasks broad exception\n{error.with_traceback(error.__traceback__)}')
             return False
@@ -470,9 +1070,8 @@ if __name__ == "__main__":
     while True:
         try:
             if not client.running and not client.job_done:
-                del client
-                client: HyperSlave = HyperSlave(MASTER_PORT)
-                client.start()
+                # the same slave reconnects, so the master can resume its session
+                client.reconnect()
             if client.job_done:
                 break
         except KeyboardInterrupt:
@@ -0,0 +1,15 @@
+from common.discovery import PROBE, decode_announcement, encode_announcement
+
+
+class TestDiscovery:
+
+    def test_announcement_round_trip(self):
+        # Act
+        port = decode_announcement(encode_announcement(5678))
+        # Assert
+        assert port == 5678
+
+    def test_decode_not_announcement(self):
+        # Act & Assert
+        assert decode_announcement(PROBE) is None
+        assert decode_announcement(b'HYPERCUBE MASTER port') is None
@@ -0,0 +1,40 @@
+import pickle
+
+import pytest
+
+from common.task import Task, TaskMessageType
+
+
+class TestTask:
+
+    def test_shares_program_and_args(self):
+        # Arrange & Act
+        task1 = Task(1, "./" + "app.sh", ["a.txt", "b.txt"], None, "", "")
+        task2 = Task(2, "./app" + ".sh", ["a.txt", "b.txt"], None, "", "")
+        # Assert
+        assert task1.program is task2.program
+        assert task1.arg_file_names is task2.arg_file_names
+        assert task1.arg_file_names == ("a.txt", "b.txt")
+
+    def test_no_instance_dict(self):
+        # Arrange
+        task = Task(1, "", [], None, "", "")
+        # Act & Assert
+        assert not hasattr(task, '__dict__')
+        with pytest.raises(AttributeError):
+            task.unknown = 1
+
+    def test_pickle_round_trip(self):
+        # Arrange
+        task = Task(1, "app.sh", ["a.txt"], b"data", "r.txt", "p.txt", 2, 3.5)
+        task.set_job(1234)
+        task.set_message_type(TaskMessageType.TASK_PROCESSED)
+        # Act
+        actual: Task = pickle.loads(pickle.dumps(task))
+        # Assert
+        assert actual == task
+        assert actual.payload == b"data"
+        assert actual.arg_file_names == ("a.txt",)
+        assert actual.priority == 2
+        assert actual.estimated_cost == 3.5
+        assert actual.message_type == TaskMessageType.TASK_PROCESSED
@@ -0,0 +1,90 @@
+import pytest
+
+from common.task import Task, TaskMessageType
+from common.wire import HEADER, MAGIC, WireFormatError, decode_tasks, encode_tasks, is_task_batch
+
+
+def make_tasks():
+    tasks = [Task(1, 'python3', ['a.py', 'b.txt'], b'payload', 'result_1.txt', 'payload_1.txt'),
+             Task(2, 'python3', ['a.py', 'b.txt'], None, 'result_2.txt', 'payload_2.txt', 3, 1.5),
+             Task(3, 'sh', [], 'text payload', 'result_3.txt', 'payload_3.txt')]
+    for task in tasks:
+        task.set_job(1234)
+    tasks[1].set_message_type(TaskMessageType.TASK_PROCESSED)
+    return tasks
+
+
+class TestWire:
+
+    def test_round_trip(self):
+        # Arrange
+        tasks = make_tasks()
+        # Act
+        decoded = decode_tasks(encode_tasks(tasks))
+        # Assert
+        assert decoded == tasks
+        for expected, actual in zip(tasks, decoded):
+            assert actual.program == expected.program
+            assert actual.arg_file_names == expected.arg_file_names
+            assert actual.payload == expected.payload
+            assert actual.result_filename == expected.result_filename
+            assert actual.payload_filename == expected.payload_filename
+            assert actual.priority == expected.priority
+            assert actual.estimated_cost == expected.estimated_cost
+            assert actual.message_type == expected.message_type
+        assert isinstance(decoded[0].payload, bytes)
+
+    def test_shared_program_and_args_stored_once(self):
+        # Arrange
+        tasks = make_tasks()
+        # Act
+        data = encode_tasks(tasks)
+        # Assert
+        _, _, _, shared_count, task_count = HEADER.unpack_from(data, 0)
+        assert shared_count == 2
+        assert task_count == 3
+        assert data.count(b'a.py') == 1
+
+    def test_zero_copy_payload(self):
+        # Arrange
+        data = encode_tasks(make_tasks())
+        # Act
+        decoded = decode_tasks(data, zero_copy=True)
+        # Assert
+        assert isinstance(decoded[0].payload, memoryview)
+        assert decoded[0].payload.obj is data
+        assert bytes(decoded[0].payload) == b'payload'
+
+    def test_no_job_id(self):
+        # Arrange
+        task = Task(1, '', [''], None, '', '')
+        # Act
+        decoded = decode_tasks(encode_tasks([task]))
+        # Assert
+        assert not hasattr(decoded[0], 'job_id')
+
+    def test_is_task_batch(self):
+        assert is_task_batch(encode_tasks([]))
+        assert not is_task_batch(b'x\x9c')
+
+    def test_unsupported_payload_error(self):
+        # Arrange
+        task = Task(1, '', [''], 42, '', '')
+        # Act & Assert
+        with pytest.raises(WireFormatError):
+            encode_tasks([task])
+
+    def test_unsupported_version_error(self):
+        # Arrange
+        data = bytearray(encode_tasks(make_tasks()))
+        data[len(MAGIC)] = 99
+        # Act & Assert
+        with pytest.raises(WireFormatError):
+            decode_tasks(data)
+
+    def test_truncated_error(self):
+        # Arrange
+        data = encode_tasks(make_tasks())
+        # Act & Assert
+        with pytest.raises(WireFormatError):
+            decode_tasks(data[:-3])
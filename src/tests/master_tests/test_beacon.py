@@ -0,0 +1,54 @@
+from socket import AF_INET, SOCK_DGRAM, socket
+
+from common.discovery import PROBE, decode_announcement
+from master.beacon import DiscoveryBeacon
+from slave.discovery import discover_master
+
+
+def free_udp_port() -> int:
+    with socket(AF_INET, SOCK_DGRAM) as sock:
+        sock.bind(('', 0))
+        return sock.getsockname()[1]
+
+
+class TestDiscoveryBeacon:
+    beacon: DiscoveryBeacon
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.discovery_port = free_udp_port()
+        self.beacon = DiscoveryBeacon(5678, self.discovery_port, interval_secs=10.0)
+        self.beacon.start()
+
+    def teardown_method(self, method):
+        """
+        After Each
+        """
+        self.beacon.stop()
+
+    def test_answers_probe(self):
+        # Arrange
+        with socket(AF_INET, SOCK_DGRAM) as sock:
+            sock.settimeout(1.0)
+            # Act
+            sock.sendto(PROBE, ('127.0.0.1', self.discovery_port))
+            data, _ = sock.recvfrom(1024)
+        # Assert
+        assert decode_announcement(data) == 5678
+
+    def test_slave_discovers_master(self):
+        # Act
+        address = discover_master(timeout_secs=1.0, discovery_port=self.discovery_port)
+        # Assert
+        assert address is not None
+        assert address[1] == 5678
+
+    def test_no_master(self):
+        # Arrange
+        self.beacon.stop()
+        # Act
+        address = discover_master(timeout_secs=0.1, discovery_port=self.discovery_port)
+        # Assert
+        assert address is None
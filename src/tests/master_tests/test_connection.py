@@ -10,13 +10,11 @@ class TestConnection:
         Before Each
         """
         self.connection = Connection('test_id')
-        self.connection.timer.cancel()
 
     def teardown_method(self, method):
         """
         After Each
         """
-        self.connection.timer.cancel()
 
     def test_timeout(self):
         # Act
@@ -29,10 +27,13 @@ class TestConnection:
         assert (self.connection.is_alive())
 
     def test_reset_timer(self):
+        # Arrange
+        self.connection.detector.last_heartbeat -= 10
+        deadline = self.connection.deadline()
         # Act
         self.connection.reset_timer()
         # Assert
-        assert (self.connection.timer.is_alive())
+        assert self.connection.deadline() > deadline
 
     def test_reset_timer_exception(self):
         # Act
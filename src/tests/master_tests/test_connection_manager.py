@@ -1,7 +1,16 @@
+from threading import active_count
+from time import sleep
+
 import pytest
 from master.connection_manager import Connection, ConnectionDead, ConnectionManager
+from master.failure_detector import FailureDetector
 from master.task_manager import TaskManager
 from master.status_manager import StatusManager
+from common.task import Task
+
+
+def fast_detector() -> FailureDetector:
+    return FailureDetector(threshold=3.0, expected_interval_secs=0.02, acceptable_pause_secs=0.02, min_std_secs=0.01)
 
 
 class TestConnectionManager:
@@ -13,15 +22,12 @@ class TestConnectionManager:
         """
         status_manager = StatusManager()
         self.connection_manager = ConnectionManager(TaskManager(status_manager), status_manager)
-        self.connection_manager.connections_cleanup_timer.cancel()
-        self.connection_manager.running = False
 
     def teardown_method(self, method):
         """
         After Each
         """
-        self.connection_manager.connections_cleanup_timer.cancel()
-        self.connection_manager.running = False
+        self.connection_manager.stop()
 
     def test_add_get_connection(self):
         # Arrange
@@ -29,11 +35,19 @@ class TestConnectionManager:
         self.connection_manager.add_connection('test_id')
         # Act
         connection = self.connection_manager.get_connection('test_id')
-        connection.timer.cancel()
         # Assert
         assert (isinstance(connection, Connection))
         assert self.connection_manager.status_manager.status.num_slaves == original_status + 1
 
+    def test_add_connection_again(self):
+        # Arrange
+        original_status = self.connection_manager.status_manager.status.num_slaves
+        self.connection_manager.add_connection('test_id')
+        # Act
+        self.connection_manager.add_connection('test_id')
+        # Assert
+        assert self.connection_manager.status_manager.status.num_slaves == original_status + 1
+
     def test_get_connection_exception_no_connection(self):
         with pytest.raises(ConnectionDead):
             # Act and Assert
@@ -43,7 +57,6 @@ class TestConnectionManager:
         # Arrange
         self.connection_manager.add_connection('dead_conn')
         connection: Connection = self.connection_manager.get_connection('dead_conn')
-        connection.timer.cancel()
         # Act
         connection.timeout()
         with pytest.raises(ConnectionDead):
@@ -54,30 +67,49 @@ class TestConnectionManager:
         # Arrange
         self.connection_manager.add_connection('test_id')
         connection: Connection = self.connection_manager.get_connection('test_id')
-        connection.timer.cancel()
+        connection.detector.last_heartbeat -= 10
+        deadline = connection.deadline()
         # Act
         self.connection_manager.reset_connection_timer('test_id')
         # Assert
-        assert (connection.timer.is_alive())
-        connection.timer.cancel()
+        assert connection.deadline() > deadline
 
-    def test_reset_cleanup_connections_timer(self):
+    def test_heartbeats_start_no_threads(self):
         # Arrange
-        self.connection_manager.running = True
-        self.connection_manager.connections_cleanup_timer.cancel()
+        for i in range(10):
+            self.connection_manager.add_connection(f'test_conn_{i}')
+        num_threads = active_count()
         # Act
-        self.connection_manager.cleanup_connections()
+        for _ in range(10):
+            for i in range(10):
+                self.connection_manager.reset_connection_timer(f'test_conn_{i}')
         # Assert
-        assert (self.connection_manager.connections_cleanup_timer.is_alive())
+        assert active_count() == num_threads
+
+    def test_reaper_removes_timed_out_connection(self):
+        # Arrange
+        task_manager: TaskManager = self.connection_manager.task_manager
+        task_manager.add_new_available_task(Task(1, "", [""], None, "", ""), 1234)
+        task_manager.connect_available_task('test_conn_1')
+        original_status = self.connection_manager.status_manager.status.num_slaves
+        self.connection_manager.add_connection('test_conn_1', fast_detector())
+        self.connection_manager.add_connection('test_conn_2', fast_detector())
+        # Act
+        for _ in range(10):
+            sleep(0.02)
+            self.connection_manager.reset_connection_timer('test_conn_2')
+        # Assert
+        with pytest.raises(ConnectionDead):
+            assert (self.connection_manager.get_connection('test_conn_1'))
+        assert (self.connection_manager.get_connection('test_conn_2'))
+        assert task_manager.available_tasks.qsize() == 1
+        assert self.connection_manager.status_manager.status.num_slaves == original_status + 1
 
     def test_cleanup_connections(self):
         # Arrange
         self.connection_manager.add_connection('test_conn_1')
         conn_1 = self.connection_manager.get_connection('test_conn_1')
         self.connection_manager.add_connection('test_conn_2')
-        conn_2 = self.connection_manager.get_connection('test_conn_2')
-        conn_1.timer.cancel()
-        conn_2.timer.cancel()
         original_status = self.connection_manager.status_manager.status.num_slaves
         # Act
         conn_1.timeout()
@@ -87,3 +119,91 @@ class TestConnectionManager:
             assert (self.connection_manager.get_connection('test_conn_1'))
         assert (self.connection_manager.get_connection('test_conn_2'))
         assert self.connection_manager.status_manager.status.num_slaves == original_status - 1
+
+    def test_suspicion(self):
+        # Arrange
+        self.connection_manager.add_connection('test_id')
+        connection: Connection = self.connection_manager.get_connection('test_id')
+        suspicion = self.connection_manager.suspicion('test_id')
+        # Act
+        connection.detector.last_heartbeat -= 5
+        # Assert
+        assert self.connection_manager.suspicion('test_id') > suspicion
+
+    def test_steadier_heartbeat_brings_deadline_forward(self):
+        # Arrange
+        self.connection_manager.add_connection('test_id', FailureDetector(expected_interval_secs=10.0))
+        connection: Connection = self.connection_manager.get_connection('test_id')
+        scheduled = connection.scheduled
+        # Act
+        for _ in range(50):
+            self.connection_manager.reset_connection_timer('test_id')
+        # Assert
+        assert connection.scheduled < scheduled
+        assert connection.scheduled == connection.deadline()
+
+    def test_reaper_suspends_then_removes_connection(self):
+        # Arrange
+        self.connection_manager.grace_secs = 0.5
+        self.connection_manager.add_connection('test_conn_1', fast_detector())
+        # Act & Assert
+        sleep(0.2)
+        assert self.connection_manager.connections['test_conn_1'].is_suspended()
+        sleep(0.5)
+        assert 'test_conn_1' not in self.connection_manager.connections
+
+    def test_heartbeat_resumes_suspended_connection(self):
+        # Arrange
+        task_manager: TaskManager = self.connection_manager.task_manager
+        task_manager.add_new_available_task(Task(1, "", [""], None, "", ""), 1234)
+        task_manager.connect_available_task('test_conn_1')
+        self.connection_manager.add_connection('test_conn_1', fast_detector())
+        original_status = self.connection_manager.status_manager.status.num_slaves
+        sleep(0.2)
+        # Act
+        self.connection_manager.reset_connection_timer('test_conn_1')
+        # Assert
+        assert self.connection_manager.get_connection('test_conn_1').is_alive()
+        assert task_manager.available_tasks.qsize() == 0
+        assert task_manager.in_progress[1].connection_id == 'test_conn_1'
+        assert self.connection_manager.status_manager.status.num_slaves == original_status
+
+    def test_add_connection_resumes_suspended_connection(self):
+        # Arrange
+        task_manager: TaskManager = self.connection_manager.task_manager
+        task_manager.add_new_available_task(Task(1, "", [""], None, "", ""), 1234)
+        task_manager.connect_available_task('test_conn_1')
+        self.connection_manager.add_connection('test_conn_1', fast_detector())
+        sleep(0.2)
+        # Act
+        self.connection_manager.add_connection('test_conn_1')
+        # Assert
+        assert self.connection_manager.get_connection('test_conn_1').is_alive()
+        assert task_manager.available_tasks.qsize() == 0
+
+    def test_remove_connection(self):
+        # Arrange
+        task_manager: TaskManager = self.connection_manager.task_manager
+        task_manager.add_new_available_task(Task(1, "", [""], None, "", ""), 1234)
+        task_manager.connect_available_task('test_conn_1')
+        self.connection_manager.add_connection('test_conn_1')
+        original_status = self.connection_manager.status_manager.status.num_slaves
+        # Act
+        self.connection_manager.remove_connection('test_conn_1')
+        # Assert
+        with pytest.raises(ConnectionDead):
+            assert self.connection_manager.get_connection('test_conn_1')
+        assert task_manager.available_tasks.qsize() == 1
+        assert self.connection_manager.status_manager.status.num_slaves == original_status - 1
+
+    def test_remove_unknown_connection(self):
+        # Arrange
+        task_manager: TaskManager = self.connection_manager.task_manager
+        task_manager.add_new_available_task(Task(1, "", [""], None, "", ""), 1234)
+        task_manager.connect_available_task('test_conn_1')
+        original_status = self.connection_manager.status_manager.status.num_slaves
+        # Act
+        self.connection_manager.remove_connection('test_conn_1')
+        # Assert
+        assert task_manager.available_tasks.qsize() == 1
+        assert self.connection_manager.status_manager.status.num_slaves == original_status
@@ -0,0 +1,71 @@
+import pytest
+
+from master.failure_detector import FailureDetector
+
+
+def beat(detector: FailureDetector, intervals):
+    now = detector.last_heartbeat
+    for interval in intervals:
+        now += interval
+        detector.heartbeat(now)
+    return now
+
+
+class TestFailureDetector:
+    detector: FailureDetector
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.detector = FailureDetector(threshold=8.0, expected_interval_secs=2.0, acceptable_pause_secs=3.0)
+
+    def test_learns_mean_interval(self):
+        # Act
+        beat(self.detector, [1.0] * 98)
+        # Assert
+        assert self.detector.mean() == pytest.approx(1.0, abs=0.05)
+
+    def test_phi_grows_with_silence(self):
+        # Arrange
+        now = beat(self.detector, [2.0] * 20)
+        # Act
+        phis = [self.detector.phi(now + silence) for silence in (1.0, 4.0, 5.0, 6.0)]
+        # Assert
+        assert phis == sorted(phis)
+        assert phis[0] < 1.0
+
+    def test_deadline_is_when_phi_reaches_threshold(self):
+        # Arrange
+        beat(self.detector, [2.0, 2.5, 1.5, 2.2] * 5)
+        # Act
+        deadline = self.detector.deadline()
+        # Assert
+        assert self.detector.phi(deadline) == pytest.approx(self.detector.threshold, rel=1e-3)
+        assert not self.detector.is_suspected(deadline - 0.1)
+        assert self.detector.is_suspected(deadline + 0.1)
+
+    def test_steady_heartbeat_is_suspected_sooner_than_jittery_heartbeat(self):
+        # Arrange
+        jittery = FailureDetector(threshold=8.0, expected_interval_secs=2.0, acceptable_pause_secs=3.0)
+        steady_last = beat(self.detector, [2.0] * 100)
+        jittery_last = beat(jittery, [0.5, 3.5] * 50)
+        # Act
+        steady_timeout = self.detector.deadline() - steady_last
+        jittery_timeout = jittery.deadline() - jittery_last
+        # Assert
+        assert steady_timeout < 7.5 < jittery_timeout
+
+    def test_old_intervals_are_forgotten(self):
+        # Arrange
+        detector = FailureDetector(max_samples=10)
+        beat(detector, [5.0] * 10)
+        # Act
+        beat(detector, [1.0] * 10)
+        # Assert
+        assert detector.mean() == pytest.approx(1.0)
+
+    def test_threshold_must_be_positive(self):
+        # Act & Assert
+        with pytest.raises(ValueError):
+            FailureDetector(threshold=0)
@@ -0,0 +1,117 @@
+from collections import Counter
+
+import pytest
+
+from master.fair_share import FairShare
+
+
+def dispatch(fair_share: FairShare, num_tasks: int, ready=lambda job_id: True, cost: float = 1.0) -> Counter:
+    counts: Counter = Counter()
+    for _ in range(num_tasks):
+        job_id = fair_share.select(ready)
+        fair_share.charge(job_id, cost)
+        counts[job_id] += 1
+    return counts
+
+
+class TestFairShare:
+    fair_share: FairShare
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.fair_share = FairShare()
+
+    def test_shares_follow_weights(self):
+        # Arrange
+        self.fair_share.add_job(1, weight=1)
+        self.fair_share.add_job(2, weight=3)
+        # Act
+        counts = dispatch(self.fair_share, 400)
+        # Assert
+        assert counts[1] == 100
+        assert counts[2] == 300
+
+    def test_costly_tasks_use_up_credit(self):
+        # Arrange
+        self.fair_share.add_job(1)
+        self.fair_share.add_job(2)
+        costs = {1: 4.0, 2: 1.0}
+        counts: Counter = Counter()
+        # Act
+        for _ in range(500):
+            job_id = self.fair_share.select(lambda ready_job_id: True)
+            self.fair_share.charge(job_id, costs[job_id])
+            counts[job_id] += costs[job_id]
+        # Assert
+        assert abs(counts[1] - counts[2]) <= 4.0
+
+    def test_idle_job_is_skipped(self):
+        # Arrange
+        self.fair_share.add_job(1)
+        self.fair_share.add_job(2)
+        # Act
+        counts = dispatch(self.fair_share, 10, ready=lambda job_id: job_id == 2)
+        # Assert
+        assert counts == Counter({2: 10})
+
+    def test_no_job_ready(self):
+        # Arrange
+        self.fair_share.add_job(1)
+        # Act & Assert
+        assert self.fair_share.select(lambda job_id: False) is None
+
+    def test_interactive_preempts_batch(self):
+        # Arrange
+        self.fair_share.add_job(1, weight=10)
+        dispatch(self.fair_share, 5)
+        self.fair_share.add_job(2, interactive=True)
+        # Act
+        counts = dispatch(self.fair_share, 10)
+        # Assert
+        assert counts == Counter({2: 10})
+
+    def test_remove_job(self):
+        # Arrange
+        self.fair_share.add_job(1)
+        self.fair_share.add_job(2)
+        # Act
+        self.fair_share.remove_job(1)
+        # Assert
+        assert 1 not in self.fair_share
+        assert dispatch(self.fair_share, 3) == Counter({2: 3})
+
+    def test_weight_must_be_positive(self):
+        # Act & Assert
+        with pytest.raises(ValueError):
+            self.fair_share.add_job(1, weight=0)
+
+    def test_costly_task_selected_without_spinning(self):
+        # Arrange
+        self.fair_share.add_job(1)
+        self.fair_share.add_job(2, weight=2)
+        self.fair_share.charge(1, 1e9)
+        self.fair_share.charge(2, 1e9)
+        calls: Counter = Counter()
+
+        def ready(job_id: int) -> bool:
+            calls[job_id] += 1
+            return True
+        # Act
+        actual = self.fair_share.select(ready)
+        # Assert
+        assert actual == 2
+        assert sum(calls.values()) <= 6
+        assert 0 < self.fair_share.shares[2].deficit <= 2
+
+    def test_idle_job_keeps_its_debt(self):
+        # Arrange
+        self.fair_share.add_job(1)
+        self.fair_share.add_job(2)
+        self.fair_share.charge(self.fair_share.select(lambda job_id: True), 5.0)
+        # Act
+        dispatch(self.fair_share, 3, ready=lambda job_id: job_id == 2)
+        counts = dispatch(self.fair_share, 4)
+        # Assert
+        assert counts == Counter({2: 4})
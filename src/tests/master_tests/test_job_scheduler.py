@@ -0,0 +1,100 @@
+import pytest
+
+from common.task import Task, TaskMessageType
+from master.job_scheduler import JobScheduler
+from master.status_manager import StatusManager
+from master.task_manager import TaskManager, NoMoreTasks
+
+
+def make_job(job_id: int, num_tasks: int) -> TaskManager:
+    task_manager = TaskManager(StatusManager())
+    task_manager.add_new_available_tasks([Task(i, "", [""], None, "", "") for i in range(num_tasks)], job_id)
+    return task_manager
+
+
+class TestJobScheduler:
+    scheduler: JobScheduler
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.scheduler = JobScheduler()
+
+    def test_connect_tasks_round_robin(self):
+        # Arrange
+        self.scheduler.add_job(1, make_job(1, 4))
+        self.scheduler.add_job(2, make_job(2, 4))
+        # Act
+        tasks = self.scheduler.connect_available_tasks(4, "conn_1")
+        # Assert
+        assert sorted(task.job_id for task in tasks) == [1, 1, 2, 2]
+
+    def test_connect_tasks_from_remaining_job(self):
+        # Arrange
+        self.scheduler.add_job(1, make_job(1, 1))
+        self.scheduler.add_job(2, make_job(2, 4))
+        # Act
+        tasks = self.scheduler.connect_available_tasks(4, "conn_1")
+        # Assert
+        assert sorted(task.job_id for task in tasks) == [1, 2, 2, 2]
+
+    def test_no_more_tasks(self):
+        # Arrange
+        task_manager = make_job(1, 1)
+        self.scheduler.add_job(1, task_manager)
+        task = self.scheduler.connect_available_tasks(1, "conn_1")[0]
+        task.set_message_type(TaskMessageType.TASK_PROCESSED)
+        task_manager.task_finished(task)
+        # Act & Assert
+        with pytest.raises(NoMoreTasks):
+            self.scheduler.connect_available_tasks(1, "conn_1")
+
+    def test_long_lived_waits_for_jobs(self):
+        # Arrange
+        self.scheduler.long_lived = True
+        # Act
+        tasks = self.scheduler.connect_available_tasks(1, "conn_1", wait_secs=0.1)
+        # Assert
+        assert tasks == []
+
+    def test_connection_dropped_requeues_every_job(self):
+        # Arrange
+        job_1, job_2 = make_job(1, 1), make_job(2, 1)
+        self.scheduler.add_job(1, job_1)
+        self.scheduler.add_job(2, job_2)
+        self.scheduler.connect_available_tasks(2, "conn_1")
+        # Act
+        self.scheduler.connection_dropped("conn_1")
+        # Assert
+        assert job_1.available_tasks.qsize() == 1
+        assert job_2.available_tasks.qsize() == 1
+
+    def test_remove_job(self):
+        # Arrange
+        task_manager = make_job(1, 1)
+        self.scheduler.add_job(1, task_manager)
+        # Act
+        removed = self.scheduler.remove_job(1)
+        # Assert
+        assert removed is task_manager
+        assert 1 not in self.scheduler
+        assert self.scheduler.remove_job(1) is None
+
+    def test_connect_tasks_by_weight(self):
+        # Arrange
+        self.scheduler.add_job(1, make_job(1, 10), weight=1)
+        self.scheduler.add_job(2, make_job(2, 10), weight=3)
+        # Act
+        tasks = self.scheduler.connect_available_tasks(8, "conn_1")
+        # Assert
+        assert sorted(task.job_id for task in tasks) == [1, 1, 2, 2, 2, 2, 2, 2]
+
+    def test_interactive_job_goes_first(self):
+        # Arrange
+        self.scheduler.add_job(1, make_job(1, 10))
+        self.scheduler.add_job(2, make_job(2, 2), interactive=True)
+        # Act
+        tasks = self.scheduler.connect_available_tasks(3, "conn_1")
+        # Assert
+        assert [task.job_id for task in tasks] == [2, 2, 1]
@@ -0,0 +1,152 @@
+from time import sleep
+
+from common.task import Task
+from master.journal import Journal, job_identity
+
+
+def make_task(task_id: int) -> Task:
+    task = Task(task_id, "app.sh", ["a.txt"], b'payload', "", "")
+    task.set_job(1234)
+    return task
+
+
+class TestJournal:
+
+    def test_replay(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path)
+        journal.job_started(1234)
+        for i in range(4):
+            journal.task_loaded(make_task(i))
+        journal.task_dispatched(0, 'conn_1')
+        journal.task_dispatched(1, 'conn_1')
+        journal.task_dispatched(2, 'conn_2')
+        journal.task_finished(0)
+        journal.task_requeued(1)
+        journal.close()
+        # Act
+        actual = Journal(path).state
+        # Assert
+        assert actual.job_id == 1234
+        assert actual.finished == {0}
+        assert list(actual.tasks) == [1, 2, 3]
+        assert actual.tasks[3].payload == b'payload'
+        assert actual.dispatched == {2: 'conn_2'}
+
+    def test_duplicate_load_ignored(self, tmp_path):
+        # Arrange
+        journal = Journal(str(tmp_path / 'journal'))
+        journal.task_loaded(make_task(1))
+        journal.task_finished(1)
+        # Act
+        journal.task_loaded(make_task(1))
+        # Assert
+        assert journal.is_known(1)
+        assert not journal.state.tasks
+        journal.close()
+
+    def test_group_commit(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path, flush_secs=0.01)
+        # Act
+        journal.job_started(1234)
+        journal.task_loaded(make_task(1))
+        sleep(0.2)
+        # Assert
+        assert not journal.pending
+        assert Journal(path).state.tasks.keys() == {1}
+        journal.close()
+
+    def test_truncated_record(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path)
+        journal.job_started(1234)
+        journal.task_loaded(make_task(1))
+        journal.close()
+        with open(path, 'ab') as file:
+            file.write(b'\x04\x02\x00')
+        # Act
+        journal = Journal(path)
+        journal.task_finished(1)
+        journal.close()
+        # Assert
+        actual = Journal(path).state
+        assert actual.finished == {1}
+        assert not actual.tasks
+
+    def test_compact(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path)
+        journal.job_started(1234)
+        for i in range(100):
+            journal.task_loaded(make_task(i))
+            journal.task_dispatched(i, 'conn_1')
+        for i in range(98):
+            journal.task_finished(i)
+        journal.flush()
+        size_before = (tmp_path / 'journal').stat().st_size
+        # Act
+        journal.compact()
+        journal.task_finished(98)
+        journal.close()
+        # Assert
+        assert (tmp_path / 'journal').stat().st_size < size_before
+        actual = Journal(path).state
+        assert actual.job_id == 1234
+        assert len(actual.finished) == 99
+        assert list(actual.tasks) == [99]
+        assert actual.dispatched == {99: 'conn_1'}
+
+    def test_job_finished_truncates(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path)
+        journal.job_started(1234, job_identity('job', ['a.txt']))
+        journal.task_loaded(make_task(1))
+        journal.task_finished(1)
+        # Act
+        journal.job_finished()
+        journal.close()
+        # Assert
+        assert (tmp_path / 'journal').stat().st_size == 0
+        assert Journal(path).state.job_id is None
+
+    def test_job_finished_record_replayed(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path, flush_secs=60)
+        journal.job_started(1234)
+        journal.task_loaded(make_task(1))
+        journal.task_finished(1)
+        journal.flush()
+        # Act
+        # a crash between the completion record and the truncation leaves both in the file
+        journal.job_finished()
+        journal.truncate_after = None
+        journal.close()
+        # Assert
+        actual = Journal(path).state
+        assert actual.job_id is None
+        assert not actual.finished
+
+    def test_reset(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'journal')
+        journal = Journal(path)
+        journal.job_started(1234, job_identity('job', ['a.txt']))
+        journal.task_loaded(make_task(1))
+        journal.close()
+        journal = Journal(path)
+        # Act
+        journal.reset()
+        journal.job_started(5678, job_identity('other', ['b.txt']))
+        journal.close()
+        # Assert
+        actual = Journal(path).state
+        assert actual.job_id == 5678
+        assert actual.job_identity == job_identity('other', ['b.txt'])
+        assert not actual.tasks
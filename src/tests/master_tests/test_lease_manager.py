@@ -0,0 +1,61 @@
+from threading import Event
+from time import monotonic
+
+from master.lease_manager import LeaseManager
+
+
+class TestLeaseManager:
+    lease_manager: LeaseManager
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.expired = []
+        self.expired_event = Event()
+        self.lease_manager = LeaseManager(self.on_lease_expired)
+
+    def teardown_method(self, method):
+        """
+        After Each
+        """
+        self.lease_manager.stop()
+
+    def on_lease_expired(self, task_id: int, expiry: float):
+        self.expired.append((task_id, expiry))
+        self.expired_event.set()
+
+    def test_no_thread_until_first_lease(self):
+        # Assert
+        assert self.lease_manager.thread is None
+
+    def test_lease_expires(self):
+        # Arrange
+        expiry = monotonic() + 0.01
+        # Act
+        self.lease_manager.add_lease(1, expiry)
+        # Assert
+        assert self.expired_event.wait(1)
+        assert self.expired == [(1, expiry)]
+        assert len(self.lease_manager.leases) == 0
+
+    def test_earliest_lease_expires_first(self):
+        # Arrange
+        now = monotonic()
+        # Act
+        self.lease_manager.add_lease(1, now + 60)
+        self.lease_manager.add_lease(2, now + 0.01)
+        # Assert
+        assert self.expired_event.wait(1)
+        assert self.expired == [(2, now + 0.01)]
+        assert self.lease_manager.leases == [(now + 60, 1)]
+
+    def test_stop(self):
+        # Arrange
+        self.lease_manager.add_lease(1, monotonic() + 60)
+        # Act
+        self.lease_manager.stop()
+        self.lease_manager.thread.join(1)
+        # Assert
+        assert not self.lease_manager.thread.is_alive()
+        assert self.expired == []
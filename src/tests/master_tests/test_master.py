@@ -1,3 +1,4 @@
+from threading import Event, Thread
 from unittest.mock import patch, mock_open, MagicMock
 
 import pytest
@@ -6,8 +7,9 @@ from common.task import TaskMessageType
 from master.master import HyperMaster, ConnectionManager, Path, \
     TaskManager, JobInfo, create_app, compress, decompress, Response, \
     CompressionException, pickle_dumps, pickle_loads, PicklingError, UnpicklingError, \
-    JobNotInitialized, Task, List, endpoints
+    JobNotInitialized, ServerConfig, Task, List, endpoints
 from master.status_manager import Status
+from common.wire import MIME_TYPE as TASKS_MIME_TYPE, decode_tasks, encode_tasks
 
 
 class TestMaster:
@@ -76,6 +78,433 @@ class TestMaster:
         assert returned_tasks == completed_tasks
 
     # API Testing
+    def test_iter_completed(self):
+        # Arrange
+        self.master.job.job_id = 1234
+        tasks: List[Task] = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.master.load_tasks(tasks)
+        self.master.task_manager.connect_available_tasks(2, "conn_1")
+        for task in tasks:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.tasks_finished(tasks, "conn_1")
+        # Act
+        actual: List[Task] = list(self.master.iter_completed())
+        # Assert
+        assert sorted(task.task_id for task in actual) == [1, 2]
+
+    def test_on_task_completed(self):
+        # Arrange
+        completed = []
+        self.master.job.job_id = 1234
+        tasks: List[Task] = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.master.load_tasks(tasks)
+        self.master.task_manager.connect_available_tasks(2, "conn_1")
+        for task in tasks:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.on_task_completed(completed.append, max_workers=2)
+        # Act
+        self.master.task_manager.tasks_finished(tasks, "conn_1")
+        self.master.wait_for_callbacks()
+        # Assert
+        assert sorted(task.task_id for task in completed) == [1, 2]
+        assert self.master.get_completed_tasks() == []
+        assert self.master.callback_executor is None
+
+    def test_on_task_completed_callback_error(self):
+        # Arrange
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], None, "", "")
+        self.master.load_tasks([task])
+        self.master.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.on_task_completed(MagicMock(side_effect=ValueError))
+        # Act
+        self.master.task_manager.task_finished(task, "conn_1")
+        self.master.wait_for_callbacks()
+        # Assert
+        assert self.master.is_job_done()
+
+    def test_on_task_completed_after_callbacks_stopped(self):
+        # Arrange
+        completed = []
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], None, "", "")
+        self.master.load_tasks([task])
+        self.master.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.on_task_completed(completed.append)
+        self.master.wait_for_callbacks()
+        # Act
+        self.master.task_manager.task_finished(task, "conn_1")
+        # Assert
+        assert completed == [task]
+
+    def test_on_task_completed_backpressure(self):
+        # Arrange
+        release = Event()
+        completed = []
+        self.master.job.job_id = 1234
+        tasks: List[Task] = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.master.load_tasks(tasks)
+        self.master.task_manager.connect_available_tasks(2, "conn_1")
+        for task in tasks:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.on_task_completed(lambda task: (release.wait(5), completed.append(task)), max_pending=1)
+        self.master.task_manager.task_finished(tasks[0], "conn_1")
+        finisher = Thread(target=self.master.task_manager.task_finished, args=(tasks[1], "conn_1"))
+        # Act
+        finisher.start()
+        finisher.join(0.2)
+        # Assert
+        assert finisher.is_alive()
+        release.set()
+        finisher.join(5)
+        self.master.wait_for_callbacks()
+        assert completed == tasks
+
+    def test_on_task_completed_submitted_jobs(self, tmp_path):
+        # Arrange
+        completed = []
+        job: JobInfo = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = []
+        earlier_job_id = self.master.submit_job(job, [Task(1, "", [""], None, "", "")])
+        self.master.on_task_completed(completed.append)
+        job = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = []
+        later_job_id = self.master.submit_job(job, [Task(2, "", [""], None, "", "")])
+        # Act
+        for job_id in (earlier_job_id, later_job_id):
+            task_manager: TaskManager = self.master.get_task_manager(job_id)
+            task: Task = task_manager.connect_available_task("conn_1")
+            task.message_type = TaskMessageType.TASK_PROCESSED
+            task_manager.task_finished(task, "conn_1")
+        self.master.wait_for_callbacks()
+        # Assert
+        assert sorted(task.task_id for task in completed) == [1, 2]
+        assert self.master.get_completed_tasks(earlier_job_id) == []
+
+    def test_get_result(self, tmp_path):
+        # Arrange
+        self.master = HyperMaster(result_path=str(tmp_path / 'results'))
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], b"result", "", "")
+        self.master.load_tasks([task])
+        self.master.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.task_finished(task, "conn_1")
+        # Act
+        actual: Task = self.master.get_result(1)
+        # Assert
+        assert actual.payload == b"result"
+        assert [t.task_id for t in self.master.iter_completed()] == [1]
+        self.master.result_store.close()
+
+    def test_get_result_without_store(self):
+        # Act & Assert
+        with pytest.raises(KeyError):
+            assert self.master.get_result(1)
+
+    def test_resume_job_from_journal(self, tmp_path):
+        # Arrange
+        journal_path = str(tmp_path / 'journal')
+        self.master = HyperMaster(journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        self.master.init_job(job)
+        job_id = self.master.job.job_id
+        tasks: List[Task] = [Task(i, "", [""], None, "", "") for i in range(3)]
+        self.master.load_tasks(tasks)
+        connected = self.master.task_manager.connect_available_tasks(2, "conn_1")
+        connected[0].message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.task_finished(connected[0], "conn_1")
+        self.master.journal.close()
+        # Act
+        resumed = HyperMaster(journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        resumed.init_job(job)
+        resumed.load_tasks([Task(i, "", [""], None, "", "") for i in range(3)])
+        # Assert
+        assert resumed.job.job_id == job_id
+        assert resumed.status_manager.status.num_tasks_done == 1
+        assert resumed.task_manager.available_tasks.qsize() == 1
+        assert connected[1].task_id in resumed.task_manager.in_progress
+        # a reconnecting slave's result for a restored task is accepted
+        connected[1].message_type = TaskMessageType.TASK_PROCESSED
+        resumed.task_manager.task_finished(connected[1], "conn_1")
+        assert resumed.task_manager.finished_tasks.qsize() == 1
+        resumed.journal.close()
+
+    def test_resume_job_keeps_results(self, tmp_path):
+        # Arrange
+        result_path = str(tmp_path / 'results')
+        journal_path = str(tmp_path / 'journal')
+        self.master = HyperMaster(result_path=result_path, journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        self.master.init_job(job)
+        self.master.load_tasks([Task(i, "", [""], None, "", "") for i in range(4)])
+        connected = self.master.task_manager.connect_available_tasks(2, "conn_1")
+        for task in connected:
+            task.payload = b'result'
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.tasks_finished(connected, "conn_1")
+        self.master.journal.close()
+        self.master.result_store.close()
+        # Act
+        resumed = HyperMaster(result_path=result_path, journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        resumed.init_job(job)
+        # Assert
+        assert resumed.status_manager.status.num_tasks_done == 2
+        assert resumed.get_result(connected[0].task_id).payload == b'result'
+        assert sorted(task.task_id for task in resumed.task_manager.flush_finished_tasks()) == \
+            sorted(task.task_id for task in connected)
+        resumed.journal.close()
+        resumed.result_store.close()
+
+    def test_new_job_discards_results(self, tmp_path):
+        # Arrange
+        result_path = str(tmp_path / 'results')
+        journal_path = str(tmp_path / 'journal')
+        self.master = HyperMaster(result_path=result_path, journal_path=journal_path)
+        self.master.result_store.append(Task(1, "", [""], b'result', "", ""))
+        self.master.journal.close()
+        self.master.result_store.close()
+        # Act
+        restarted = HyperMaster(result_path=result_path, journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        restarted.init_job(job)
+        # Assert
+        assert (tmp_path / 'results').stat().st_size == 0
+        assert not restarted.result_store.has_result(Task(1, "", [""], b'result', "", ""))
+        restarted.journal.close()
+        restarted.result_store.close()
+
+    def test_finished_job_not_resumed(self, tmp_path):
+        # Arrange
+        journal_path = str(tmp_path / 'journal')
+        self.master = HyperMaster(journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        self.master.init_job(job)
+        job_id = self.master.job.job_id
+        self.master.load_tasks([Task(i, "", [""], None, "", "") for i in range(2)])
+        connected = self.master.task_manager.connect_available_tasks(2, "conn_1")
+        for task in connected:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.tasks_finished(connected, "conn_1")
+        self.master.journal.close()
+        # Act
+        restarted = HyperMaster(journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        restarted.init_job(job)
+        restarted.load_tasks([Task(i, "", [""], None, "", "") for i in range(2)])
+        # Assert
+        assert restarted.job.job_id != job_id
+        assert restarted.status_manager.status.num_tasks_done == 0
+        assert restarted.task_manager.available_tasks.qsize() == 2
+        restarted.journal.close()
+
+    def test_different_job_not_resumed(self, tmp_path):
+        # Arrange
+        journal_path = str(tmp_path / 'journal')
+        self.master = HyperMaster(journal_path=journal_path)
+        job = JobInfo()
+        job.file_names = []
+        self.master.init_job(job)
+        job_id = self.master.job.job_id
+        self.master.load_tasks([Task(i, "", [""], None, "", "") for i in range(2)])
+        connected = self.master.task_manager.connect_available_tasks(1, "conn_1")
+        connected[0].message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.task_finished(connected[0], "conn_1")
+        self.master.journal.close()
+        # Act
+        restarted = HyperMaster(journal_path=journal_path)
+        job = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = []
+        restarted.init_job(job)
+        restarted.load_tasks([Task(i, "", [""], None, "", "") for i in range(2)])
+        # Assert
+        assert restarted.job.job_id != job_id
+        assert restarted.status_manager.status.num_tasks_done == 0
+        assert restarted.task_manager.available_tasks.qsize() == 2
+        restarted.journal.close()
+
+    def test_incremental_rerun(self, tmp_path):
+        # Arrange
+        result_path = str(tmp_path / 'results')
+        first = HyperMaster(result_path=result_path, incremental=True)
+        first.job.job_id = 1234
+        first.load_tasks([Task(i, "app.sh", ["a.txt"], bytes([i]), "", "") for i in range(3)])
+        connected = first.task_manager.connect_available_tasks(2, "conn_1")
+        for task in connected:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        first.task_manager.tasks_finished(connected, "conn_1")
+        first.result_store.close()
+        tasks: List[Task] = [Task(i, "app.sh", ["a.txt"], bytes([i]), "", "") for i in range(3)]
+        tasks[1].payload = b'changed'
+        # Act
+        rerun = HyperMaster(result_path=result_path, incremental=True)
+        rerun.job.job_id = 4321
+        rerun.load_tasks(tasks)
+        # Assert
+        assert rerun.status_manager.status.num_tasks_done == 1
+        # the result of the changed task is not one of this run
+        assert [task.task_id for task in rerun.task_manager.flush_finished_tasks()] == [0]
+        assert [rerun.task_manager.available_tasks.get().task_id for _ in range(2)] == [1, 2]
+        rerun.result_store.close()
+
+    def test_incremental_all_done(self, tmp_path):
+        # Arrange
+        result_path = str(tmp_path / 'results')
+        first = HyperMaster(result_path=result_path)
+        first.job.job_id = 1234
+        task: Task = Task(1, "app.sh", [], b"input", "", "")
+        first.load_tasks([task])
+        first.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        first.task_manager.task_finished(task, "conn_1")
+        first.result_store.close()
+        # Act
+        rerun = HyperMaster(result_path=result_path, incremental=True)
+        rerun.job.job_id = 4321
+        rerun.load_tasks([Task(1, "app.sh", [], b"input", "", "")])
+        # Assert
+        assert rerun.is_job_done()
+        assert [t.task_id for t in rerun.iter_completed()] == [1]
+        rerun.result_store.close()
+
+    def test_incremental_without_result_path(self):
+        # Act & Assert
+        with pytest.raises(ValueError):
+            assert HyperMaster(incremental=True)
+
+    def test_result_cache_across_jobs(self):
+        # Arrange
+        self.master = HyperMaster(result_cache_bytes=1024)
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "app.sh", [], b"input", "", "")
+        self.master.load_tasks([task])
+        connected: Task = self.master.task_manager.connect_available_task("conn_1")
+        result: Task = Task(1, "app.sh", [], b"result", "", "")
+        result.set_job(1234)
+        result.message_type = TaskMessageType.TASK_PROCESSED
+        self.master.task_manager.task_finished(result, "conn_1")
+        self.master.get_completed_tasks()
+        # Act
+        self.master.job.job_id = 4321
+        self.master.load_tasks([Task(7, "app.sh", [], b"input", "", "")])
+        # Assert
+        assert connected == task
+        assert self.master.task_manager.available_tasks.empty()
+        cached: List[Task] = self.master.get_completed_tasks()
+        assert len(cached) == 1
+        assert cached[0].task_id == 7
+        assert cached[0].payload == b"result"
+        assert cached[0].message_type == TaskMessageType.TASK_PROCESSED
+        assert 'Cache Hits: 1\nCache Misses: 1\n' in self.master.get_status()
+
+    def test_submit_job(self, tmp_path):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        (tmp_path / 'data.txt').write_bytes(b'data')
+        job: JobInfo = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = ['data.txt']
+        # Act
+        job_id = self.master.submit_job(job, [Task(1, "", [""], None, "", "")])
+        resp1: Response = test_client.get(f'/{endpoints.GET_TASKS}/{job_id}/2',
+                                          headers={'Accept': TASKS_MIME_TYPE})
+        task: Task = decode_tasks(resp1.data)[0]
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        resp2: Response = test_client.post(f'/{endpoints.TASKS_DONE}/{job_id}', data=encode_tasks([task]))
+        # Assert
+        assert resp2.status_code == 200
+        assert task.job_id == job_id
+        assert self.master.is_job_done(job_id)
+        assert not self.master.is_job_done()
+        assert self.master.get_completed_tasks(job_id) == [task]
+
+    def test_submit_job_missing_file(self, tmp_path):
+        # Arrange
+        job: JobInfo = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = ['missing.txt']
+        # Act & Assert
+        with pytest.raises(FileNotFoundError):
+            self.master.submit_job(job, [Task(1, "", [""], None, "", "")])
+
+    def test_concurrent_jobs_share_slaves(self, tmp_path):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        self.master.load_tasks([Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")])
+        job: JobInfo = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = []
+        job_id = self.master.submit_job(job, [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")])
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.GET_TASKS}/1234/2', headers={'Accept': TASKS_MIME_TYPE})
+        # Assert
+        assert sorted(task.job_id for task in decode_tasks(resp.data)) == sorted([1234, job_id])
+
+    def test_remove_job(self, tmp_path):
+        # Arrange
+        test_client = self.get_test_client()
+        job: JobInfo = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = []
+        job_id = self.master.submit_job(job, [Task(1, "", [""], None, "", "")])
+        # Act
+        self.master.remove_job(job_id)
+        # Assert
+        assert test_client.get(f'/{endpoints.JOB}/{job_id}').status_code == 404
+        with pytest.raises(KeyError):
+            self.master.is_job_done(job_id)
+
+    def test_get_job_by_id(self, tmp_path):
+        # Arrange
+        test_client = self.get_test_client()
+        job: JobInfo = JobInfo()
+        job.job_path = str(tmp_path)
+        job.file_names = ['data.txt']
+        (tmp_path / 'data.txt').write_bytes(b'data')
+        job_id = self.master.submit_job(job, [Task(1, "", [""], None, "", "")])
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.JOB}/{job_id}')
+        # Assert
+        assert resp.status_code == 200
+        assert 'data.txt' in resp.json
+
+    def test_get_job_invalid_held_tasks(self):
+        # Arrange
+        self.master.job.job_id = 1234
+        self.master.load_tasks([Task(1, "", [""], None, "", "")])
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.JOB}?held=1,x')
+        # Assert
+        assert resp.status_code == 400
+
+    def test_get_job_long_lived_without_job(self):
+        # Arrange
+        self.master = HyperMaster(long_lived=True)
+        test_client = self.get_test_client()
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.JOB}')
+        # Assert
+        assert resp.status_code == 42
+
     def test_load_tasks(self):
         # Arrange
         self.master.job.job_id = 1234
@@ -89,6 +518,19 @@ class TestMaster:
         while not available_tasks.empty():
             assert available_tasks.get() in tasks
 
+    def test_load_tasks_lazily(self):
+        # Arrange
+        self.master.job.job_id = 1234
+        tasks = (Task(i, "", [""], None, "", "") for i in range(10))
+        available_tasks = self.master.task_manager.available_tasks
+        # Act
+        self.master.load_tasks(tasks, estimated_total=8, window=4)
+        self.master.task_manager.loader.join(0.2)
+        # Assert
+        assert available_tasks.qsize() == 4
+        assert available_tasks.get().job_id == 1234
+        assert self.master.status_manager.status.num_tasks_estimated
+
     def test_load_tasks_job_uninitialized(self):
         # Arrange
         tasks: List[Task] = []
@@ -204,6 +646,68 @@ class TestMaster:
         assert len(actual_data) == 2
         assert actual_data == tasks[0:2]
 
+    def test_get_tasks_none_available(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        self.master.task_manager.speculative_execution = False
+        self.master.load_tasks([Task(1, "", [""], None, "", "")])
+        self.master.task_manager.connect_available_task("other_session_id")
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.GET_TASKS}/1234/2?wait=0.1')
+        # Assert
+        assert resp.status_code == 42
+
+    def test_get_tasks_long_poll_refused_when_threads_busy(self):
+        # Arrange
+        self.master = HyperMaster(server_config=ServerConfig(threads=9, reserved_threads=8))
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        self.master.task_manager.connect_available_tasks = MagicMock(return_value=[])
+        # the only long poll slot is taken by another slave
+        self.master.long_polls.acquire()
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.GET_TASKS}/1234/2?wait=10')
+        # Assert
+        assert resp.status_code == 42
+        assert resp.headers['Retry-After'] == '1'
+        self.master.task_manager.connect_available_tasks.assert_called_with(2, 'test_session_id', 0.0)
+
+    def test_get_tasks_long_poll_releases_slot(self):
+        # Arrange
+        self.master = HyperMaster(server_config=ServerConfig(threads=9, reserved_threads=8))
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        self.master.task_manager.connect_available_tasks = MagicMock(return_value=[])
+        # Act
+        first: Response = test_client.get(f'/{endpoints.GET_TASKS}/1234/2?wait=0.1')
+        second: Response = test_client.get(f'/{endpoints.GET_TASKS}/1234/2?wait=0.1')
+        # Assert
+        assert 'Retry-After' not in first.headers
+        assert 'Retry-After' not in second.headers
+
+    def test_server_config_threads_from_expected_slaves(self):
+        # Act
+        config = ServerConfig(expected_slaves=100)
+        # Assert
+        assert config.threads == 108
+        assert config.max_long_polls == 100
+
+    def test_get_tasks_long_poll_wait_capped(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        self.master.max_long_poll_secs = 0.5
+        self.master.task_manager.connect_available_tasks = MagicMock(return_value=[])
+        # Act
+        test_client.get(f'/{endpoints.GET_TASKS}/1234/2?wait=100')
+        # Assert
+        self.master.task_manager.connect_available_tasks.assert_called_with(2, 'test_session_id', 0.5)
+
     def test_get_tasks_job_done(self):
         # Arrange
         test_client = self.get_test_client()
@@ -316,6 +820,64 @@ class TestMaster:
         assert self.master.task_manager.finished_tasks.qsize() == 1
         assert self.master.task_manager.finished_tasks.get() == task
 
+    def test_tasks_done_too_large(self):
+        # Arrange
+        self.master = HyperMaster(server_config=ServerConfig(max_tasks_done_bytes=16))
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], b"x" * 64, "", "")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        resp1: Response = test_client.post(f'/{endpoints.TASKS_DONE}/1234', data=encode_tasks([task]))
+        resp2: Response = test_client.post(f'/{endpoints.TASKS_EXCHANGE}/1234/1', data=encode_tasks([task]))
+        # Assert
+        assert resp1.status_code == 413
+        assert resp2.status_code == 413
+
+    @patch('master.master.DiscoveryBeacon')
+    def test_start_server(self, mock_beacon):
+        # Arrange
+        server = MagicMock()
+        self.master.create_server = MagicMock(return_value=server)
+        # Act
+        self.master.start_server()
+        # Assert
+        server.run.assert_called_once()
+        mock_beacon.return_value.start.assert_called_once()
+        mock_beacon.return_value.stop.assert_called_once()
+
+    @patch('master.master.DiscoveryBeacon')
+    def test_start_server_without_discovery(self, mock_beacon):
+        # Arrange
+        self.master.discovery_port = None
+        self.master.create_server = MagicMock()
+        # Act
+        self.master.start_server()
+        # Assert
+        mock_beacon.assert_not_called()
+
+    @patch('master.master.DiscoveryBeacon')
+    @patch('master.master.Flask.run')
+    def test_start_debug_server(self, mock_run, mock_beacon):
+        # Arrange
+        self.master.create_server = MagicMock()
+        # Act
+        self.master.start_server(debug=True)
+        # Assert
+        mock_run.assert_called_once()
+        self.master.create_server.assert_not_called()
+
+    def test_create_server(self):
+        # Arrange
+        self.master = HyperMaster(host='127.0.0.1', port=0, server_config=ServerConfig(threads=3))
+        # Act
+        server = self.master.create_server(create_app(self.master))
+        # Assert
+        assert server.adj.threads == 3
+        assert server.adj.connection_limit == self.master.server_config.connection_limit
+        server.close()
+
     def test_tasks_done_2(self):
         # Arrange
         test_client = self.get_test_client()
@@ -338,6 +900,92 @@ class TestMaster:
         assert self.master.task_manager.finished_tasks.qsize() == 2
         assert self.master.task_manager.finished_tasks.get() == tasks[0]
 
+    def test_tasks_exchange(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        tasks: List[Task] = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.master.load_tasks(tasks)
+        test_client.get(f'/{endpoints.GET_TASKS}/1234/1')
+        tasks[0].message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.TASKS_EXCHANGE}/1234/1',
+                                          data=compress(pickle_dumps([tasks[0]])))
+        # Assert
+        assert resp.status_code == 200
+        assert self.master.task_manager.finished_tasks.get() == tasks[0]
+        next_tasks: List[Task] = pickle_loads(decompress(resp.data))
+        assert next_tasks == [tasks[1]]
+
+    def test_get_tasks_binary(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        tasks: List[Task] = [Task(1, "", [""], b"data", "", ""), Task(2, "", [""], None, "", "")]
+        self.master.load_tasks(tasks)
+        # Act
+        resp: Response = test_client.get(f'/{endpoints.GET_TASKS}/1234/2',
+                                         headers={'Accept': TASKS_MIME_TYPE})
+        # Assert
+        assert resp.status_code == 200
+        actual_data: List[Task] = decode_tasks(resp.data)
+        assert actual_data == tasks
+        assert actual_data[0].payload == b"data"
+
+    def test_tasks_done_binary(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], None, "", "")
+        self.master.load_tasks([task])
+        test_client.get(f'/{endpoints.GET_TASKS}/1234/1')
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.TASKS_DONE}/1234', data=encode_tasks([task]),
+                                          headers={'Content-Type': TASKS_MIME_TYPE})
+        # Assert
+        assert resp.status_code == 200
+        assert self.master.task_manager.finished_tasks.get() == task
+
+    def test_tasks_exchange_job_done(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], None, "", "")
+        self.master.load_tasks([task])
+        test_client.get(f'/{endpoints.GET_TASKS}/1234/1')
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.TASKS_EXCHANGE}/1234/1',
+                                          data=compress(pickle_dumps([task])))
+        # Assert
+        next_tasks: List[Task] = pickle_loads(decompress(resp.data))
+        assert next_tasks[0].message_type == TaskMessageType.JOB_END
+
+    def test_tasks_exchange_wrong_job_error(self):
+        # Arrange
+        test_client = self.get_test_client()
+        self.master.job.job_id = 1234
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.TASKS_EXCHANGE}/0/1')
+        # Assert
+        assert resp.status_code == 403
+
+    @patch('master.master.decompress')
+    def test_tasks_exchange_compression_error(self, mock_decompress):
+        # Arrange
+        test_client = self.get_test_client()
+        self.master.job.job_id = 1234
+        mock_decompress.side_effect = CompressionException
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.TASKS_EXCHANGE}/1234/1', data=b'data')
+        # Assert
+        assert resp.status_code == 500
+
     def test_tasks_done_job_uninitialized_error(self):
         # Arrange
         test_client = self.get_test_client()
@@ -410,3 +1058,41 @@ class TestMaster:
         resp: Response = test_client.get(f'/{endpoints.HEARTBEAT}')
         # Assert
         assert resp.status_code == 200
+
+    def test_leave(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        self.master.load_tasks([Task(1, "", [""], None, "", "")])
+        test_client.get(f'/{endpoints.JOB}')
+        test_client.get(f'/{endpoints.GET_TASKS}/1234/1')
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.LEAVE}')
+        # Assert
+        assert resp.status_code == 200
+        assert "test_session_id" not in self.master.conn_manager.connections
+        assert self.master.task_manager.available_tasks.qsize() == 1
+
+    def test_renew_leases(self):
+        # Arrange
+        test_client = self.get_test_client()
+        test_client.set_cookie('server', 'id', 'test_session_id')
+        self.master.job.job_id = 1234
+        task: Task = Task(1, "", [""], None, "", "")
+        self.master.load_tasks([task])
+        test_client.get(f'/{endpoints.GET_TASKS}/1234/1')
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.RENEW_LEASES}/1234', json=[1])
+        # Assert
+        assert resp.status_code == 200
+        assert resp.json == 1
+
+    def test_renew_leases_wrong_job_error(self):
+        # Arrange
+        test_client = self.get_test_client()
+        self.master.job.job_id = 1234
+        # Act
+        resp: Response = test_client.post(f'/{endpoints.RENEW_LEASES}/0', json=[1])
+        # Assert
+        assert resp.status_code == 403
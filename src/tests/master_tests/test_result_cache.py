@@ -0,0 +1,58 @@
+from common.task import Task
+from master.result_cache import ResultCache
+
+
+class TestResultCache:
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.cache = ResultCache(max_bytes=10)
+
+    def test_get_put(self):
+        # Arrange
+        key = self.cache.key(Task(1, "app.sh", [], b"input", "", ""))
+        # Act & Assert
+        assert self.cache.get(key) == (False, None)
+        self.cache.put(key, b"result")
+        assert self.cache.get(key) == (True, b"result")
+
+    def test_lru_eviction(self):
+        # Arrange
+        self.cache.put(b'a', b'1234')
+        self.cache.put(b'b', b'1234')
+        self.cache.get(b'a')
+        # Act
+        self.cache.put(b'c', b'1234')
+        # Assert
+        assert self.cache.get(b'b') == (False, None)
+        assert self.cache.get(b'a') == (True, b'1234')
+        assert self.cache.size == 8
+
+    def test_oversized_payload_not_cached(self):
+        # Act
+        self.cache.put(b'a', bytes(11))
+        # Assert
+        assert len(self.cache) == 0
+
+    def test_key_ignores_task_specific_names(self):
+        # Arrange
+        task1 = Task(1, "app.sh", ["payload_1.txt", "result_1.txt"], b"input", "result_1.txt", "payload_1.txt")
+        task2 = Task(2, "app.sh", ["payload_2.txt", "result_2.txt"], b"input", "result_2.txt", "payload_2.txt")
+        # Act & Assert
+        assert self.cache.key(task1) == self.cache.key(task2)
+        assert self.cache.key(task1) != self.cache.key(Task(1, "app.sh", ["payload_1.txt"], b"input", "", ""))
+        assert self.cache.key(task1) != self.cache.key(Task(1, "other.sh", ["a", "b"], b"input", "", ""))
+
+    def test_key_covers_job_file_contents(self, tmp_path):
+        # Arrange
+        (tmp_path / 'model.bin').write_bytes(b'v1')
+        task = Task(1, "app.sh", ["model.bin"], b"input", "", "")
+        self.cache.set_job_files(str(tmp_path), ['model.bin'])
+        key_v1 = self.cache.key(task)
+        (tmp_path / 'model.bin').write_bytes(b'v2')
+        # Act
+        self.cache.set_job_files(str(tmp_path), ['model.bin'])
+        # Assert
+        assert self.cache.key(task) != key_v1
@@ -0,0 +1,149 @@
+from threading import Timer
+
+import pytest
+
+from common.task import Task, TaskMessageType
+from master.result_store import ResultStore, task_identity
+
+
+def make_result(task_id: int, payload: bytes) -> Task:
+    task = Task(task_id, "app.sh", ["a.txt"], payload, f"result_{task_id}.txt", f"payload_{task_id}.txt")
+    task.set_job(1234)
+    task.set_message_type(TaskMessageType.TASK_PROCESSED)
+    return task
+
+
+class TestResultStore:
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.store: ResultStore = None
+
+    def teardown_method(self, method):
+        """
+        After Each
+        """
+        if self.store is not None:
+            self.store.close()
+
+    def test_get_result(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        self.store.append(make_result(1, b'one'))
+        self.store.append(make_result(2, b'two'))
+        # Act
+        actual = self.store.get_result(2)
+        # Assert
+        assert actual == make_result(2, b'')
+        assert actual.payload == b'two'
+        assert actual.message_type == TaskMessageType.TASK_PROCESSED
+        assert 1 in self.store
+        assert len(self.store) == 2
+
+    def test_get_result_missing(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        # Act & Assert
+        with pytest.raises(KeyError):
+            assert self.store.get_result(1)
+
+    def test_iter_results(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        for i in range(5):
+            self.store.append(make_result(i, bytes([i]) * 100))
+        # Act
+        actual = list(self.store.iter_results())
+        # Assert
+        assert [task.task_id for task in actual] == [0, 1, 2, 3, 4]
+        assert actual[3].payload == bytes([3]) * 100
+
+    def test_iter_results_follows_appends(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        self.store.append(make_result(1, b'one'))
+        done = []
+        timer = Timer(0.05, lambda: (self.store.append(make_result(2, b'two')), done.append(True)))
+        # Act
+        timer.start()
+        actual = list(self.store.iter_results(until=lambda: bool(done), poll_secs=0.01))
+        # Assert
+        assert [task.task_id for task in actual] == [1, 2]
+
+    def test_reopen_rebuilds_index(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'results')
+        store = ResultStore(path)
+        store.append(make_result(1, b'one'), task_identity(make_result(1, b'one')))
+        store.append(make_result(2, b'two'))
+        store.close()
+        with open(path, 'ab') as file:
+            file.write(b'\x40\x00\x00\x00partial')
+        # Act
+        self.store = ResultStore(path, keep_previous=True)
+        self.store.reuse(2)
+        self.store.append(make_result(3, b'three'))
+        # Assert
+        assert sorted(self.store.task_ids()) == [2, 3]
+        assert self.store.get_result(2).payload == b'two'
+        assert self.store.has_result(make_result(1, b'one'))
+        assert 1 not in self.store
+        assert [task.task_id for task in self.store.iter_results()] == [2, 3]
+
+    def test_reopen_discards_previous(self, tmp_path):
+        # Arrange
+        path = str(tmp_path / 'results')
+        store = ResultStore(path)
+        store.append(make_result(1, b'one'))
+        store.close()
+        # Act
+        self.store = ResultStore(path)
+        self.store.append(make_result(2, b'two'))
+        # Assert
+        assert self.store.task_ids() == [2]
+        assert [task.task_id for task in self.store.iter_results()] == [2]
+
+    def test_results_from(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        self.store.append(make_result(1, b'one'))
+        first, position = self.store.results_from(0)
+        self.store.append(make_result(2, b'two'))
+        # Act
+        actual, position = self.store.results_from(position)
+        # Assert
+        assert [task.task_id for task in first] == [1]
+        assert [task.task_id for task in actual] == [2]
+        assert self.store.results_from(position) == ([], 2)
+
+    def test_has_result(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        task = make_result(1, b'input')
+        self.store.append(make_result(1, b'output'), task_identity(task))
+        # Act & Assert
+        assert self.store.has_result(task)
+        assert not self.store.has_result(make_result(1, b'changed input'))
+        assert not self.store.has_result(make_result(2, b'input'))
+
+    def test_task_identity(self):
+        # Arrange
+        task = make_result(1, b'input')
+        # Act & Assert
+        assert task_identity(task) == task_identity(make_result(2, b'input'))
+        assert task_identity(task) != task_identity(Task(1, "app.sh", ["b.txt"], b'input', "", ""))
+        assert task_identity(task) != task_identity(Task(1, "app.sh", ["a.tx", "t"], b'input', "", ""))
+        assert task_identity(Task(1, "", [], None, "", "")) != task_identity(Task(1, "", [], b'', "", ""))
+
+    def test_iter_results_latest_only(self, tmp_path):
+        # Arrange
+        self.store = ResultStore(str(tmp_path / 'results'))
+        self.store.append(make_result(1, b'old'))
+        self.store.append(make_result(2, b'two'))
+        self.store.append(make_result(1, b'new'))
+        # Act
+        actual = list(self.store.iter_results())
+        # Assert
+        assert [(task.task_id, task.payload) for task in actual] == [(2, b'two'), (1, b'new')]
@@ -87,6 +87,14 @@ class TestStatusManager:
         # Act & Assert
         assert self.status_manager.is_job_done()
 
+    def test_job_failed(self):
+        # Act
+        self.status_manager.job_failed('source error')
+        # Assert
+        assert self.status_manager.is_job_done()
+        assert self.status_manager.is_job_failed()
+        assert self.status_manager.get_status().endswith('Job Failed: source error')
+
     def test_get_status(self):
         # Arrange
         expected_data = 'Job ID: -1\n'
@@ -103,6 +111,26 @@ class TestStatusManager:
         # Assert
         assert actual_data == expected_data
 
+    def test_tasks_loading_unknown_total(self):
+        # Act
+        self.status_manager.tasks_loading()
+        self.status_manager.tasks_completed(3)
+        # Assert
+        assert 'Total Tasks: unknown\n' in self.status_manager.get_status()
+
+    def test_tasks_loading_estimated_total(self):
+        # Act
+        self.status_manager.tasks_loading(100)
+        self.status_manager.tasks_pulled(120)
+        # Assert
+        assert self.status_manager.status.num_tasks == 120
+        assert 'Total Tasks: 120 (estimated)\n' in self.status_manager.get_status()
+        # Act
+        self.status_manager.tasks_loaded(150)
+        # Assert
+        assert not self.status_manager.status.num_tasks_estimated
+        assert 'Total Tasks: 150\n' in self.status_manager.get_status()
+
     def test_print_status(self, capsys):
         # Arrange
         self.status_manager.new_slave_connected()
@@ -1,6 +1,9 @@
+from threading import Thread, Timer
+
 import pytest
 
 from common.task import Task, TaskMessageType
+from master.result_store import ResultStore
 from master.status_manager import StatusManager
 from master.task_manager import TaskManager, ConnectedTask, NoMoreTasks, NoMoreAvailableTasks
 
@@ -12,7 +15,7 @@ class TestTaskManager:
         """
         Before Each
         """
-        self.task_manager = TaskManager(StatusManager())
+        self.task_manager = TaskManager(StatusManager(), min_backup_age_secs=0.0)
 
     def test_connect_available_task(self):
         # Arrange
@@ -225,3 +228,591 @@ class TestTaskManager:
         flushed = self.task_manager.flush_finished_tasks()
         # Assert
         assert flushed == tasks
+
+    def test_connect_backup_task(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        # Act
+        backup = self.task_manager.connect_available_task("conn_2")
+        # Assert
+        assert backup == task
+        assert len(self.task_manager.in_progress) == 1
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_1"
+        assert "conn_2" in self.task_manager.in_progress[task.task_id].backup_connection_ids
+
+    def test_connect_backup_task_only_stragglers(self):
+        # Arrange
+        self.task_manager.completion_secs.extend([10.0, 20.0, 30.0])
+        tasks = [Task(i, "", [""], None, "", "") for i in range(2)]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        self.task_manager.connect_available_tasks(2, "conn_1")
+        # the first task has run for 50 seconds, more than twice the median of 20 seconds
+        self.task_manager.in_progress[0].connected_at -= 50.0
+        self.task_manager.in_progress[1].connected_at -= 30.0
+        # Act
+        backups = self.task_manager.connect_available_tasks(2, "conn_2")
+        # Assert
+        assert backups == [tasks[0]]
+
+    def test_connect_backup_task_min_age(self):
+        # Arrange
+        self.task_manager.min_backup_age_secs = 30.0
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        # Act & Assert
+        with pytest.raises(NoMoreAvailableTasks):
+            assert self.task_manager.connect_available_task("conn_2")
+        self.task_manager.in_progress[1].connected_at -= 31.0
+        assert self.task_manager.connect_available_task("conn_2") == task
+
+    def test_task_finished_records_completion_time(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.in_progress[1].connected_at -= 5.0
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        self.task_manager.task_finished(task, "conn_1")
+        # Assert
+        assert 10.0 <= self.task_manager.backup_age_secs() < 11.0
+
+    def test_connect_backup_task_longest_running_first(self):
+        # Arrange
+        task_1 = Task(1, "", [""], None, "", "")
+        task_2 = Task(2, "", [""], None, "", "")
+        self.task_manager.add_new_available_tasks([task_1, task_2], 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        # Act
+        backups = self.task_manager.connect_available_tasks(2, "conn_3")
+        # Assert
+        assert backups == [task_1, task_2]
+
+    def test_connect_backup_task_limit(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        # Act & Assert
+        with pytest.raises(NoMoreAvailableTasks):
+            assert self.task_manager.connect_available_task("conn_3")
+
+    def test_connect_backup_task_disabled(self):
+        # Arrange
+        self.task_manager.speculative_execution = False
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        # Act & Assert
+        with pytest.raises(NoMoreAvailableTasks):
+            assert self.task_manager.connect_available_task("conn_2")
+
+    def test_task_finished_backup_first(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        backup_result = Task(1, "", [""], b'backup', "", "")
+        backup_result.set_job(1234)
+        backup_result.message_type = TaskMessageType.TASK_PROCESSED
+        owner_result = Task(1, "", [""], b'owner', "", "")
+        owner_result.set_job(1234)
+        owner_result.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        self.task_manager.task_finished(backup_result, "conn_2")
+        self.task_manager.task_finished(owner_result, "conn_1")
+        # Assert
+        assert self.task_manager.finished_tasks.qsize() == 1
+        assert self.task_manager.finished_tasks.get().payload == b'backup'
+        assert self.task_manager.status_manager.status.num_tasks_done == 1
+        assert self.task_manager.status_manager.is_job_done()
+
+    def test_task_finished_failed_copy_with_backup(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        task.message_type = TaskMessageType.TASK_FAILED
+        # Act
+        self.task_manager.task_finished(task, "conn_1")
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 0
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_2"
+        assert len(self.task_manager.in_progress[task.task_id].backup_connection_ids) == 0
+
+    def test_connection_dropped_with_backup(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        # Act
+        self.task_manager.connection_dropped("conn_1")
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 0
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_2"
+
+    def test_connect_available_task_lease(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        # Act
+        self.task_manager.connect_available_task("conn_1")
+        # Assert
+        connected_task = self.task_manager.in_progress[task.task_id]
+        assert connected_task.lease_expiry is not None
+        assert (connected_task.lease_expiry, task.task_id) in self.task_manager.lease_manager.leases
+
+    def test_lease_expired(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        expiry = self.task_manager.in_progress[task.task_id].lease_expiry
+        # Act
+        self.task_manager.lease_expired(task.task_id, expiry)
+        # Assert
+        assert len(self.task_manager.in_progress) == 0
+        assert self.task_manager.available_tasks.qsize() == 1
+
+    def test_lease_expired_after_renewal(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        expiry = self.task_manager.in_progress[task.task_id].lease_expiry
+        # Act
+        renewed = self.task_manager.renew_leases([task.task_id], "conn_1")
+        self.task_manager.lease_expired(task.task_id, expiry)
+        # Assert
+        assert renewed == 1
+        assert self.task_manager.in_progress[task.task_id].lease_expiry > expiry
+        assert self.task_manager.available_tasks.qsize() == 0
+
+    def test_renew_leases_wrong_connection(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        # Act
+        renewed = self.task_manager.renew_leases([task.task_id, 2], "conn_2")
+        # Assert
+        assert renewed == 0
+
+    def test_lease_expired_promotes_backup(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        expiry = self.task_manager.in_progress[task.task_id].lease_expiry
+        # Act
+        self.task_manager.lease_expired(task.task_id, expiry)
+        # Assert
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_2"
+        assert self.task_manager.available_tasks.qsize() == 0
+
+    def test_task_finished_failed_stale_connection(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_FAILED
+        # Act
+        self.task_manager.task_finished(task, "conn_2")
+        # Assert
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_1"
+        assert self.task_manager.available_tasks.qsize() == 0
+
+    def test_connection_index(self):
+        # Arrange
+        tasks = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        # Act
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        self.task_manager.connect_available_task("conn_1")
+        # Assert
+        assert self.task_manager.in_progress.connection_task_ids("conn_1") == {1, 2}
+        assert self.task_manager.in_progress.connection_task_ids("conn_2") == {2}
+
+    def test_connection_index_task_finished(self):
+        # Arrange
+        tasks = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        self.task_manager.connect_available_tasks(2, "conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        tasks[0].message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        self.task_manager.task_finished(tasks[0], "conn_2")
+        # Assert
+        assert self.task_manager.in_progress.connection_task_ids("conn_1") == {2}
+        assert self.task_manager.in_progress.connection_task_ids("conn_2") == set()
+
+    def test_connection_dropped_only_touches_own_tasks(self):
+        # Arrange
+        tasks = [Task(1, "", [""], None, "", ""), Task(2, "", [""], None, "", "")]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        untouched = self.task_manager.in_progress[2]
+        # Act
+        self.task_manager.connection_dropped("conn_1")
+        # Assert
+        assert self.task_manager.in_progress.connection_task_ids("conn_1") == set()
+        assert self.task_manager.in_progress.connection_task_ids("conn_2") == {2}
+        assert self.task_manager.in_progress.values() == [untouched]
+        assert self.task_manager.available_tasks.get() == tasks[0]
+
+    def test_concurrent_connect_and_finish(self):
+        # Arrange
+        num_tasks = 400
+        self.task_manager.speculative_execution = False
+        self.task_manager.add_new_available_tasks(
+            [Task(i, "", [""], None, "", "") for i in range(num_tasks)], 1234)
+
+        def worker(connection_id: str):
+            while True:
+                try:
+                    tasks = self.task_manager.connect_available_tasks(5, connection_id)
+                except NoMoreTasks:
+                    return
+                for task in tasks:
+                    task.message_type = TaskMessageType.TASK_PROCESSED
+                self.task_manager.tasks_finished(tasks, connection_id)
+        threads = [Thread(target=worker, args=(f'conn_{i}',)) for i in range(8)]
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        # Assert
+        finished = self.task_manager.flush_finished_tasks()
+        assert sorted(task.task_id for task in finished) == list(range(num_tasks))
+        assert self.task_manager.status_manager.status.num_tasks_done == num_tasks
+        assert self.task_manager.status_manager.is_job_done()
+        assert len(self.task_manager.in_progress) == 0
+
+    def test_connect_available_tasks_priority_order(self):
+        # Arrange
+        tasks = [Task(1, "", [""], None, "", "", estimated_cost=1.0),
+                 Task(2, "", [""], None, "", "", estimated_cost=10.0),
+                 Task(3, "", [""], None, "", "", priority=1)]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        # Act
+        connected = self.task_manager.connect_available_tasks(3, "conn_1")
+        # Assert
+        assert connected == [tasks[2], tasks[1], tasks[0]]
+
+    def test_requeued_task_keeps_priority(self):
+        # Arrange
+        urgent = Task(1, "", [""], None, "", "", priority=10)
+        self.task_manager.add_new_available_task(urgent, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.add_new_available_tasks([Task(i, "", [""], None, "", "") for i in range(2, 5)], 1234)
+        # Act
+        self.task_manager.connection_dropped("conn_1")
+        # Assert
+        assert self.task_manager.connect_available_task("conn_2") is urgent
+
+    def test_connect_available_tasks_long_poll_requeue(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.speculative_execution = False
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        timer = Timer(0.1, self.task_manager.connection_dropped, args=("conn_1",))
+        # Act
+        timer.start()
+        tasks = self.task_manager.connect_available_tasks(1, "conn_2", wait_secs=5)
+        # Assert
+        assert tasks == [task]
+
+    def test_connect_available_tasks_long_poll_timeout(self):
+        # Arrange
+        self.task_manager.speculative_execution = False
+        self.task_manager.add_new_available_task(Task(1, "", [""], None, "", ""), 1234)
+        self.task_manager.connect_available_task("conn_1")
+        # Act
+        tasks = self.task_manager.connect_available_tasks(1, "conn_2", wait_secs=0.1)
+        # Assert
+        assert tasks == []
+
+    def test_connect_available_tasks_long_poll_job_end(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.speculative_execution = False
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        timer = Timer(0.1, self.task_manager.task_finished, args=(task, "conn_1"))
+        # Act
+        timer.start()
+        # Assert
+        with pytest.raises(NoMoreTasks):
+            assert self.task_manager.connect_available_tasks(1, "conn_2", wait_secs=5)
+        assert self.task_manager.status_manager.is_job_done()
+
+    def test_load_task_source_bounded_window(self):
+        # Arrange
+        pulled = []
+
+        def source():
+            for i in range(10):
+                pulled.append(i)
+                yield Task(i, "", [""], None, "", "")
+        # Act
+        self.task_manager.load_task_source(source(), 1234, window=3)
+        self.task_manager.loader.join(0.2)
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 3
+        assert len(pulled) <= 4
+        assert self.task_manager.loading
+        assert not self.task_manager.is_drained()
+
+    def test_load_task_source_completes_job(self):
+        # Arrange
+        self.task_manager.speculative_execution = False
+        self.task_manager.load_task_source((Task(i, "", [""], None, "", "") for i in range(5)), 1234, window=2)
+        done = 0
+        # Act
+        while done < 5:
+            try:
+                tasks = self.task_manager.connect_available_tasks(2, "conn_1", wait_secs=1)
+            except NoMoreTasks:
+                break
+            for task in tasks:
+                task.message_type = TaskMessageType.TASK_PROCESSED
+            self.task_manager.tasks_finished(tasks, "conn_1")
+            done += len(tasks)
+        self.task_manager.loader.join(1)
+        # Assert
+        assert done == 5
+        assert not self.task_manager.loading
+        assert self.task_manager.status_manager.is_job_done()
+        assert self.task_manager.status_manager.status.num_tasks == 5
+        assert not self.task_manager.status_manager.status.num_tasks_estimated
+        with pytest.raises(NoMoreTasks):
+            assert self.task_manager.connect_available_task("conn_1")
+
+    def test_load_task_source_empty(self):
+        # Act
+        self.task_manager.load_task_source(iter([]), 1234, window=2)
+        self.task_manager.loader.join(1)
+        # Assert
+        assert self.task_manager.status_manager.is_job_done()
+
+    def test_load_task_source_fails_job(self):
+        # Arrange
+        def source():
+            yield Task(1, "", [""], None, "", "")
+            raise OSError('source unreachable')
+        self.task_manager.load_task_source(source(), 1234, window=2)
+        self.task_manager.loader.join(1)
+        task = self.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        self.task_manager.task_finished(task, "conn_1")
+        # Assert
+        assert self.task_manager.status_manager.is_job_done()
+        assert self.task_manager.status_manager.is_job_failed()
+
+    def test_iter_finished_tasks(self):
+        # Arrange
+        tasks = [Task(i, "", [""], None, "", "") for i in range(3)]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        connected = self.task_manager.connect_available_tasks(3, "conn_1")
+        for task in connected:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        timer = Timer(0.05, self.task_manager.tasks_finished, args=(connected[1:], "conn_1"))
+        self.task_manager.task_finished(connected[0], "conn_1")
+        # Act
+        timer.start()
+        actual = list(self.task_manager.iter_finished_tasks(poll_secs=0.01))
+        # Assert
+        assert sorted(task.task_id for task in actual) == [0, 1, 2]
+        assert self.task_manager.finished_tasks.empty()
+
+    def test_completion_callback(self):
+        # Arrange
+        completed = []
+        tasks = [Task(i, "", [""], None, "", "") for i in range(2)]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        connected = self.task_manager.connect_available_tasks(2, "conn_1")
+        for task in connected:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+        self.task_manager.task_finished(connected[0], "conn_1")
+        # Act
+        self.task_manager.set_completion_callback(completed.append)
+        self.task_manager.task_finished(connected[1], "conn_1")
+        # Assert
+        assert completed == connected
+        assert self.task_manager.finished_tasks.empty()
+        assert self.task_manager.status_manager.is_job_done()
+
+    def test_completion_callback_outside_shard_lock(self):
+        # Arrange
+        locked = []
+        tasks = [Task(i, "", [""], None, "", "") for i in range(2)]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        connected = self.task_manager.connect_available_tasks(2, "conn_1")
+        for task in connected:
+            task.message_type = TaskMessageType.TASK_PROCESSED
+
+        def probe_lock(task_id: int):
+            lock = self.task_manager.in_progress.lock_for(task_id)
+            acquired = lock.acquire(timeout=1)
+            locked.append(not acquired)
+            if acquired:
+                lock.release()
+
+        def shard_locked(task: Task):
+            # another thread must be able to take the shard lock while the callback runs
+            probe = Thread(target=probe_lock, args=(task.task_id,))
+            probe.start()
+            probe.join()
+        self.task_manager.set_completion_callback(shard_locked)
+        # Act
+        self.task_manager.tasks_finished(connected, "conn_1")
+        # Assert
+        assert locked == [False, False]
+        assert self.task_manager.status_manager.is_job_done()
+
+    def test_task_finished_result_store(self, tmp_path):
+        # Arrange
+        self.task_manager.result_store = ResultStore(str(tmp_path / 'results'))
+        task = Task(1, "", [""], b'result', "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        task.message_type = TaskMessageType.TASK_PROCESSED
+        # Act
+        self.task_manager.task_finished(task, "conn_1")
+        # Assert
+        assert self.task_manager.finished_tasks.empty()
+        assert self.task_manager.result_store.get_result(1).payload == b'result'
+        assert [t.task_id for t in self.task_manager.iter_finished_tasks()] == [1]
+        assert self.task_manager.flush_finished_tasks() == [task]
+        assert self.task_manager.flush_finished_tasks() == []
+        self.task_manager.result_store.close()
+
+    def test_connection_suspended_queues_copy(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        # Act
+        self.task_manager.connection_suspended("conn_1")
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 1
+        assert self.task_manager.in_progress[task.task_id].suspended
+
+    def test_suspended_task_taken_over(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connection_suspended("conn_1")
+        # Act
+        taken_task = self.task_manager.connect_available_task("conn_2")
+        # Assert
+        connected_task = self.task_manager.in_progress[task.task_id]
+        assert taken_task is task
+        assert connected_task.connection_id == "conn_2"
+        assert connected_task.is_connected_to("conn_1")
+        assert not connected_task.suspended
+
+    def test_late_result_of_suspended_connection(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connection_suspended("conn_1")
+        finished_task = Task(1, "", [""], None, "", "")
+        finished_task.set_message_type(TaskMessageType.TASK_PROCESSED)
+        # Act
+        self.task_manager.task_finished(finished_task, "conn_1")
+        # Assert
+        assert self.task_manager.finished_tasks.qsize() == 1
+        assert self.task_manager.available_tasks.qsize() == 0
+        assert self.task_manager.is_drained()
+
+    def test_connection_resumed(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connection_suspended("conn_1")
+        # Act
+        self.task_manager.connection_resumed("conn_1")
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 0
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_1"
+        assert not self.task_manager.in_progress[task.task_id].suspended
+
+    def test_connection_resumed_releases_dropped_tasks(self):
+        # Arrange
+        tasks = [Task(i, "", [""], None, "", "") for i in range(3)]
+        self.task_manager.add_new_available_tasks(tasks, 1234)
+        self.task_manager.connect_available_tasks(2, "conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        # the task of conn_2 gets a backup copy on conn_1
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connection_suspended("conn_1")
+        # Act
+        self.task_manager.connection_resumed("conn_1", held_task_ids={0})
+        # Assert
+        assert not self.task_manager.in_progress[0].suspended
+        assert 1 not in self.task_manager.in_progress
+        assert not self.task_manager.in_progress[2].is_connected_to("conn_1")
+        assert self.task_manager.in_progress.connection_task_ids("conn_1") == {0}
+        assert self.task_manager.connect_available_task("conn_3").task_id == 1
+
+    def test_queued_copy_of_resumed_task_not_dispatched(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connection_suspended("conn_1")
+        # a slave takes the copy off the queue just as the suspended slave resumes
+        queued_task = self.task_manager.available_tasks.get()
+        self.task_manager.connection_resumed("conn_1")
+        self.task_manager.available_tasks.put(queued_task)
+        # Act
+        taken_task = self.task_manager.connect_queued_task("conn_2")
+        # Assert
+        assert taken_task is None
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_1"
+
+    def test_connection_dropped_after_suspension(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connection_suspended("conn_1")
+        # Act
+        self.task_manager.connection_dropped("conn_1")
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 1
+        assert len(self.task_manager.in_progress) == 0
+        assert self.task_manager.connect_available_task("conn_2") is task
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_2"
+
+    def test_connection_suspended_with_backup(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        self.task_manager.add_new_available_task(task, 1234)
+        self.task_manager.connect_available_task("conn_1")
+        self.task_manager.connect_available_task("conn_2")
+        # Act
+        self.task_manager.connection_suspended("conn_1")
+        # Assert
+        assert self.task_manager.available_tasks.qsize() == 0
+        assert self.task_manager.in_progress[task.task_id].connection_id == "conn_2"
+        assert self.task_manager.in_progress[task.task_id].is_connected_to("conn_1")
@@ -0,0 +1,161 @@
+from queue import Empty
+from threading import Timer
+
+import pytest
+
+from common.task import Task
+from master.task_queue import AvailableTaskQueue
+
+
+class TestAvailableTaskQueue:
+    queue: AvailableTaskQueue
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.queue = AvailableTaskQueue()
+
+    def test_fifo_without_hints(self):
+        # Arrange
+        tasks = [Task(i, "", [""], None, "", "") for i in range(3)]
+        # Act
+        for task in tasks:
+            self.queue.put(task)
+        # Assert
+        assert [self.queue.get(), self.queue.get(), self.queue.get()] == tasks
+
+    def test_priority_first(self):
+        # Arrange
+        low = Task(1, "", [""], None, "", "", priority=0)
+        high = Task(2, "", [""], None, "", "", priority=5)
+        # Act
+        self.queue.put(low)
+        self.queue.put(high)
+        # Assert
+        assert self.queue.get() is high
+        assert self.queue.get() is low
+
+    def test_longest_processing_time_first(self):
+        # Arrange
+        cheap = Task(1, "", [""], None, "", "", estimated_cost=1.0)
+        unknown = Task(2, "", [""], None, "", "")
+        expensive = Task(3, "", [""], None, "", "", estimated_cost=30.0)
+        # Act
+        for task in (cheap, unknown, expensive):
+            self.queue.put(task)
+        # Assert
+        assert [self.queue.get(), self.queue.get(), self.queue.get()] == [expensive, cheap, unknown]
+
+    def test_priority_before_cost(self):
+        # Arrange
+        expensive = Task(1, "", [""], None, "", "", estimated_cost=100.0)
+        urgent = Task(2, "", [""], None, "", "", priority=1, estimated_cost=1.0)
+        # Act
+        self.queue.put(expensive)
+        self.queue.put(urgent)
+        # Assert
+        assert self.queue.get() is urgent
+
+    def test_interleaved_hints_keep_order(self):
+        # Arrange
+        tasks = [Task(i, "", [""], None, "", "", priority=i % 2) for i in range(6)]
+        # Act
+        for task in tasks:
+            self.queue.put(task)
+        actual = [self.queue.get() for _ in range(6)]
+        # Assert
+        assert [task.task_id for task in actual] == [1, 3, 5, 0, 2, 4]
+        assert not self.queue.buckets
+        assert not self.queue.keys
+
+    def test_qsize_empty(self):
+        # Assert
+        assert self.queue.empty()
+        self.queue.put(Task(1, "", [""], None, "", ""))
+        assert self.queue.qsize() == 1
+        assert not self.queue.empty()
+
+    def test_get_nowait_empty(self):
+        # Act & Assert
+        with pytest.raises(Empty):
+            assert self.queue.get_nowait()
+
+    def test_get_timeout_empty(self):
+        # Act & Assert
+        with pytest.raises(Empty):
+            assert self.queue.get(timeout=0.01)
+
+    def test_get_wakes_on_put(self):
+        # Arrange
+        task = Task(1, "", [""], None, "", "")
+        timer = Timer(0.01, self.queue.put, args=(task,))
+        # Act
+        timer.start()
+        # Assert
+        assert self.queue.get(timeout=1) is task
+
+    def test_wait_timeout(self):
+        # Act & Assert
+        assert not self.queue.wait(0.01)
+
+    def test_close_wakes_waiters(self):
+        # Arrange
+        timer = Timer(0.01, self.queue.close)
+        # Act
+        timer.start()
+        # Assert
+        assert not self.queue.wait(1)
+        assert self.queue.closed
+        with pytest.raises(Empty):
+            assert self.queue.get(timeout=1)
+
+    def test_wait_for_space(self):
+        # Arrange
+        self.queue.put(Task(1, "", [""], None, "", ""))
+        timer = Timer(0.05, self.queue.get)
+        # Act & Assert
+        assert not self.queue.wait_for_space(1, timeout=0.01)
+        timer.start()
+        assert self.queue.wait_for_space(1, timeout=5)
+
+    def test_remove(self):
+        # Arrange
+        task_1 = Task(1, "", [""], None, "", "")
+        task_2 = Task(2, "", [""], None, "", "")
+        self.queue.put(task_1)
+        self.queue.put(task_2)
+        # Act
+        removed = self.queue.remove(task_1)
+        # Assert
+        assert removed
+        assert self.queue.qsize() == 1
+        assert self.queue.get() is task_2
+        assert not self.queue.remove(task_1)
+
+    def test_remove_only_task_of_key(self):
+        # Arrange
+        task_1 = Task(1, "", [""], None, "", "", estimated_cost=2.0)
+        task_2 = Task(2, "", [""], None, "", "", estimated_cost=1.0)
+        self.queue.put(task_1)
+        self.queue.put(task_2)
+        # Act
+        removed = self.queue.remove(task_1)
+        # Assert
+        assert removed
+        assert not self.queue.remove(Task(3, "", [""], None, "", "", estimated_cost=1.0))
+        assert self.queue.get() is task_2
+        assert self.queue.empty()
+
+    def test_bucket_only_for_shared_key(self):
+        # Arrange
+        task_1 = Task(1, "", [""], None, "", "", estimated_cost=2.0)
+        task_2 = Task(2, "", [""], None, "", "", estimated_cost=1.0)
+        task_3 = Task(3, "", [""], None, "", "", estimated_cost=1.0)
+        # Act
+        for task in (task_1, task_2, task_3):
+            self.queue.put(task)
+        # Assert
+        assert self.queue.buckets[AvailableTaskQueue.sort_key(task_1)] is task_1
+        assert list(self.queue.buckets[AvailableTaskQueue.sort_key(task_2)]) == [task_2, task_3]
+        assert [self.queue.get() for _ in range(3)] == [task_1, task_2, task_3]
@@ -0,0 +1,74 @@
+import pytest
+
+from common.task import Task
+from master.task_store import ConnectedTask, InProgressStore
+
+
+class TestInProgressStore:
+    store: InProgressStore
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.store = InProgressStore(shard_count=4)
+
+    def test_add_get(self):
+        # Arrange
+        connected_task = ConnectedTask(Task(1, "", [""], None, "", ""), "conn_1")
+        # Act
+        self.store.add(connected_task)
+        # Assert
+        assert self.store.get(1) is connected_task
+        assert self.store[1] is connected_task
+        assert 1 in self.store
+        assert len(self.store) == 1
+        assert self.store.connection_task_ids("conn_1") == {1}
+
+    def test_get_missing(self):
+        # Act & Assert
+        assert self.store.get(1) is None
+        with pytest.raises(KeyError):
+            assert self.store[1]
+
+    def test_pop_untracks_all_connections(self):
+        # Arrange
+        connected_task = ConnectedTask(Task(1, "", [""], None, "", ""), "conn_1")
+        self.store.add(connected_task)
+        connected_task.backup_connection_ids.add("conn_2")
+        self.store.track("conn_2", 1)
+        # Act
+        popped = self.store.pop(1)
+        # Assert
+        assert popped is connected_task
+        assert len(self.store) == 0
+        assert self.store.connection_task_ids("conn_1") == set()
+        assert self.store.connection_task_ids("conn_2") == set()
+
+    def test_pop_connection(self):
+        # Arrange
+        for task_id in range(6):
+            self.store.add(ConnectedTask(Task(task_id, "", [""], None, "", ""), f'conn_{task_id % 2}'))
+        # Act
+        task_ids = self.store.pop_connection("conn_0")
+        # Assert
+        assert task_ids == {0, 2, 4}
+        assert self.store.connection_task_ids("conn_0") == set()
+        assert self.store.connection_task_ids("conn_1") == {1, 3, 5}
+        assert len(self.store) == 6
+
+    def test_group_by_shard(self):
+        # Act
+        groups = self.store.group_by_shard(range(8))
+        # Assert
+        assert sorted(groups.keys()) == [0, 1, 2, 3]
+        for shard, task_ids in groups.items():
+            assert all(self.store.shard_of(task_id) == shard for task_id in task_ids)
+
+    def test_values(self):
+        # Arrange
+        connected_tasks = [ConnectedTask(Task(task_id, "", [""], None, "", ""), "conn") for task_id in range(5)]
+        for connected_task in connected_tasks:
+            self.store.add(connected_task)
+        # Act & Assert
+        assert sorted(self.store.values(), key=lambda c: c.task.task_id) == connected_tasks
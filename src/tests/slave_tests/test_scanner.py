@@ -0,0 +1,95 @@
+from socket import socket
+from threading import Lock
+
+import pytest
+
+from slave.scanner import network_hosts, port_open, scan
+
+
+class TestScanner:
+
+    def setup_method(self, method):
+        """
+        Before Each
+        """
+        self.listener = socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+
+    def teardown_method(self, method):
+        """
+        After Each
+        """
+        self.listener.close()
+
+    def test_network_hosts(self):
+        # Act
+        hosts = network_hosts(['10.0.0.5/30', '10.0.0.0/29', '10.0.1.1/32'])
+        # Assert
+        assert hosts == ['10.0.0.5', '10.0.0.6', '10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4', '10.0.1.1']
+
+    def test_network_hosts_of_address(self):
+        # Act
+        hosts = network_hosts(['192.168.1.77/24'])
+        # Assert
+        assert len(hosts) == 254
+        assert hosts[0] == '192.168.1.1'
+
+    def test_network_hosts_invalid(self):
+        # Act & Assert
+        with pytest.raises(ValueError):
+            network_hosts(['192.168.1.0/33'])
+
+    def test_port_open(self):
+        # Act & Assert
+        assert port_open('127.0.0.1', self.port, 1.0)
+
+    def test_port_closed(self):
+        # Arrange
+        self.listener.close()
+        # Act & Assert
+        assert not port_open('127.0.0.1', self.port, 1.0)
+
+    def test_scan_confirms_open_host(self):
+        # Act
+        found = scan(['127.0.0.1'], self.port, lambda host: 'master')
+        # Assert
+        assert found == ('127.0.0.1', 'master')
+
+    def test_scan_not_confirmed(self):
+        # Act
+        found = scan(['127.0.0.1'], self.port, lambda host: None)
+        # Assert
+        assert found is None
+
+    def test_scan_stops_at_first_found(self):
+        # Arrange
+        hosts = [f'127.0.0.{i}' for i in range(1, 201)]
+        confirmed = []
+        lock = Lock()
+
+        def confirm(host):
+            with lock:
+                confirmed.append(host)
+            return host
+        # Act
+        found = scan(hosts, self.port, confirm, max_workers=4)
+        # Assert
+        assert found == ('127.0.0.1', '127.0.0.1')
+        assert len(confirmed) <= 4
+
+    def test_scan_discards_other_results(self):
+        # Arrange
+        hosts = [f'127.0.0.{i}' for i in range(1, 9)]
+        discarded = []
+        lock = Lock()
+
+        def discard(result):
+            with lock:
+                discarded.append(result)
+        # Act
+        found = scan(hosts, self.port, lambda host: host, max_workers=8, discard=discard)
+        # Assert
+        assert found is not None
+        assert found[1] not in discarded
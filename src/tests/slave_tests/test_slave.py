@@ -1,9 +1,18 @@
 import pytest
+from signal import SIGTERM
+from threading import Event
+from time import monotonic, perf_counter, sleep
 from unittest.mock import patch, mock_open, MagicMock
-from requests import Response
+from typing import List
+from requests import Response, exceptions as RequestExceptions
 from random import random
 from common.api import endpoints
-from slave.slave import HyperSlave, Path, Session, Heartbeat, CompressionException
+from common.task import Task, TaskMessageType
+from common.wire import decode_tasks
+from master.connection_manager import ConnectionManager
+from master.status_manager import StatusManager
+from master.task_manager import TaskManager
+from slave.slave import HyperSlave, MASTER_ADDRESS_FILE, run_shell_command, Path, Session, Heartbeat, CompressionException
 
 
 class TestSlave:
@@ -29,6 +38,8 @@ class TestSlave:
         assert self.slave.job_path is None
         assert self.slave.master_info is None
         assert self.slave.running is True
+        assert self.slave.max_workers >= 1
+        assert self.slave.executor is None
 
     @patch('slave.slave.Path')
     def test_init_job_root(self, mock_path: Path):
@@ -89,17 +100,40 @@ class TestSlave:
         assert ret is None
 
     @patch('slave.slave.Session', spec=Session)
-    def test_connect_generic_exception(self, mock_session: Session, capsys):
+    def test_connect_read_timeout(self, mock_session: Session):
         # Arrange
         mock_session.return_value = mock_session
-        mock_session.get.side_effect = Exception("Mock Error. Ignore Me!")
-        with pytest.raises(SystemExit):
-            # Act & Assert
-            assert self.slave.connect("hostname", "port")
+        mock_session.get.side_effect = RequestExceptions.ReadTimeout
+        # Act
+        ret = self.slave.connect("hostname", "port")
+        # Assert
+        assert ret is None
+        assert self.slave.master_info is None
+        mock_session.close.assert_called_once()
 
+    @patch('slave.scanner.port_open', return_value=True)
+    def test_scan_for_master_closes_other_sessions(self, mock_port_open):
+        # Arrange
+        self.slave.scan_networks = ['10.0.0.0/29']
+        sessions: List[MagicMock] = []
+
+        def probe_master(hostname, port):
+            session = MagicMock()
+            sessions.append(session)
+            return session, {'host': hostname}
+        self.slave.probe_master = MagicMock(side_effect=probe_master)
+        # Act
+        hostname, _, session = self.slave.scan_for_master(5678)
+        # Assert
+        assert self.slave.master_info == {'host': hostname}
+        assert not session.close.called
+        assert all(other.close.called for other in sessions if other is not session)
+
+    @patch('slave.scanner.port_open', return_value=True)
+    @patch('slave.slave.discover_master', return_value=None)
     @patch('requests.Response', spec=Response)
     @patch('slave.slave.Session', spec=Session)
-    def test_attempt_master_connection(self, mock_session: Session, mock_resp: Response):
+    def test_attempt_master_connection(self, mock_session: Session, mock_resp: Response, mock_discover, mock_port_open):
         # Arrange
         mock_session.return_value = mock_session
         mock_resp.status_code = 200
@@ -110,9 +144,10 @@ class TestSlave:
         # Assert
         assert self.slave.session == mock_session
 
+    @patch('slave.slave.discover_master', return_value=None)
     @patch('requests.Response', spec=Response)
     @patch('slave.slave.Session', spec=Session)
-    def test_attempt_master_connection_none(self, mock_session: Session, mock_resp: Response):
+    def test_attempt_master_connection_none(self, mock_session: Session, mock_resp: Response, mock_discover):
         # Arrange
         mock_session.return_value = mock_session
         mock_resp.status_code = 500
@@ -121,6 +156,63 @@ class TestSlave:
         # Assert
         assert ret is None
 
+    @patch('slave.slave.discover_master', return_value=('10.0.0.7', 6000))
+    def test_attempt_master_connection_discovered(self, mock_discover):
+        # Arrange
+        session = MagicMock()
+        self.slave.connect = MagicMock(return_value=session)
+        self.slave.scan_for_master = MagicMock()
+        # Act
+        ret = self.slave.attempt_master_connection(5678)
+        # Assert
+        assert ret == '10.0.0.7'
+        assert self.slave.port == 6000
+        self.slave.connect.assert_called_once_with('10.0.0.7', 6000)
+        self.slave.scan_for_master.assert_not_called()
+
+    @patch('slave.slave.discover_master')
+    def test_attempt_master_connection_remembered(self, mock_discover, tmp_path):
+        # Arrange
+        self.slave.job_path = str(tmp_path)
+        self.slave.remember_master('10.0.0.7', 6000)
+        self.slave.connect = MagicMock(return_value=MagicMock())
+        # Act
+        ret = self.slave.attempt_master_connection(5678)
+        # Assert
+        assert ret == '10.0.0.7'
+        self.slave.connect.assert_called_once_with('10.0.0.7', 6000)
+        mock_discover.assert_not_called()
+
+    @patch('slave.scanner.port_open', return_value=True)
+    @patch('slave.slave.get_ip_addr', return_value='10.0.0.2')
+    @patch('slave.slave.discover_master', return_value=None)
+    def test_attempt_master_connection_remembers_master(self, mock_discover, mock_ip_addr, mock_port_open, tmp_path):
+        # Arrange
+        self.slave.job_path = str(tmp_path)
+        self.slave.probe_master = MagicMock(side_effect=lambda hostname, port: (MagicMock(), {}) if hostname == '10.0.0.7' else None)
+        # Act
+        self.slave.attempt_master_connection(5678)
+        # Assert
+        assert (tmp_path / MASTER_ADDRESS_FILE).read_text() == '10.0.0.7:5678'
+
+    @patch('slave.scanner.port_open', side_effect=lambda host, port, timeout_secs: host == '172.16.4.9')
+    def test_scan_for_master_networks(self, mock_port_open):
+        # Arrange
+        self.slave.scan_networks = ['172.16.0.0/22', '172.16.4.0/24']
+        self.slave.probe_master = MagicMock(return_value=(MagicMock(), {'name': 'master'}))
+        # Act
+        found = self.slave.scan_for_master(5678)
+        # Assert
+        assert found[:2] == ('172.16.4.9', 5678)
+        assert self.slave.master_info == {'name': 'master'}
+        self.slave.probe_master.assert_called_once_with('172.16.4.9', 5678)
+
+    def test_scan_for_master_invalid_network(self):
+        # Arrange
+        self.slave.scan_networks = ['not a network']
+        # Act & Assert
+        assert self.slave.scan_for_master(5678) is None
+
     @patch('random.random', spec=random)
     @patch('slave.slave.Session', spec=Session)
     def test_set_session(self, mock_session: Session, mock_random):
@@ -135,6 +227,20 @@ class TestSlave:
         # Assert
         assert self.slave.ip_addr in cookie
 
+    @patch('slave.slave.random')
+    @patch('slave.slave.Session')
+    def test_set_session_keeps_id(self, mock_session: Session, mock_random):
+        # Arrange
+        mock_random.side_effect = [1, 2, 3, 4]
+        mock_session.cookies = MagicMock()
+        self.slave.ip_addr = "123.4567.8910"
+        self.slave.set_session(mock_session)
+        first_cookie = mock_session.cookies.set_cookie.call_args[0][0].value
+        # Act
+        self.slave.set_session(mock_session)
+        # Assert
+        assert mock_session.cookies.set_cookie.call_args[0][0].value == first_cookie
+
     @patch('slave.slave.rmtree')
     @patch('slave.slave.Path')
     def test_create_job_dir(self, mock_path: Path, mock_rmtree):
@@ -190,9 +296,41 @@ class TestSlave:
         # Act
         success = self.slave.get_file(file_name)
         # Assert
-        mock_session.get.assert_called_with(expected_endpoint)
+        mock_session.get.assert_called_with(expected_endpoint, timeout=30)
         assert success
 
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_prepare_job(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        mock_resp.status_code = 200
+        mock_resp.json.return_value = '{"job_id": 2, "file_names": ["file_name"]}'
+        mock_session.get.return_value = mock_resp
+        self.slave.session = mock_session
+        self.slave.job_id = 1
+        self.slave.create_job_dir = MagicMock()
+        self.slave.get_file = MagicMock(return_value=True)
+        # Act
+        first = self.slave.prepare_job(2)
+        second = self.slave.prepare_job(2)
+        # Assert
+        assert first and second
+        assert self.slave.prepare_job(1)
+        self.slave.create_job_dir.assert_called_once_with(2)
+        self.slave.get_file.assert_called_once_with('file_name', 2)
+
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_prepare_removed_job(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        mock_resp.status_code = 404
+        mock_session.get.return_value = mock_resp
+        self.slave.session = mock_session
+        self.slave.job_id = 1
+        # Act & Assert
+        assert not self.slave.prepare_job(2)
+        assert 2 not in self.slave.prepared_jobs
+
     @patch('slave.slave.Session', spec=Session)
     def test_get_file_no_resp(self, mock_session: Session):
         # Arrange
@@ -260,7 +398,8 @@ class TestSlave:
         with pytest.raises(Exception):
             assert self.slave.req_job()
 
-    def test_start(self):
+    @patch('slave.slave.signal')
+    def test_start(self, mock_signal):
         # Arrange
         self.slave.init_job_root = MagicMock()
         self.slave.attempt_master_connection = MagicMock(return_value="hostname")
@@ -270,3 +409,195 @@ class TestSlave:
         self.slave.start()
         # Assert
         assert self.slave.heartbeat.url == expected_url
+        mock_signal.assert_called_with(SIGTERM, self.slave.terminate)
+        self.slave.heartbeat.stop_beating()
+
+    @patch('slave.slave.signal')
+    @patch('slave.slave.get_ip_addr', return_value='10.0.0.2')
+    def test_reconnect_resumes_session(self, mock_ip_addr, mock_signal):
+        # Arrange
+        task_manager = TaskManager(StatusManager(), speculative_execution=False)
+        task_manager.add_new_available_tasks([Task(i, "", [""], None, "", "") for i in range(2)], 1234)
+        conn_manager = ConnectionManager(task_manager, StatusManager(), grace_secs=60.0)
+        self.slave.init_job_root = MagicMock()
+        self.slave.connect_remembered_master = MagicMock(side_effect=lambda port: ('10.0.0.7', 5678, Session()))
+        # the slave fails to reach the master to leave, as when the network drops
+        self.slave.leave = MagicMock(return_value=False)
+
+        def req_job():
+            # the master sees the slave's job request, then the slave loses its job
+            session_id = self.slave.session.cookies.get('id')
+            conn_manager.add_connection(session_id, held_task_ids=self.slave.held_task_ids())
+            if not task_manager.in_progress:
+                task_manager.connect_available_tasks(2, session_id)
+                # the result of the first task could not be sent, the second task was killed by the drain
+                result = Task(0, "", [""], b'result', "", "")
+                result.message_type = TaskMessageType.TASK_PROCESSED
+                self.slave.keep_unsent_results([result])
+            self.slave.stop()
+        self.slave.req_job = req_job
+        self.slave.start()
+        session_id = self.slave.session_id
+        connection = conn_manager.connections[session_id]
+        # the master suspects the slave while it is away
+        with conn_manager.condition:
+            conn_manager.expire(connection)
+        conn_manager.connection_expired(connection, True)
+        # Act
+        self.slave.reconnect()
+        # Assert
+        assert self.slave.session_id == session_id
+        assert task_manager.in_progress[0].connection_id == session_id
+        assert not task_manager.in_progress[0].suspended
+        assert 1 not in task_manager.in_progress
+        assert [task.task_id for task in task_manager.connect_available_tasks(2, "other_slave")] == [1]
+        conn_manager.stop()
+
+    @patch('slave.slave.Session', spec=Session)
+    def test_send_tasks_keeps_unreachable_results(self, mock_session: Session):
+        # Arrange
+        self.slave.session = mock_session
+        mock_session.post.side_effect = RequestExceptions.ConnectionError
+        processed = Task(1, "", [""], b'result', "", "")
+        processed.message_type = TaskMessageType.TASK_PROCESSED
+        processed.set_job(1234)
+        failed = Task(2, "", [""], None, "", "")
+        failed.message_type = TaskMessageType.TASK_FAILED
+        failed.set_job(1234)
+        self.slave.send_tasks([processed, failed])
+        mock_session.post.side_effect = None
+        mock_session.post.return_value = MagicMock(status_code=200)
+        # Act
+        held = self.slave.held_task_ids()
+        self.slave.send_unsent_results()
+        # Assert
+        assert held == {1}
+        assert [task.payload for task in decode_tasks(mock_session.post.call_args.kwargs['data'])] == [b'result']
+        assert self.slave.held_task_ids() == set()
+
+    @patch('slave.slave.Session', spec=Session)
+    def test_stop_drains(self, mock_session: Session):
+        # Arrange
+        self.slave.session = mock_session
+        self.slave.heartbeat = MagicMock()
+        self.slave.leave = MagicMock()
+        finished = []
+        self.slave.wait_for_free_slots()
+        self.slave.running_tasks.add(self.slave.executor.submit(lambda: sleep(0.1) or finished.append(True)))
+        # Act
+        self.slave.stop()
+        # Assert
+        assert finished == [True]
+        assert not self.slave.running
+        self.slave.leave.assert_called_once()
+        assert self.slave.heartbeat is None
+
+    @patch('slave.slave.Session', spec=Session)
+    def test_stop_hands_back_unfinished_tasks(self, mock_session: Session):
+        # Arrange
+        self.slave.session = mock_session
+        self.slave.heartbeat = MagicMock()
+        self.slave.leave = MagicMock()
+        self.slave.drain_secs = 0.01
+        release = Event()
+        self.slave.processes.kill = MagicMock(side_effect=release.set)
+        self.slave.wait_for_free_slots()
+        self.slave.running_tasks.add(self.slave.executor.submit(release.wait))
+        # Act
+        self.slave.stop()
+        # Assert
+        self.slave.processes.kill.assert_called_once()
+        self.slave.leave.assert_called_once()
+
+    @patch('slave.slave.Session', spec=Session)
+    def test_stop_kills_tasks_after_drain(self, mock_session: Session):
+        # Arrange
+        self.slave.session = mock_session
+        self.slave.heartbeat = MagicMock()
+        self.slave.leave = MagicMock()
+        self.slave.drain_secs = 0.1
+        self.slave.wait_for_free_slots()
+        future = self.slave.executor.submit(run_shell_command, ['sleep', '30'], self.slave.processes)
+        self.slave.running_tasks.add(future)
+        while not self.slave.processes.processes:
+            sleep(0.01)
+        start = perf_counter()
+        # Act
+        self.slave.stop()
+        # Assert
+        assert perf_counter() - start < 5
+        assert future.result(timeout=1) != 0
+        assert self.slave.processes.run(['sleep', '30']) == -1
+        self.slave.leave.assert_called_once()
+
+    @patch('slave.slave.sleep')
+    def test_req_tasks_retry_after(self, mock_sleep):
+        # Arrange
+        self.slave.session = MagicMock()
+        self.slave.session.get.return_value = MagicMock(status_code=42, headers={'Retry-After': '1'})
+        # Act
+        tasks = self.slave.req_tasks(2)
+        # Assert
+        assert tasks == []
+        mock_sleep.assert_called_once_with(1.0)
+
+    def test_lease_renewed_while_task_runs(self):
+        # Arrange
+        task_manager = TaskManager(StatusManager(), task_lease_secs=0.2)
+        task_manager.add_new_available_tasks([Task(1, "", [""], None, "", "")], 1)
+        task = task_manager.connect_available_task("conn_1")
+        self.slave.session = MagicMock()
+        self.slave.session.post.side_effect = lambda url, json, timeout: MagicMock(
+            status_code=200, json=MagicMock(return_value=task_manager.renew_leases(json, "conn_1")))
+        self.slave.lease_renewal_secs = 0.05
+        # the task runs three times as long as its lease
+        self.slave.handle_tasks = lambda tasks: (sleep(0.6), (True, tasks))[1]
+        self.slave.send_tasks = MagicMock(return_value=True)
+        self.slave.running = False
+        # Act
+        self.slave.start_lease_renewal()
+        self.slave.run_task(task)
+        self.slave.stop_lease_renewal()
+        # Assert
+        assert task.task_id in task_manager.in_progress
+        assert task_manager.available_tasks.empty()
+        assert self.slave.running_task_ids == {}
+        task_manager.lease_manager.stop()
+
+    def test_hung_task_killed_and_not_renewed(self):
+        # Arrange
+        self.slave.max_task_secs = 0.1
+        self.slave.renew_leases = MagicMock()
+        self.slave.wait_for_free_slots()
+        future = self.slave.executor.submit(run_shell_command, ['sleep', '30'], self.slave.processes, 1)
+        with self.slave.running_task_ids_lock:
+            self.slave.running_task_ids[1] = monotonic() - 1
+            self.slave.running_task_ids[2] = monotonic()
+        while 1 not in self.slave.processes.task_processes:
+            sleep(0.01)
+        # Act
+        self.slave.renew_or_kill_running_tasks()
+        # Assert
+        assert future.result(timeout=5) != 0
+        assert 1 not in self.slave.processes.task_processes
+        self.slave.renew_leases.assert_called_once_with([2])
+
+    @patch('slave.slave.Session', spec=Session)
+    def test_leave(self, mock_session: Session):
+        # Arrange
+        mock_session.post.return_value = MagicMock(status_code=200)
+        self.slave.session = mock_session
+        self.slave.host = "hostname"
+        # Act
+        success = self.slave.leave()
+        # Assert
+        assert success
+        mock_session.post.assert_called_with(f'http://hostname:{self.slave.port}/{endpoints.LEAVE}', timeout=5)
+
+    def test_terminate(self):
+        # Arrange
+        self.slave.stop = MagicMock()
+        # Act & Assert
+        with pytest.raises(SystemExit):
+            self.slave.terminate(SIGTERM, None)
+        self.slave.stop.assert_called_once()
@@ -6,6 +6,7 @@ from slave.slave import HyperSlave, Session, Task, List
 from pickle import dumps as pickle_dumps
 from zlib import compress
 from common.task import TaskMessageType
+from common.wire import MIME_TYPE as TASKS_MIME_TYPE
 
 
 class TestTasks:
@@ -35,7 +36,8 @@ class TestTasks:
         # Act
         self.slave.req_tasks(1)
         # Assert
-        mock_session.get.assert_called_with(expected_endpoint, timeout=5)
+        mock_session.get.assert_called_with(expected_endpoint, params={'wait': self.slave.long_poll_secs},
+                                            headers={'Accept': TASKS_MIME_TYPE}, timeout=5 + self.slave.long_poll_secs)
 
     @patch('requests.Response', spec=Response)
     @patch('slave.slave.Session', spec=Session)
@@ -54,6 +56,19 @@ class TestTasks:
         # Assert
         assert expected_tasks[0].task_id == actual_tasks[0].task_id
 
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_req_task_none_available(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        mock_resp.status_code = 42
+        mock_resp.headers = {}
+        mock_session.get.return_value = mock_resp
+        self.slave.session = mock_session
+        # Act
+        actual_tasks = self.slave.req_tasks(1)
+        # Assert
+        assert actual_tasks == []
+
     @patch('slave.slave.run_shell_command', return_value=0)
     @patch('slave.slave.Session', spec=Session)
     def test_execute_tasks_passed(self, mock_session: Session, mock_run_shell_command):
@@ -99,7 +114,7 @@ class TestTasks:
         self.slave.handle_tasks(tasks)
         # Assert
         self.slave.execute_tasks.assert_called_with(tasks)
-        self.slave.save_processed_data.assert_called_with('payload.txt', expected_payload)
+        self.slave.save_processed_data.assert_called_with('payload.txt', expected_payload, self.slave.job_id)
 
     def test_handle_process_job(self):
         # Arrange
@@ -108,14 +123,67 @@ class TestTasks:
         task_1.message_type = TaskMessageType.TASK_RAW
         tasks: List[Task] = [task_1]
 
+        self.slave.max_workers = 1
         self.slave.req_tasks = MagicMock(return_value=tasks)
         self.slave.handle_tasks = MagicMock(return_value=(True, tasks))
-        self.slave.send_tasks = MagicMock()
+        self.slave.exchange_tasks = MagicMock(return_value=[])
         # Act
         self.slave.process_job()
+        self.slave.executor.shutdown(wait=True)
         # Assert
         self.slave.req_tasks.assert_called_with(1)
         self.slave.handle_tasks.assert_called_with(tasks)
+        self.slave.exchange_tasks.assert_called_with(tasks, 1)
+
+    def test_handle_process_job_requests_free_slots(self):
+        # Arrange
+        tasks: List[Task] = [Task(i, "", [], None, "", "") for i in range(3)]
+        self.slave.max_workers = 4
+        self.slave.req_tasks = MagicMock(return_value=tasks)
+        self.slave.run_task = MagicMock()
+        # Act
+        success = self.slave.process_job()
+        self.slave.executor.shutdown(wait=True)
+        # Assert
+        assert success
+        self.slave.req_tasks.assert_called_with(4)
+        assert self.slave.run_task.call_count == 3
+        assert self.slave.wait_for_free_slots() == 4
+
+    def test_handle_process_job_no_available_tasks(self):
+        # Arrange
+        self.slave.req_tasks = MagicMock(return_value=[])
+        self.slave.run_task = MagicMock()
+        # Act
+        success = self.slave.process_job()
+        # Assert
+        assert success
+        assert not self.slave.job_done
+        self.slave.run_task.assert_not_called()
+
+    def test_handle_process_job_job_end(self):
+        # Arrange
+        job_end_task: Task = Task(-1, "", [], None, "", "")
+        job_end_task.message_type = TaskMessageType.JOB_END
+        self.slave.req_tasks = MagicMock(return_value=[job_end_task])
+        self.slave.run_task = MagicMock()
+        # Act
+        success = self.slave.process_job()
+        # Assert
+        assert success
+        assert self.slave.job_done
+        self.slave.run_task.assert_not_called()
+
+    def test_run_task_failed_handling(self):
+        # Arrange
+        task_1: Task = Task(1, "", [], None, "result.txt", 'payload.txt')
+        self.slave.handle_tasks = MagicMock(return_value=(False, []))
+        self.slave.send_tasks = MagicMock()
+        # Act
+        success = self.slave.run_task(task_1)
+        # Assert
+        assert not success
+        self.slave.send_tasks.assert_not_called()
 
     def test_handle_process_job_no_task(self):
         # Arrange
@@ -126,3 +194,127 @@ class TestTasks:
         success = self.slave.process_job()
         # Assert
         assert not success
+
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_renew_leases(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        mock_resp.status_code = 200
+        mock_resp.json.return_value = 2
+        mock_session.post.return_value = mock_resp
+        self.slave.host = "hostname"
+        self.slave.port = "port"
+        self.slave.job_id = 1234
+        self.slave.session = mock_session
+        expected_endpoint = f'http://hostname:port/{endpoints.RENEW_LEASES}/1234'
+        # Act
+        renewed = self.slave.renew_leases([1, 2])
+        # Assert
+        mock_session.post.assert_called_with(expected_endpoint, json=[1, 2], timeout=5)
+        assert renewed == 2
+
+    @patch('slave.slave.Session', spec=Session)
+    def test_renew_leases_connection_error(self, mock_session: Session):
+        # Arrange
+        mock_session.post.side_effect = ConnectionError
+        self.slave.session = mock_session
+        # Act
+        renewed = self.slave.renew_leases([1])
+        # Assert
+        assert renewed == 0
+
+    def test_run_task_runs_exchanged_tasks(self):
+        # Arrange
+        task_1: Task = Task(1, "", [], None, "result.txt", 'payload.txt')
+        task_2: Task = Task(2, "", [], None, "result.txt", 'payload.txt')
+        self.slave.handle_tasks = MagicMock(side_effect=lambda tasks: (True, tasks))
+        self.slave.exchange_tasks = MagicMock(side_effect=[[task_2], []])
+        # Act
+        success = self.slave.run_task(task_1)
+        # Assert
+        assert success
+        assert self.slave.exchange_tasks.call_count == 2
+        self.slave.handle_tasks.assert_called_with([task_2])
+
+    def test_run_task_exchange_job_end(self):
+        # Arrange
+        task_1: Task = Task(1, "", [], None, "result.txt", 'payload.txt')
+        job_end_task: Task = Task(-1, "", [], None, "", "")
+        job_end_task.message_type = TaskMessageType.JOB_END
+        self.slave.handle_tasks = MagicMock(return_value=(True, [task_1]))
+        self.slave.exchange_tasks = MagicMock(return_value=[job_end_task])
+        # Act
+        success = self.slave.run_task(task_1)
+        # Assert
+        assert success
+        assert self.slave.job_done
+
+    def test_run_task_exchange_failed(self):
+        # Arrange
+        task_1: Task = Task(1, "", [], None, "result.txt", 'payload.txt')
+        self.slave.handle_tasks = MagicMock(return_value=(True, [task_1]))
+        self.slave.exchange_tasks = MagicMock(return_value=None)
+        self.slave.send_tasks = MagicMock(return_value=True)
+        # Act
+        success = self.slave.run_task(task_1)
+        # Assert
+        assert success
+        self.slave.send_tasks.assert_called_with([task_1])
+
+    def test_run_task_draining(self):
+        # Arrange
+        task_1: Task = Task(1, "", [], None, "result.txt", 'payload.txt')
+        self.slave.running = False
+        self.slave.handle_tasks = MagicMock(return_value=(True, [task_1]))
+        self.slave.exchange_tasks = MagicMock()
+        self.slave.send_tasks = MagicMock(return_value=True)
+        # Act
+        success = self.slave.run_task(task_1)
+        # Assert
+        assert success
+        self.slave.send_tasks.assert_called_with([task_1])
+        self.slave.exchange_tasks.assert_not_called()
+
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_exchange_tasks(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        done_tasks: List[Task] = [Task(1, "", [], None, "", "")]
+        next_tasks: List[Task] = [Task(2, "", [], None, "", "")]
+        mock_resp.status_code = 200
+        mock_resp.content = compress(pickle_dumps(next_tasks))
+        mock_session.post.return_value = mock_resp
+        self.slave.host = "hostname"
+        self.slave.port = "port"
+        self.slave.job_id = 1234
+        self.slave.session = mock_session
+        expected_endpoint = f'http://hostname:port/{endpoints.TASKS_EXCHANGE}/1234/1'
+        # Act
+        actual_tasks = self.slave.exchange_tasks(done_tasks, 1)
+        # Assert
+        assert mock_session.post.call_args[0][0] == expected_endpoint
+        assert actual_tasks[0].task_id == 2
+
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_exchange_tasks_none_available(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        mock_resp.status_code = 42
+        mock_session.post.return_value = mock_resp
+        self.slave.session = mock_session
+        # Act
+        actual_tasks = self.slave.exchange_tasks([Task(1, "", [], None, "", "")], 1)
+        # Assert
+        assert actual_tasks == []
+
+    @patch('requests.Response', spec=Response)
+    @patch('slave.slave.Session', spec=Session)
+    def test_exchange_tasks_error_status(self, mock_session: Session, mock_resp: Response):
+        # Arrange
+        mock_resp.status_code = 500
+        mock_session.post.return_value = mock_resp
+        self.slave.session = mock_session
+        # Act
+        actual_tasks = self.slave.exchange_tasks([Task(1, "", [], None, "", "")], 1)
+        # Assert
+        assert actual_tasks is None